@@ -1,9 +1,16 @@
+import asyncio
+import hashlib
+import time
 import bcrypt
+import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Request
+from fastapi import Request, WebSocket
+from typing import Optional
 
 from database import settings
 
@@ -14,7 +21,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 def hash_password(password: str) -> str:
     """Hashes a plain-text password using bcrypt."""
     pwd_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
     hashed_password = bcrypt.hashpw(password=pwd_bytes, salt=salt)
     return hashed_password.decode('utf-8')
 
@@ -24,6 +31,79 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     hashed_password_byte_enc = hashed_password.encode('utf-8')
     return bcrypt.checkpw(password=password_byte_enc, hashed_password=hashed_password_byte_enc)
 
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool so a login spike can't block
+    the event loop (and every pose WebSocket on it). At most `workers` hashes
+    run at once and `max_queue` more may wait; beyond that requests fail fast
+    with 503 instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_queue: int, stats_window: int = 1024):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._outstanding = 0
+
+        # --- Stats ---
+        self.completed = 0
+        self.rejected = 0
+        self._wait_ms = deque(maxlen=stats_window)
+        self._hash_ms = deque(maxlen=stats_window)
+
+    async def _run(self, func, *args):
+        if self._outstanding >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        self._outstanding += 1
+        queued_at = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            result = func(*args)
+            return result, started, time.perf_counter()
+
+        try:
+            loop = asyncio.get_running_loop()
+            result, started, finished = await loop.run_in_executor(self._executor, timed)
+        finally:
+            self._outstanding -= 1
+
+        self.completed += 1
+        self._wait_ms.append((started - queued_at) * 1000)
+        self._hash_ms.append((finished - started) * 1000)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def stats(self):
+        wait_ms = np.array(self._wait_ms) if self._wait_ms else np.zeros(1)
+        hash_ms = np.array(self._hash_ms) if self._hash_ms else np.zeros(1)
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            "outstanding": self._outstanding,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_ms_p50": round(float(np.percentile(wait_ms, 50)), 3),
+            "queue_wait_ms_p99": round(float(np.percentile(wait_ms, 99)), 3),
+            "hash_ms_p50": round(float(np.percentile(hash_ms, 50)), 3),
+            "hash_ms_p99": round(float(np.percentile(hash_ms, 99)), 3),
+        }
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
+
 # --- JWT Token Handling ---
 def create_access_token(data: dict):
     """Creates a JWT access token."""
@@ -34,6 +114,67 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
+class VerifiedTokenCache:
+    """
+    Bounded LRU of tokens whose signature has already been verified, keyed by
+    a SHA-256 digest of the token. Entries expire at the token's own `exp`, so
+    a cached token is never accepted longer than decoding it would allow.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # digest -> (user_id, exp timestamp), least recently used first
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        digest = hashlib.sha256(token.encode()).digest()
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[1] <= time.time():
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, token: str, user_id: str, expires_at: float):
+        digest = hashlib.sha256(token.encode()).digest()
+        self._entries[digest] = (user_id, expires_at)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+verified_tokens = VerifiedTokenCache(settings.JWT_CACHE_MAX_ENTRIES)
+
+
+def verify_token(token: str) -> str:
+    """
+    Returns the user id (`sub`) of a valid token, from the cache when it was
+    verified before. Raises JWTError for invalid or expired tokens.
+    """
+    user_id = verified_tokens.get(token)
+    if user_id is not None:
+        return user_id
+
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    user_id = payload.get("sub")
+    if user_id is None:
+        raise JWTError("Token has no subject")
+    # Tokens without an expiry are re-verified every time
+    if "exp" in payload:
+        verified_tokens.put(token, user_id, float(payload["exp"]))
+    return user_id
+
+
 async def get_current_user_id(request: Request, token: str = Depends(oauth2_scheme)) -> str:
     """
     Decodes the JWT token from either cookie or Authorization header.
@@ -51,11 +192,24 @@ async def get_current_user_id(request: Request, token: str = Depends(oauth2_sche
         jwt_token = token
 
     try:
-        payload = jwt.decode(jwt_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
+        user_id: str = verify_token(jwt_token)
     except JWTError:
         raise credentials_exception
 
     return user_id
+
+
+def websocket_user_id(ws: WebSocket) -> Optional[str]:
+    """
+    Verifies the token a WebSocket connects with (cookie, `token` query
+    parameter or Bearer header), once per connection. Returns None when no
+    token was sent; raises JWTError for an invalid one.
+    """
+    token = ws.cookies.get("access_token") or ws.query_params.get("token")
+    if not token:
+        scheme, _, credentials = ws.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer":
+            token = credentials
+    if not token:
+        return None
+    return verify_token(token)
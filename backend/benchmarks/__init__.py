@@ -0,0 +1,13 @@
+"""
+Benchmarks for the REST and pose-scoring hot paths.
+
+Run from the backend folder, e.g.:
+
+    python -m benchmarks.pose_micro
+    python -m benchmarks.rest_load --users 200 --songs 500
+    python -m benchmarks.ws_load --clients 50 --fps 30
+    python -m benchmarks.compare benchmarks/results/pose_micro-<old>.json benchmarks/results/pose_micro-<new>.json
+
+Each run writes a JSON file tagged with the git commit to benchmarks/results/.
+Extra dependencies are listed in benchmarks/requirements.txt.
+"""
@@ -0,0 +1,88 @@
+"""
+Shared helpers: latency summaries and the JSON results file.
+
+A results file holds the benchmark name, the environment it ran in (git
+commit, Python / NumPy versions, platform), the parameters it ran with and
+one summary dict per measured case, so two files can be diffed with
+benchmarks/compare.py.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+RESULTS_FOLDER = os.path.join(os.path.dirname(__file__), "results")
+
+
+def summarize(seconds):
+    """Latency summary (in milliseconds) of a list of durations in seconds."""
+    samples = np.asarray(seconds, dtype=np.float64) * 1000
+    if samples.size == 0:
+        return {"samples": 0}
+    return {
+        "samples": int(samples.size),
+        "mean_ms": round(float(samples.mean()), 4),
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p99_ms": round(float(np.percentile(samples, 99)), 4),
+        "max_ms": round(float(samples.max()), 4),
+    }
+
+
+def time_calls(func, repeat, warmup=10):
+    """Calls `func()` `warmup` + `repeat` times and returns the `repeat` durations in seconds."""
+    for _ in range(warmup):
+        func()
+    durations = []
+    clock = time.perf_counter
+    for _ in range(repeat):
+        started = clock()
+        func()
+        durations.append(clock() - started)
+    return durations
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment():
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(name, params, results, output=None):
+    """
+    Writes the results JSON (to `output`, or benchmarks/results/<name>-<commit>.json)
+    and prints a one-line summary per case. Returns the path written.
+    """
+    env = environment()
+    if output is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        output = os.path.join(RESULTS_FOLDER, f"{name}-{env['commit']}.json")
+
+    with open(output, "w") as f:
+        json.dump({"benchmark": name, "environment": env, "params": params, "results": results}, f, indent=2)
+        f.write("\n")
+
+    for case, summary in results.items():
+        figures = ", ".join(f"{key}={value}" for key, value in summary.items())
+        print(f"{case:<40} {figures}")
+    print(f"Results written to {output}", file=sys.stderr)
+    return output
@@ -0,0 +1,55 @@
+"""
+Compares two results files of the same benchmark, e.g. from two commits:
+
+    python -m benchmarks.compare old.json new.json [--threshold 10]
+
+Prints the relative change of every latency figure and exits with status 1
+if any of them got slower by more than `threshold` percent.
+"""
+import argparse
+import json
+import sys
+
+
+def compare(old, new, threshold):
+    regressions = 0
+    print(f"{old['environment']['commit']} -> {new['environment']['commit']}")
+    for case, new_summary in new["results"].items():
+        old_summary = old["results"].get(case)
+        if old_summary is None:
+            print(f"{case:<40} (new case)")
+            continue
+        for key, new_value in new_summary.items():
+            old_value = old_summary.get(key)
+            if not key.endswith("_ms") or not old_value or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{case:<40} {key:<10} {old_value:>10.4f} -> {new_value:>10.4f} ({change:+.1f}%){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent slowdown reported as a regression")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if old["benchmark"] != new["benchmark"]:
+        sys.exit(f"Can't compare {old['benchmark']} with {new['benchmark']} results")
+    if old["params"] != new["params"]:
+        print("Warning: the runs used different parameters", file=sys.stderr)
+
+    sys.exit(1 if compare(old, new, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
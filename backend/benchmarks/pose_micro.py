@@ -0,0 +1,199 @@
+"""
+Microbenchmarks of the pose-scoring functions over a landmark stream.
+
+    python -m benchmarks.pose_micro [--stream FILE] [--frames 2000] [--seed 0]
+
+The stream is a recorded choreography (.npz from choreography.py), a
+(T, 33, 2|4) .npy array, or - by default - a synthetic stream generated with
+a fixed seed: the user moves from one reference pose to the next with some
+jitter, and `--missing` of the frames lose a few landmarks (occlusion).
+`--save-stream` writes the synthetic stream to .npy so it can be replayed.
+
+Every frame is scored against the reference pose it was generated from,
+through the dict API (normalize_skeleton, calculate_angles_from_keypoints,
+get_max_angle_difference), the array engine, and batched score_pose_batch.
+"""
+import argparse
+
+import numpy as np
+
+from benchmarks.common import summarize, time_calls, write_results
+from pose_backends import score_pose_batch
+from reference_cache import read_cache
+from static_pose_comparision.pose_utils import (
+    NUM_LANDMARKS, array_to_keypoints, calculate_angles_array, calculate_angles_from_keypoints,
+    get_max_angle_difference, get_max_angle_difference_array, normalize_skeleton, normalize_skeleton_array,
+)
+
+MAX_ANGLE_DIFFERENCE = 30.0
+BATCH_SIZES = (1, 16, 64)
+
+
+def reference_poses(rng):
+    """(N, 33, 2) reference keypoints from the reference cache, or random skeletons if it isn't built."""
+    store = read_cache()
+    if store is not None and len(store):
+        return np.array(store.keypoints, dtype=np.float64)
+    print("Reference cache not built; using random reference skeletons.")
+    return rng.uniform(0.2, 0.8, size=(3, NUM_LANDMARKS, 2))
+
+
+def synthetic_stream(refs, frames, frames_per_pose, jitter, missing, rng):
+    """
+    Frames interpolated between consecutive reference poses plus Gaussian
+    jitter. Returns (points (T, 33, 2) with NaN for missing landmarks, ref index (T,)).
+    """
+    t = np.arange(frames)
+    ref_index = (t // frames_per_pose) % len(refs)
+    next_index = (ref_index + 1) % len(refs)
+    blend = ((t % frames_per_pose) / frames_per_pose)[:, None, None]
+    points = refs[ref_index] * (1 - blend) + refs[next_index] * blend
+    points = points + rng.normal(0.0, jitter, size=points.shape)
+
+    occluded = rng.random(frames) < missing
+    for frame in np.flatnonzero(occluded):
+        points[frame, rng.choice(NUM_LANDMARKS, size=3, replace=False)] = np.nan
+    return points, ref_index
+
+
+def load_stream(path, refs):
+    """Reads a recorded stream; frames are matched to references round-robin."""
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            points = np.array(data["keypoints"], dtype=np.float64)
+    else:
+        points = np.load(path).astype(np.float64)[..., :2]
+    if points.ndim != 3 or points.shape[1:] != (NUM_LANDMARKS, 2):
+        raise SystemExit(f"{path}: expected (T, {NUM_LANDMARKS}, 2) landmarks, got {points.shape}")
+    return points, np.arange(len(points)) % len(refs)
+
+
+def to_keypoints(points):
+    """Dict form used by the live client: present landmarks only."""
+    present = ~np.isnan(points).any(axis=1)
+    return {int(idx): tuple(points[idx]) for idx in np.flatnonzero(present)}
+
+
+def per_frame(passes, frames):
+    """Summary of per-frame time from the durations of whole passes over `frames` frames."""
+    summary = summarize(np.asarray(passes) / frames)
+    summary["frames_per_second"] = round(frames * len(passes) / sum(passes), 1)
+    return summary
+
+
+def run(points, ref_index, refs, repeat):
+    ref_angles = calculate_angles_array(refs)
+    frames = len(points)
+    results = {}
+
+    # --- Dict API, one call per frame ---
+    user_dicts = [to_keypoints(p) for p in points]
+    ref_dicts = [array_to_keypoints(r) for r in refs]
+    normalized_dicts = [normalize_skeleton(u, ref_dicts[r]) for u, r in zip(user_dicts, ref_index)]
+    live_angle_dicts = [calculate_angles_from_keypoints(k) for k in normalized_dicts]
+    ref_angle_dicts = [calculate_angles_from_keypoints(r) for r in ref_dicts]
+
+    def dict_normalize():
+        for u, r in zip(user_dicts, ref_index):
+            normalize_skeleton(u, ref_dicts[r])
+
+    def dict_angles():
+        for k in normalized_dicts:
+            calculate_angles_from_keypoints(k)
+
+    def dict_max_difference():
+        for live, r in zip(live_angle_dicts, ref_index):
+            get_max_angle_difference(live, ref_angle_dicts[r])
+
+    def dict_pipeline():
+        for u, r in zip(user_dicts, ref_index):
+            live = calculate_angles_from_keypoints(normalize_skeleton(u, ref_dicts[r]))
+            get_max_angle_difference(live, ref_angle_dicts[r])
+
+    # --- Array engine, one call per frame ---
+    normalized = normalize_skeleton_array(points, refs[ref_index])
+    live_angles = calculate_angles_array(normalized)
+
+    def array_normalize():
+        for p, r in zip(points, ref_index):
+            normalize_skeleton_array(p, refs[r])
+
+    def array_angles():
+        for p in normalized:
+            calculate_angles_array(p)
+
+    def array_max_difference():
+        for live, r in zip(live_angles, ref_index):
+            get_max_angle_difference_array(live, ref_angles[r])
+
+    def array_pipeline():
+        for p, r in zip(points, ref_index):
+            live = calculate_angles_array(normalize_skeleton_array(p, refs[r]))
+            get_max_angle_difference_array(live, ref_angles[r])
+
+    cases = {
+        "dict/normalize_skeleton": dict_normalize,
+        "dict/calculate_angles_from_keypoints": dict_angles,
+        "dict/get_max_angle_difference": dict_max_difference,
+        "dict/frame": dict_pipeline,
+        "array/normalize_skeleton": array_normalize,
+        "array/calculate_angles": array_angles,
+        "array/get_max_angle_difference": array_max_difference,
+        "array/frame": array_pipeline,
+    }
+    for name, func in cases.items():
+        # One sample per pass over the stream, reported per frame
+        passes = time_calls(func, repeat, warmup=1)
+        results[name] = per_frame(passes, frames)
+
+    # --- Batched scoring, as the pose scheduler runs it ---
+    for batch_size in BATCH_SIZES:
+        starts = range(0, frames - batch_size + 1, batch_size)
+        batches = [(points[s:s + batch_size], refs[ref_index[s:s + batch_size]], ref_angles[ref_index[s:s + batch_size]])
+                   for s in starts]
+
+        def score_batches():
+            for user_points, ref_points, angles in batches:
+                score_pose_batch(user_points, ref_points, angles, MAX_ANGLE_DIFFERENCE)
+
+        passes = time_calls(score_batches, repeat, warmup=1)
+        results[f"batch/score_pose_batch[{batch_size}]"] = per_frame(passes, len(batches) * batch_size)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stream", help="Recorded landmarks: choreography .npz or (T, 33, 2|4) .npy")
+    parser.add_argument("--frames", type=int, default=2000, help="Synthetic stream length")
+    parser.add_argument("--frames-per-pose", type=int, default=60)
+    parser.add_argument("--jitter", type=float, default=0.01, help="Std-dev of landmark noise (normalized units)")
+    parser.add_argument("--missing", type=float, default=0.05, help="Fraction of frames with occluded landmarks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the stream per case")
+    parser.add_argument("--save-stream", help="Write the synthetic stream to this .npy file")
+    parser.add_argument("--output", help="Results JSON path")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    refs = reference_poses(rng)
+    if args.stream:
+        points, ref_index = load_stream(args.stream, refs)
+    else:
+        points, ref_index = synthetic_stream(refs, args.frames, args.frames_per_pose, args.jitter, args.missing, rng)
+        if args.save_stream:
+            np.save(args.save_stream, points.astype(np.float32))
+
+    params = {
+        "stream": args.stream or "synthetic",
+        "frames": len(points),
+        "references": len(refs),
+        "repeat": args.repeat,
+    }
+    if not args.stream:
+        params.update(seed=args.seed, frames_per_pose=args.frames_per_pose, jitter=args.jitter, missing=args.missing)
+
+    write_results("pose_micro", params, run(points, ref_index, refs, args.repeat), args.output)
+
+
+if __name__ == "__main__":
+    main()
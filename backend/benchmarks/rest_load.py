@@ -0,0 +1,197 @@
+"""
+In-process load test of /api/dance/* and /api/user/status.
+
+    python -m benchmarks.rest_load [--mongo-url URL | --mongomock] [--users 100] [--requests 5000]
+
+Seeds a scratch database at the requested scale, then drives the FastAPI
+app through httpx's ASGI transport (no network, no uvicorn) with
+`--concurrency` clients issuing a weighted mix of catalog reads, status
+pages and progress updates as randomly chosen users. Reports latency per
+route and overall throughput.
+
+The target database is wiped first, so its name must contain "bench"
+(default mongodb://localhost:27017/natyavision_bench, or BENCH_DATABASE_URL).
+`--mongomock` uses mongomock-motor instead of a mongod; it is handy for a
+smoke run but does not model MongoDB's performance.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict
+
+import httpx
+from beanie import init_beanie
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from auth import create_access_token, hash_password
+from benchmarks.common import summarize, write_results
+from models import User, DanceStyle, Song, TutorialStep, UserSongStatus
+
+DOCUMENT_MODELS = [User, DanceStyle, Song, TutorialStep, UserSongStatus]
+DEFAULT_DATABASE_URL = "mongodb://localhost:27017/natyavision_bench"
+DEFAULT_MIX = "styles=2,songs=3,steps=3,status=1,patch=1"
+STATUSES = ("start", "resume", "completed")
+
+
+def connect(args):
+    if args.mongomock:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--mongomock needs mongomock-motor (see benchmarks/requirements.txt)")
+        return AsyncMongoMockClient()["natyavision_bench"]
+
+    database = AsyncIOMotorClient(args.mongo_url).get_default_database()
+    if "bench" not in database.name:
+        raise SystemExit(f"Refusing to wipe database {database.name!r}: its name must contain 'bench'")
+    return database
+
+
+async def seed(args, rng):
+    """Clears the benchmark collections and inserts the catalog, users and their statuses."""
+    for model in DOCUMENT_MODELS:
+        await model.delete_all()
+
+    styles = [
+        DanceStyle(id=ObjectId(), dance_name=f"Style {i}", description="Benchmark style", origin="Benchmark",
+                   songs=args.songs_per_style, img=f"https://example.com/style-{i}.jpg")
+        for i in range(args.styles)
+    ]
+    songs = []
+    # (style id, song id) of every song, for building request URLs
+    catalog = []
+    for style in styles:
+        for j in range(args.songs_per_style):
+            song = Song(id=ObjectId(), dance_style=style, name=f"{style.dance_name} song {j}",
+                        description="Benchmark song", time=rng.randint(3, 20), lessons=args.steps_per_song,
+                        teacher="Benchmark")
+            songs.append(song)
+            catalog.append((str(style.id), str(song.id)))
+    steps = [
+        TutorialStep(song=song, name=f"Step {k + 1}", time=rng.randint(1, 5), description="Benchmark step")
+        for song in songs for k in range(args.steps_per_song)
+    ]
+    # bcrypt is slow on purpose; every user shares one hash
+    hashed_password = hash_password("benchmark-password")
+    users = [User(id=ObjectId(), email=f"bench{i}@example.com", hashed_password=hashed_password) for i in range(args.users)]
+    statuses = [
+        UserSongStatus(user=user, song=song, status=rng.choice(STATUSES), progress=rng.randint(0, 100))
+        for user in users for song in rng.sample(songs, min(args.statuses_per_user, len(songs)))
+    ]
+
+    for documents in (styles, songs, steps, users, statuses):
+        if documents:
+            await type(documents[0]).insert_many(documents)
+    print(f"Seeded {len(styles)} styles, {len(songs)} songs, {len(steps)} steps, "
+          f"{len(users)} users, {len(statuses)} statuses.")
+    return catalog, users
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight)
+    unknown = set(weights) - {"styles", "songs", "steps", "status", "patch"}
+    if unknown:
+        raise SystemExit(f"Unknown request kinds in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def make_request(kind, catalog, tokens, rng):
+    """Returns (route label, method, url, headers, json body) of one request of the mix."""
+    headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+    style_id, song_id = rng.choice(catalog)
+    if kind == "styles":
+        return "GET /api/dance/styles", "GET", "/api/dance/styles", headers, None
+    if kind == "songs":
+        return "GET /api/dance/{dance_id}", "GET", f"/api/dance/{style_id}", headers, None
+    if kind == "steps":
+        return "GET /api/dance/{dance_id}/{song_id}", "GET", f"/api/dance/{style_id}/{song_id}", headers, None
+    if kind == "status":
+        return "GET /api/user/status", "GET", "/api/user/status?limit=50", headers, None
+    body = {"status": "resume", "progress": rng.randint(0, 100)}
+    return "PATCH /api/user/status/{song_id}", "PATCH", f"/api/user/status/{song_id}", headers, body
+
+
+async def run_load(app, args, catalog, users, rng):
+    weights = parse_mix(args.mix)
+    kinds = list(weights)
+    tokens = [create_access_token(data={"sub": str(user.id)}) for user in users]
+    requests = [
+        make_request(kind, catalog, tokens, rng)
+        for kind in rng.choices(kinds, weights=[weights[k] for k in kinds], k=args.requests)
+    ]
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    next_request = iter(requests)
+
+    async def client_loop(client):
+        for label, method, url, headers, body in next_request:
+            started = time.perf_counter()
+            response = await client.request(method, url, headers=headers, json=body)
+            latencies[label].append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors[label] += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm caches and connection pools outside the measurement
+        for label, method, url, headers, body in requests[:args.concurrency]:
+            await client.request(method, url, headers=headers, json=body)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    results = {}
+    for label in sorted(latencies):
+        results[label] = {**summarize(latencies[label]), "errors": errors[label]}
+    results["total"] = {
+        **summarize([s for samples in latencies.values() for s in samples]),
+        "errors": sum(errors.values()),
+        "requests_per_second": round(len(requests) / elapsed, 1),
+    }
+    return results
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    await init_beanie(database=connect(args), document_models=DOCUMENT_MODELS)
+    catalog, users = await seed(args, rng)
+
+    # Imported late: main.py builds the app (and loads the pose references) at import
+    from main import app, app_shutdown
+    try:
+        results = await run_load(app, args, catalog, users, rng)
+    finally:
+        await app_shutdown()
+
+    params = {key: value for key, value in vars(args).items() if key not in ("mongo_url", "output")}
+    params["backend"] = "mongomock" if args.mongomock else "mongod"
+    write_results("rest_load", params, results, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--mongomock", action="store_true", help="Use mongomock-motor instead of a mongod")
+    parser.add_argument("--styles", type=int, default=5)
+    parser.add_argument("--songs-per-style", type=int, default=20)
+    parser.add_argument("--steps-per-song", type=int, default=8)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--statuses-per-user", type=int, default=30)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Request weights, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Results JSON path")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
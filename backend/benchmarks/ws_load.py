@@ -0,0 +1,191 @@
+"""
+Multi-client /ws/pose load generator.
+
+    python -m benchmarks.ws_load [--clients 20] [--fps 30] [--duration 10] [--protocol binary|json]
+
+Starts the pose WebSocket on its own (a uvicorn subprocess serving only the
+pose routes, so no MongoDB is needed), or targets a running server with
+`--url ws://host:8000/ws/pose`. Each client replays a synthetic landmark
+stream (see pose_micro.py) at `--fps`, keeping at most one frame in flight
+the way a well-behaved client honouring backpressure does: a capture tick
+that comes while the previous frame is unanswered is skipped. Reports the
+send-to-reply latency of every scored frame and how many ticks were skipped.
+
+The server's batching is tuned with the usual environment variables
+(POSE_BATCH_WINDOW_MS, POSE_SCORING_BACKEND, ...), which are recorded in the results.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+from websockets.asyncio.client import connect
+
+from benchmarks.common import summarize, write_results
+from benchmarks.pose_micro import reference_poses, synthetic_stream
+from pose_protocol import FRAME_DTYPE
+
+
+def create_pose_app():
+    """App factory for the server subprocess: only the pose routes."""
+    from fastapi import FastAPI
+    from routes.pose_routes import router, pose_scheduler
+
+    app = FastAPI()
+    app.include_router(router)
+
+    @app.on_event("shutdown")
+    async def stop_scheduler():
+        await pose_scheduler.stop()
+
+    return app
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, timeout=30.0):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.ws_load:create_pose_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"Pose server exited with status {server.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise SystemExit("Pose server did not start in time")
+
+
+def encode_frames(points, protocol):
+    if protocol == "binary":
+        return [np.ascontiguousarray(p, dtype=FRAME_DTYPE).tobytes() for p in points]
+    return [json.dumps({"landmarks": [{"x": float(x), "y": float(y)} for x, y in p]}) for p in points]
+
+
+async def run_client(url, frames, fps, duration, protocol, start_offset):
+    """One client session. Returns (latencies in seconds, frames sent, ticks skipped)."""
+    latencies = []
+    sent = skipped = 0
+    interval = 1.0 / fps
+
+    async with connect(url, max_size=None) as ws:
+        if protocol == "binary":
+            await ws.send(json.dumps({"mode": "binary"}))
+            await ws.recv()  # handshake with the lookup tables
+
+        replied = asyncio.Event()
+        replied.set()
+        sent_at = None
+
+        async def receive():
+            nonlocal sent_at
+            async for message in ws:
+                # Rate advice arrives as text on both protocols; replies are bytes / JSON with accuracy
+                if isinstance(message, str) and "recommended_fps" in message:
+                    continue
+                if sent_at is not None:
+                    latencies.append(time.perf_counter() - sent_at)
+                    sent_at = None
+                replied.set()
+
+        receiver = asyncio.create_task(receive())
+        # Stagger clients across one frame interval so they don't send in lockstep
+        await asyncio.sleep(start_offset * interval)
+        next_tick = time.perf_counter()
+        ends_at = next_tick + duration
+        i = 0
+        while next_tick < ends_at:
+            if replied.is_set():
+                replied.clear()
+                sent_at = time.perf_counter()
+                await ws.send(frames[i % len(frames)])
+                sent += 1
+            else:
+                skipped += 1
+            i += 1
+            next_tick += interval
+            await asyncio.sleep(max(0.0, next_tick - time.perf_counter()))
+
+        # Let the last frame's reply arrive
+        try:
+            await asyncio.wait_for(replied.wait(), timeout=2.0)
+        except asyncio.TimeoutError:
+            pass
+        receiver.cancel()
+    return latencies, sent, skipped
+
+
+async def run_load(args, frames):
+    started = time.perf_counter()
+    sessions = await asyncio.gather(*(
+        run_client(args.url, frames, args.fps, args.duration, args.protocol, i / args.clients)
+        for i in range(args.clients)
+    ))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for session in sessions for latency in session[0]]
+    sent = sum(session[1] for session in sessions)
+    skipped = sum(session[2] for session in sessions)
+    return {
+        "frame_latency": {
+            **summarize(latencies),
+            "frames_sent": sent,
+            "frames_answered": len(latencies),
+            "ticks_skipped": skipped,
+            "answered_fps_per_client": round(len(latencies) / elapsed / args.clients, 1),
+            "answered_fps_total": round(len(latencies) / elapsed, 1),
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Existing /ws/pose endpoint; by default a local server is started")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--fps", type=float, default=30.0, help="Capture rate of each client")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds each client sends for")
+    parser.add_argument("--protocol", choices=("binary", "json"), default="binary")
+    parser.add_argument("--frames", type=int, default=600, help="Length of the replayed landmark stream")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Results JSON path")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    points, _ = synthetic_stream(reference_poses(rng), args.frames, 60, 0.01, 0.0, rng)
+    frames = encode_frames(points, args.protocol)
+
+    server = None
+    if args.url is None:
+        port = free_port()
+        server = start_server(port)
+        args.url = f"ws://127.0.0.1:{port}/ws/pose"
+    try:
+        results = asyncio.run(run_load(args, frames))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    params = {key: value for key, value in vars(args).items() if key not in ("url", "output")}
+    params["server"] = "external" if server is None else "local"
+    params["server_env"] = {key: value for key, value in sorted(os.environ.items()) if key.startswith("POSE_")}
+    write_results("ws_load", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+In-process cache for the nearly static dance catalog (styles, songs, steps).
+
+Entries expire after a TTL, the least recently used ones are evicted past
+`max_entries`, and every entry is tagged with the cache version so an
+invalidation drops everything at once. Writers bump a version counter stored
+in MongoDB (`bump_catalog_version`), which other workers pick up by polling
+or through a change stream.
+"""
+import asyncio
+import inspect
+import time
+from collections import OrderedDict
+
+from pymongo import ReturnDocument
+
+from models import DanceStyle
+
+CATALOG_META_COLLECTION = "catalog_meta"
+CATALOG_VERSION_ID = "catalog"
+# Collections whose writes invalidate the cache in change-stream mode
+CATALOG_COLLECTIONS = ("dance_styles", "songs", "tutorial_steps", CATALOG_META_COLLECTION)
+
+
+def catalog_meta_collection():
+    return DanceStyle.get_pymongo_collection().database[CATALOG_META_COLLECTION]
+
+
+async def read_catalog_version() -> int:
+    doc = await catalog_meta_collection().find_one({"_id": CATALOG_VERSION_ID})
+    return doc["version"] if doc else 0
+
+
+async def bump_catalog_version() -> int:
+    """Marks the catalog as changed for every worker. Call after writing styles, songs or steps."""
+    doc = await catalog_meta_collection().find_one_and_update(
+        {"_id": CATALOG_VERSION_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["version"]
+
+
+class CatalogCache:
+    """
+    TTL + LRU cache of catalog query results.
+
+    `sync` picks how writes made by other processes are noticed:
+    "none" (TTL only), "poll" (re-read the version counter at most every
+    `poll_seconds`) or "change_stream" (watch the catalog collections; needs
+    a replica set and falls back to polling otherwise).
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, sync: str = "poll", poll_seconds: float = 5.0):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.sync = sync
+        self.poll_seconds = poll_seconds
+
+        # key -> (expires_at, version, value), least recently used first
+        self._entries = OrderedDict()
+        self.version = 0
+        self._remote_version = None
+        self._next_poll = 0.0
+        self._watch_task = None
+
+        # --- Stats ---
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def invalidate(self):
+        """Drops every cached entry in this process."""
+        self.version += 1
+        self.invalidations += 1
+        self._entries.clear()
+
+    async def bump(self):
+        """Invalidates here and tells the other workers (see bump_catalog_version)."""
+        self.invalidate()
+        self._remote_version = await bump_catalog_version()
+
+    async def get(self, key, loader):
+        """Returns the cached value for `key`, calling the async `loader()` on a miss."""
+        await self._poll_version()
+
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now and entry[1] == self.version:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+        self.misses += 1
+        version = self.version
+        value = await loader()
+        # Don't cache a result loaded across an invalidation
+        if version == self.version:
+            self._entries[key] = (now + self.ttl, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    async def _poll_version(self):
+        if self.sync != "poll":
+            return
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        self._next_poll = now + self.poll_seconds
+        try:
+            remote = await read_catalog_version()
+        except Exception as e:
+            print(f"Catalog version poll failed: {e}")
+            return
+        if self._remote_version is not None and remote != self._remote_version:
+            self.invalidate()
+        self._remote_version = remote
+
+    # --- Change stream ---
+    def start(self):
+        """Starts watching the catalog collections when sync is "change_stream"."""
+        if self.sync == "change_stream" and (self._watch_task is None or self._watch_task.done()):
+            self._watch_task = asyncio.get_running_loop().create_task(self._watch())
+
+    async def stop(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    async def _watch(self):
+        database = catalog_meta_collection().database
+        pipeline = [{"$match": {"ns.coll": {"$in": list(CATALOG_COLLECTIONS)}}}]
+        try:
+            stream = database.watch(pipeline)
+            if inspect.isawaitable(stream):  # PyMongo async API; Motor returns the stream directly
+                stream = await stream
+            async with stream:
+                async for _ in stream:
+                    self.invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Catalog change stream unavailable ({e}); falling back to polling.")
+            self.sync = "poll"
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "sync": self.sync,
+        }
@@ -0,0 +1,144 @@
+"""
+Per-song / per-step choreography sequences.
+
+A choreography is a time series of reference poses stored as
+`CHOREOGRAPHY_FOLDER/<key>.npz` with `timestamps` (T,), `keypoints` (T, 33, 2)
+and `angles` (T, K). `Song.choreography` / `TutorialStep.choreography` hold the
+key. Live input is aligned against the angle series with StreamingDTW.
+
+Build a sequence from a reference video with:
+
+    python choreography.py <video> <key> [--fps 15]
+"""
+import argparse
+import os
+
+import numpy as np
+
+from static_pose_comparision.pose_utils import ANGLE_NAMES, NUM_LANDMARKS
+
+CHOREOGRAPHY_FOLDER = "static_pose_comparision/choreographies"
+
+
+class ChoreographyNotFound(LookupError):
+    """Raised when no usable (non-empty) sequence exists for a choreography key."""
+
+
+class ChoreographySequence:
+    """A reference pose time series: timestamps (T,), keypoints (T, 33, 2), angles (T, K)."""
+
+    def __init__(self, key, timestamps, keypoints, angles):
+        self.key = key
+        self.timestamps = timestamps
+        self.keypoints = keypoints
+        self.angles = angles
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+def sequence_path(key, folder=CHOREOGRAPHY_FOLDER):
+    # Keys come from the database; never let them escape the folder
+    if os.path.basename(key) != key or not key:
+        raise ChoreographyNotFound(f"Invalid choreography key {key!r}")
+    return os.path.join(folder, f"{key}.npz")
+
+
+# Sequences are small and read-only, so each worker keeps the ones in use
+_sequence_cache = {}
+
+
+def load_sequence(key, folder=CHOREOGRAPHY_FOLDER):
+    """Loads (and caches) a choreography sequence, reloading it if the file changed."""
+    path = sequence_path(key, folder)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise ChoreographyNotFound(f"No choreography sequence for {key!r}")
+
+    cached = _sequence_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with np.load(path) as data:
+        if tuple(data["angle_names"]) != ANGLE_NAMES:
+            raise ChoreographyNotFound(f"Choreography {key!r} was built with different angle definitions")
+        sequence = ChoreographySequence(key, data["timestamps"], data["keypoints"], data["angles"])
+    if len(sequence) == 0:
+        # e.g. saved by an older builder from a video where nobody was detected
+        raise ChoreographyNotFound(f"Choreography {key!r} has no poses")
+    _sequence_cache[path] = (mtime, sequence)
+    return sequence
+
+
+def save_sequence(sequence, folder=CHOREOGRAPHY_FOLDER):
+    os.makedirs(folder, exist_ok=True)
+    path = sequence_path(sequence.key, folder)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            timestamps=sequence.timestamps,
+            keypoints=sequence.keypoints,
+            angles=sequence.angles,
+            angle_names=np.array(ANGLE_NAMES),
+        )
+    os.replace(tmp_path, path)
+
+
+def extract_sequence_from_video(video_path, key, fps=15.0):
+    """
+    Runs MediaPipe over a reference video, sampling it at `fps`. Frames with no
+    detected person are skipped; raises ChoreographyNotFound if that leaves none.
+    """
+    import cv2
+    import mediapipe as mp
+    from static_pose_comparision.pose_utils import extract_keypoints_array
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise OSError(f"Could not open video {video_path}")
+
+    timestamps, keypoints, angles = [], [], []
+    next_sample = 0.0
+    pose = mp.solutions.pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            t = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if t < next_sample:
+                continue
+            next_sample = t + 1 / fps
+
+            frame_keypoints, frame_angles = extract_keypoints_array(frame, pose)
+            if frame_keypoints is None:
+                continue
+            timestamps.append(t)
+            keypoints.append(frame_keypoints)
+            angles.append(frame_angles)
+    finally:
+        pose.close()
+        cap.release()
+
+    if not timestamps:
+        raise ChoreographyNotFound(f"No person detected in {video_path}")
+    return ChoreographySequence(
+        key,
+        np.array(timestamps, dtype=np.float64),
+        np.array(keypoints, dtype=np.float64).reshape(-1, NUM_LANDMARKS, 2),
+        np.array(angles, dtype=np.float64).reshape(-1, len(ANGLE_NAMES)),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a choreography sequence from a reference video.")
+    parser.add_argument("video", help="path to the reference video")
+    parser.add_argument("key", help="choreography key stored on the Song / TutorialStep")
+    parser.add_argument("--fps", type=float, default=15.0, help="sampling rate for the sequence")
+    args = parser.parse_args()
+
+    sequence = extract_sequence_from_video(args.video, args.key, fps=args.fps)
+    save_sequence(sequence)
+    print(f"Saved {len(sequence)} poses to {sequence_path(args.key)}")
@@ -8,6 +8,63 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 # 24 hours
+    JWT_CACHE_MAX_ENTRIES: int = 10000 # verified tokens remembered to skip repeated signature checks
+
+    # Password hashing (see auth.PasswordHasher)
+    BCRYPT_ROUNDS: int = 12 # bcrypt cost factor for new hashes; existing hashes keep their own
+    PASSWORD_HASH_WORKERS: int = 2 # threads running bcrypt
+    PASSWORD_HASH_MAX_QUEUE: int = 32 # hashes allowed to wait before logins get 503
+
+    # Index checks (see db_indexes.py)
+    CHECK_INDEXES_ON_STARTUP: bool = True # warn about missing indexes / collection scans
+
+    # Dance catalog cache (see catalog_cache.py)
+    CATALOG_CACHE_TTL_SECONDS: float = 300 # how long styles / songs / steps are served from memory
+    CATALOG_CACHE_MAX_ENTRIES: int = 256 # least recently used entries are evicted past this
+    CATALOG_CACHE_SYNC: str = "poll" # "none", "poll" or "change_stream" (needs a replica set)
+    CATALOG_CACHE_POLL_SECONDS: float = 5.0 # how often workers re-read the catalog version
+    CATALOG_MAX_AGE_SECONDS: int = 60 # Cache-Control max-age of the public catalog endpoints
+    CATALOG_PRIVATE_ETAG_FROM_MEMORY: bool = True # per-user 304s without a DB query (see dance_routes.py); single worker only
+
+    # Write-behind buffering of progress updates (see status_writer.py)
+    STATUS_WRITE_BEHIND_SECONDS: float = 2.0 # flush interval; 0 writes every PATCH straight through
+    STATUS_WRITE_BEHIND_MAX_PENDING: int = 500 # flush early once this many (user, song) rows are waiting
+    STATUS_WRITE_BEHIND_MAX_ATTEMPTS: int = 5 # a row failing this many writes is dropped (and logged)
+    STATUS_WRITE_BEHIND_MAX_RETRY_SECONDS: float = 60.0 # cap of the backoff between failing flushes
+
+    # Pose scoring micro-batching (see pose_scheduler.py)
+    POSE_BATCH_WINDOW_MS: float = 3.0 # how long to wait for other sessions' frames
+    POSE_BATCH_MAX_SIZE: int = 64 # score immediately once this many frames are waiting
+    POSE_SCORING_BACKEND: str = "inline" # "inline", "thread" or "process" (see pose_backends.py)
+    POSE_SCORING_WORKERS: int = 2 # threads / processes for the pooled backends
+    POSE_CLIENT_MAX_FPS: int = 30 # upper bound of the send rate recommended to clients
+    POSE_CLIENT_MIN_FPS: int = 5 # lower bound of the send rate recommended to clients
+    POSE_SMOOTHING_WINDOW: int = 5 # frames averaged per session before scoring
+    POSE_HOLD_TIME_SECONDS: float = 1.0 # how long a pose must be held to advance (0 = first matching frame)
+    POSE_WS_REQUIRE_AUTH: bool = False # reject /ws/pose connections without a valid token
+
+    # Server-side pose extraction from camera images (see pose_extractor.py)
+    POSE_EXTRACTION_WORKERS: int = 2 # MediaPipe threads for image frames (0 disables image mode)
+    POSE_EXTRACTION_MAX_CONCURRENT: int = 2 # image frames in inference at once, across all sessions
+    POSE_EXTRACTION_MODEL_COMPLEXITY: int = 1 # MediaPipe Pose model: 0 (lite), 1 (full) or 2 (heavy)
+    POSE_EXTRACTION_MAX_IMAGE_BYTES: int = 1_000_000 # larger image frames are rejected
+    POSE_EXTRACTION_MAX_IMAGE_PIXELS: int = 1920 * 1080 # image frames of more width x height pixels are rejected before decoding
+
+    # Recording of /ws/pose sessions (see session_recording.py)
+    POSE_RECORDING_FOLDER: str = "" # where session recordings are written ("" disables recording)
+    POSE_RECORDING_CHUNK_FRAMES: int = 256 # frames buffered per session before a chunk is written
+    POSE_RECORDING_MAX_PENDING_CHUNKS: int = 64 # chunks queued for the writer thread before new ones are dropped
+
+    # Recorded practice video analysis (see video_analysis.py)
+    VIDEO_ANALYSIS_WORKERS: int = 2 # MediaPipe processes shared by all uploads (0 disables the endpoint)
+    VIDEO_ANALYSIS_MAX_IN_FLIGHT: int = 8 # decoded frames queued per upload; bounds its memory
+    VIDEO_ANALYSIS_MAX_UPLOAD_BYTES: int = 200_000_000 # larger uploads are refused with 413
+    VIDEO_ANALYSIS_UPLOAD_FOLDER: str = "" # where uploads are spooled ("" = the system temp folder)
+
+    # Choreography (DTW) scoring, see static_pose_comparision/pose_dtw.py
+    CHOREOGRAPHY_DTW_WINDOW: int = 64 # reference frames kept in the alignment band
+    CHOREOGRAPHY_DTW_MAX_STEP: int = 2 # fastest tolerated tempo, as a multiple of the reference
+    CHOREOGRAPHY_DTW_DECAY: float = 0.9 # how quickly past alignment costs are forgotten
 
     class Config:
         # This tells pydantic-settings to load variables from a .env file
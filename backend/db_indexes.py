@@ -0,0 +1,144 @@
+"""
+Startup check that the indexes declared in models.py exist and that the
+hot query paths actually use them.
+
+The unique indexes (users.email_unique, user_song_status.user_song_unique)
+can't be built while older rows break them: signup and the status PATCH used
+to check-then-insert, so concurrent requests could write duplicates. Before
+init_beanie builds them, prepare_unique_indexes() merges duplicate status
+rows and refuses to start while duplicate emails exist, naming them (two
+accounts can't be merged automatically).
+"""
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import DESCENDING
+
+from models import User, Song, TutorialStep, UserSongStatus
+from status_writer import merge_status
+
+# Representative filters / sorts of the queries the routes run on every request
+HOT_QUERIES = [
+    ("login / signup", User, {"email": "index-check@example.com"}, None),
+    ("songs of a dance style", Song, {"dance_style.$id": ObjectId()}, None),
+    ("tutorial steps of a song", TutorialStep, {"song.$id": ObjectId()}, None),
+    ("status of one song", UserSongStatus, {"user.$id": ObjectId(), "song.$id": ObjectId()}, None),
+    ("status page", UserSongStatus, {"user.$id": ObjectId()}, [("last_accessed", DESCENDING), ("song.$id", DESCENDING)]),
+]
+
+
+def plan_stages(plan):
+    """All stage names of an explain() plan tree (classic and slot-based engine layouts)."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages += plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            stages += plan_stages(item)
+    return stages
+
+
+async def find_missing_indexes(document_models):
+    """Returns (collection, index name) for every declared index the database doesn't have."""
+    missing = []
+    for model in document_models:
+        declared = getattr(model.Settings, "indexes", [])
+        if not declared:
+            continue
+        collection = model.get_pymongo_collection()
+        existing = {tuple(info["key"]) for info in (await collection.index_information()).values()}
+        for index in declared:
+            if tuple(index.document["key"].items()) not in existing:
+                missing.append((model.get_collection_name(), index.document["name"]))
+    return missing
+
+
+async def find_collection_scans():
+    """Returns the names of hot queries whose winning plan is a collection scan."""
+    scans = []
+    for name, model, query, sort in HOT_QUERIES:
+        cursor = model.get_pymongo_collection().find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        if "COLLSCAN" in plan_stages(explain.get("queryPlanner", {}).get("winningPlan")):
+            scans.append(f"{name} ({model.get_collection_name()})")
+    return scans
+
+
+async def check_indexes(document_models):
+    """Prints a warning for missing indexes and collection scans; never fails startup."""
+    try:
+        missing = await find_missing_indexes(document_models)
+        scans = await find_collection_scans()
+    except Exception as e:
+        print(f"Index check skipped: {e}")
+        return
+
+    for collection, index in missing:
+        print(f"WARNING: index {index!r} is missing on {collection}")
+    for query in scans:
+        print(f"WARNING: {query} runs as a collection scan (COLLSCAN)")
+    if not missing and not scans:
+        print("All hot queries are indexed.")
+
+
+# --- Unique index migration ---
+class DuplicateKeysError(RuntimeError):
+    """Raised at startup when existing rows would make a unique index build fail."""
+
+
+def _duplicates_pipeline(key):
+    return [
+        {"$group": {"_id": key, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+
+
+def merge_duplicate_statuses(rows):
+    """
+    Folds the status rows of one (user, song) into the most recently accessed
+    one. Returns (kept _id, fields to $set on it, _ids to delete).
+    """
+    rows = sorted(rows, key=lambda row: row.get("last_accessed") or datetime.min)
+    status, progress = None, None
+    for row in rows:
+        status = merge_status(status, row.get("status"))
+        if row.get("progress") is not None:
+            progress = row["progress"] if progress is None else max(progress, row["progress"])
+    kept = rows[-1]
+    fields = {"status": status, "progress": progress, "last_accessed": kept.get("last_accessed")}
+    return kept["_id"], {name: value for name, value in fields.items() if value is not None}, [row["_id"] for row in rows[:-1]]
+
+
+async def prepare_unique_indexes(database):
+    """
+    Clears the way for the unique indexes declared in models.py; a no-op once
+    they exist. Raises DuplicateKeysError for duplicate user emails.
+    """
+    users = database[User.Settings.name]
+    if "email_unique" not in await users.index_information():
+        groups = await users.aggregate(_duplicates_pipeline("$email")).to_list(None)
+        if groups:
+            emails = ", ".join(sorted(group["_id"] for group in groups)[:10])
+            raise DuplicateKeysError(
+                f"{len(groups)} email(s) belong to several user accounts ({emails}); "
+                "merge or delete the extra accounts before starting the server."
+            )
+
+    statuses = database[UserSongStatus.Settings.name]
+    if "user_song_unique" not in await statuses.index_information():
+        groups = await statuses.aggregate(
+            _duplicates_pipeline({"user": "$user.$id", "song": "$song.$id"})
+        ).to_list(None)
+        removed = 0
+        for group in groups:
+            rows = await statuses.find({"_id": {"$in": group["ids"]}}).to_list(None)
+            kept_id, fields, duplicate_ids = merge_duplicate_statuses(rows)
+            await statuses.update_one({"_id": kept_id}, {"$set": fields})
+            removed += (await statuses.delete_many({"_id": {"$in": duplicate_ids}})).deleted_count
+        if groups:
+            print(f"Merged {removed} duplicate user_song_status rows into {len(groups)} before indexing.")
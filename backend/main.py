@@ -1,15 +1,20 @@
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
 
 from database import settings
+from db_indexes import check_indexes, prepare_unique_indexes
 from models import User, DanceStyle, Song, TutorialStep, UserSongStatus
 from routes.auth_routes import router as auth_router
-from routes.dance_routes import router as dance_router
+from routes.dance_routes import router as dance_router, catalog_cache
 from routes.user_routes import router as user_router
-from routes.pose_routes import router as pose_router 
+from routes.pose_routes import router as pose_router, pose_scheduler, pose_extractor, video_analyzer, session_recorder
+from status_writer import status_writer
+from auth import password_hasher, verified_tokens
+from metrics import MetricsMiddleware, MongoCommandListener, register_stats, render
 from fastapi.staticfiles import StaticFiles
 
 
@@ -34,20 +39,60 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # pagination cursor of GET /api/user/status
 )
 
+# Per-route latency / size / status metrics, served on /metrics
+app.add_middleware(MetricsMiddleware)
+register_stats("pose_scheduler", pose_scheduler.stats)
+register_stats("pose_extractor", pose_extractor.stats)
+register_stats("video_analyzer", video_analyzer.stats)
+register_stats("session_recorder", session_recorder.stats)
+register_stats("status_writer", status_writer.stats)
+register_stats("password_hasher", password_hasher.stats)
+register_stats("catalog_cache", catalog_cache.stats)
+register_stats("jwt_cache", verified_tokens.stats)
+
 # Startup event to initialize the database connection
 @app.on_event("startup")
 async def app_init():
     """
     Initialize the database connection and Beanie ODM.
     """
-    client = AsyncIOMotorClient(settings.DATABASE_URL)
+    client = AsyncIOMotorClient(settings.DATABASE_URL, event_listeners=[MongoCommandListener()])
+    document_models = [User, DanceStyle, Song, TutorialStep, UserSongStatus]
+    # Rows written before the unique indexes existed would make their build fail
+    await prepare_unique_indexes(client.get_database())
     # The document_models list tells Beanie which models to work with.
+    # Beanie also creates the indexes declared in each model's Settings.
     await init_beanie(
         database=client.get_database(),
-        document_models=[User, DanceStyle, Song, TutorialStep, UserSongStatus]
+        document_models=document_models
     )
+    if settings.CHECK_INDEXES_ON_STARTUP:
+        await check_indexes(document_models)
+    catalog_cache.start()
+
+    # Load the MediaPipe models now rather than on the first image frame
+    if pose_extractor.enabled:
+        try:
+            await pose_extractor.start()
+        except Exception as e:
+            print(f"Warning: Server-side pose extraction unavailable: {e}")
+
+# Shutdown event to stop background workers
+@app.on_event("shutdown")
+async def app_shutdown():
+    """
+    Stop the pose scoring scheduler, the extraction pools and the catalog
+    change stream, and write out buffered progress updates and session recordings.
+    """
+    await pose_scheduler.stop()
+    pose_extractor.shutdown()
+    video_analyzer.shutdown()
+    await session_recorder.stop()
+    await catalog_cache.stop()
+    await status_writer.stop()
 
 # Static resources
 app.mount("/static", StaticFiles(directory="static_pose_comparision"), name="static")
@@ -63,6 +108,11 @@ app.include_router(pose_router, tags=["Pose Feedback"])
 async def read_root():
     return {"message": "Welcome to the Dance Tutorial API!"}
 
+# Prometheus scrape endpoint
+@app.get("/metrics", tags=["Root"], response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
 # This part is for running the app with `python main.py`
 # In a production environment, you would use a process manager like Gunicorn.
 if __name__ == "__main__":
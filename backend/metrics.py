@@ -0,0 +1,208 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms keep one small list of numbers per label
+set, created the first time that label set is seen, so recording a sample
+is a dict lookup plus a few additions. `render()` formats everything, plus
+any registered collector callbacks, for the /metrics endpoint.
+"""
+import time
+from bisect import bisect_left
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+
+_metrics = []
+_collectors = []
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        _metrics.append(self)
+
+    def inc(self, *label_values, amount=1):
+        values = self._values
+        values[label_values] = values.get(label_values, 0) + amount
+
+    def samples(self):
+        for label_values, value in self._values.items():
+            yield self.name, format_labels(self.labels, label_values), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value):
+        self._values[label_values] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._values = {}
+        _metrics.append(self)
+
+    def observe(self, value, *label_values):
+        row = self._values.get(label_values)
+        if row is None:
+            row = self._values[label_values] = [0] * (len(self.buckets) + 2)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def samples(self):
+        for label_values, row in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), row):
+                cumulative += count
+                labels = format_labels(self.labels + ("le",), label_values + (bound,))
+                yield self.name + "_bucket", labels, cumulative
+            labels = format_labels(self.labels, label_values)
+            yield self.name + "_count", labels, cumulative
+            yield self.name + "_sum", labels, row[-1]
+
+
+def register_collector(collect):
+    """
+    Adds a callback run at scrape time; it returns (name, help, kind, value)
+    tuples, e.g. read from a component's existing stats() dict.
+    """
+    _collectors.append(collect)
+
+
+def register_stats(prefix, stats):
+    """Exposes the numeric values of a component's stats() dict as gauges named <prefix>_<key>."""
+    def collect():
+        for key, value in stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{prefix}_{key}", f"{key} of {prefix}", "gauge", value
+    register_collector(collect)
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {value}")
+    for collect in _collectors:
+        try:
+            for name, help, kind, value in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        except Exception as e:
+            lines.append(f"# collector failed: {e}")
+    return "\n".join(lines) + "\n"
+
+
+# --- HTTP ---
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route, method and status", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "HTTP response body size by route", ("method", "route"), buckets=SIZE_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and response size per route
+    template (e.g. /api/dance/{dance_id}), so path parameters don't explode
+    the label space.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route_path, status_code)
+            HTTP_LATENCY.observe(time.perf_counter() - started, method, route_path)
+            HTTP_RESPONSE_SIZE.observe(size, method, route_path)
+
+
+# --- MongoDB ---
+MONGO_COMMANDS = Counter("mongodb_commands_total", "MongoDB commands by collection, command and outcome", ("collection", "command", "outcome"))
+MONGO_LATENCY = Histogram("mongodb_command_duration_seconds", "MongoDB command latency by collection", ("collection", "command"))
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every driver command; pass it to the client via event_listeners."""
+
+    def __init__(self):
+        # request id -> collection, between the started and finished events
+        self._collections = {}
+
+    def started(self, event):
+        name = "collection" if event.command_name == "getMore" else event.command_name
+        target = event.command.get(name)
+        self._collections[event.request_id] = target if isinstance(target, str) else "-"
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+    def _finish(self, event, outcome):
+        collection = self._collections.pop(event.request_id, "-")
+        MONGO_COMMANDS.inc(collection, event.command_name, outcome)
+        MONGO_LATENCY.observe(event.duration_micros / 1e6, collection, event.command_name)
+
+
+# --- Pose WebSocket ---
+POSE_SESSIONS = Gauge("pose_sessions_active", "Open /ws/pose connections")
+POSE_FRAMES_RECEIVED = Counter("pose_frames_received_total", "Landmark frames received on /ws/pose")
+POSE_FRAMES_DROPPED = Counter("pose_frames_dropped_total", "Frames superseded by newer ones before scoring")
+POSE_FRAME_LATENCY = Histogram("pose_frame_duration_seconds", "Receive-to-reply time of a scored /ws/pose frame")
+POSE_STAGE_LATENCY = Histogram("pose_image_stage_duration_seconds", "Decode / inference / score time of image frames", ("stage",))
@@ -140,6 +140,8 @@ from beanie import Document, Link
 from uuid import UUID, uuid4
 from datetime import datetime
 from bson import ObjectId  # 👈 Needed for ObjectId -> str conversion
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from static_pose_comparision.pose_utils import NUM_LANDMARKS
 
 # =====================================================================
 # Custom BaseModel for Pydantic responses
@@ -155,6 +157,9 @@ class CustomBaseModel(BaseModel):
 
 # =====================================================================
 # Beanie ODM Models (for MongoDB)
+# Indexes in each Settings cover the queries the routes run and are
+# created by init_beanie (see db_indexes.py for the startup check, and for
+# how rows that break the unique indexes are handled first).
 # =====================================================================
 
 class User(Document):
@@ -164,6 +169,9 @@ class User(Document):
 
     class Settings:
         name = "users"
+        indexes = [
+            IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        ]
 
 
 class DanceStyle(Document):
@@ -184,9 +192,13 @@ class Song(Document):
     time: int  # in minutes
     lessons: int
     teacher: str
+    choreography: Optional[str] = None  # key of the reference pose sequence (see choreography.py)
 
     class Settings:
         name = "songs"
+        indexes = [
+            IndexModel([("dance_style.$id", ASCENDING)], name="dance_style"),
+        ]
 
 
 class TutorialStep(Document):
@@ -194,9 +206,13 @@ class TutorialStep(Document):
     name: str  # e.g., "Step 1"
     time: int  # in minutes
     description: str
+    choreography: Optional[str] = None  # key of the reference pose sequence (see choreography.py)
 
     class Settings:
         name = "tutorial_steps"
+        indexes = [
+            IndexModel([("song.$id", ASCENDING)], name="song"),
+        ]
 
 
 class UserSongStatus(Document):
@@ -208,6 +224,14 @@ class UserSongStatus(Document):
 
     class Settings:
         name = "user_song_status"
+        indexes = [
+            IndexModel([("user.$id", ASCENDING), ("song.$id", ASCENDING)], name="user_song_unique", unique=True),
+            # GET /api/user/status pages in (last_accessed, song) order
+            IndexModel(
+                [("user.$id", ASCENDING), ("last_accessed", DESCENDING), ("song.$id", DESCENDING)],
+                name="user_last_accessed",
+            ),
+        ]
 
 
 # =====================================================================
@@ -271,6 +295,8 @@ class UserStatusResponse(CustomBaseModel):
     dance_name: str
     status: str
     progress: int
+    song_id: Optional[str] = None
+    last_accessed: Optional[datetime] = None
 
 
 class UserStatusUpdate(CustomBaseModel):
@@ -281,3 +307,21 @@ class UserStatusUpdate(CustomBaseModel):
 class UpdateSuccessResponse(CustomBaseModel):
     message: str
     status: str
+
+
+# ----- Pose Feedback -----
+class Landmark(CustomBaseModel):
+    x: float
+    y: float
+
+
+class NearestPoseQuery(CustomBaseModel):
+    # One entry per MediaPipe landmark; extra entries are ignored
+    landmarks: List[Landmark] = Field(..., min_length=NUM_LANDMARKS)
+    k: int = Field(5, ge=1, le=50)
+
+
+class NearestPoseResponse(CustomBaseModel):
+    index: int
+    name: str
+    distance: float
@@ -0,0 +1,159 @@
+"""
+Execution backends for batched pose scoring.
+
+The scheduler hands each micro-batch to one of these so the NumPy work can
+run on the event loop ("inline"), in a thread pool ("thread"), or in a pool
+of worker processes ("process") that map the reference store at start-up.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from static_pose_comparision.pose_utils import (
+    normalize_skeleton_array,
+    calculate_angles_array,
+    calculate_accuracy_array,
+)
+from reference_store import ReferenceStore, ReferenceStoreError
+
+
+def score_pose_batch(user_points, ref_points, ref_angles, max_angle_difference=None):
+    """
+    Scores (B, 33, 2) frames against (B, 33, 2) / (B, K) references. Returns the
+    (B, K) angles and (B,) accuracy; the accuracy is None without
+    `max_angle_difference`, for callers that score the angles themselves.
+    """
+    normalized = normalize_skeleton_array(user_points, ref_points)
+    user_angles = calculate_angles_array(normalized)
+    if max_angle_difference is None:
+        return user_angles, None
+    accuracy = calculate_accuracy_array(user_angles, ref_angles, max_angle_difference)
+    return user_angles, accuracy
+
+
+class StaleReferenceStore(RuntimeError):
+    """Raised in a worker process whose reference store no longer matches the parent's."""
+
+
+class InlineBackend:
+    """Scores on the event loop. Lowest latency for light load, blocks other sockets under heavy load."""
+
+    name = "inline"
+    max_in_flight = 1
+
+    async def score(self, user_points, ref_points, ref_angles, ref_rows, max_angle_difference):
+        return score_pose_batch(user_points, ref_points, ref_angles, max_angle_difference)
+
+    def shutdown(self):
+        pass
+
+
+class ThreadPoolBackend:
+    """Scores in a thread pool; NumPy releases the GIL for most of the batch math."""
+
+    name = "thread"
+
+    def __init__(self, workers):
+        self.max_in_flight = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pose-scoring")
+
+    async def score(self, user_points, ref_points, ref_angles, ref_rows, max_angle_difference):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, score_pose_batch, user_points, ref_points, ref_angles, max_angle_difference
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# --- Process pool workers ---
+# Each worker maps the shared reference store once, so batches against static
+# reference poses only ship row indices instead of the reference arrays.
+_worker_store = None
+_worker_store_path = None
+
+
+def _init_worker(store_path):
+    global _worker_store, _worker_store_path
+    _worker_store_path = store_path
+    try:
+        _worker_store = ReferenceStore(store_path) if store_path else None
+    except (OSError, ReferenceStoreError):
+        _worker_store = None
+
+
+def _score_in_worker(user_points, store_file_id, store_rows, ref_points, ref_angles, max_angle_difference):
+    if store_rows is not None:
+        if _worker_store is None or _worker_store.file_id != store_file_id:
+            # The store was hot-swapped since this worker started
+            _init_worker(_worker_store_path)
+        if _worker_store is None or _worker_store.file_id != store_file_id:
+            raise StaleReferenceStore("reference store changed while the batch was queued")
+        ref_points = _worker_store.keypoints[store_rows]
+        ref_angles = _worker_store.angles[store_rows]
+    return score_pose_batch(user_points, ref_points, ref_angles, max_angle_difference)
+
+
+class ProcessPoolBackend:
+    """
+    Scores in worker processes, keeping the event loop free entirely. When every
+    frame in a batch references the shared store, only row indices are sent.
+
+    A pool whose worker died (out of memory, crash) is replaced and the batch
+    retried once on the new pool; if that fails too, only that batch fails.
+    """
+
+    name = "process"
+
+    def __init__(self, workers, store_path):
+        self.max_in_flight = workers
+        self.store_path = store_path
+        self.pool_restarts = 0
+        self._executor = self._new_pool()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.max_in_flight,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.store_path,),
+        )
+
+    async def _submit(self, *args):
+        loop = asyncio.get_running_loop()
+        pool = self._executor
+        try:
+            return await loop.run_in_executor(pool, _score_in_worker, *args)
+        except BrokenProcessPool:
+            # Batches that failed together on the same pool replace it only once
+            if self._executor is pool:
+                self._executor = self._new_pool()
+                self.pool_restarts += 1
+                print("Pose scoring worker pool broke; started a new one.")
+                pool.shutdown(wait=False, cancel_futures=True)
+        return await loop.run_in_executor(self._executor, _score_in_worker, *args)
+
+    async def score(self, user_points, ref_points, ref_angles, ref_rows, max_angle_difference):
+        if ref_rows is not None:
+            store_file_id, rows = ref_rows
+            try:
+                return await self._submit(user_points, store_file_id, rows, None, None, max_angle_difference)
+            except StaleReferenceStore:
+                pass  # fall through and ship the reference arrays instead
+        return await self._submit(user_points, None, None, ref_points, ref_angles, max_angle_difference)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_backend(name, workers=2, store_path=None):
+    """Builds the scoring backend named by settings.POSE_SCORING_BACKEND."""
+    if name == "inline":
+        return InlineBackend()
+    if name == "thread":
+        return ThreadPoolBackend(workers)
+    if name == "process":
+        return ProcessPoolBackend(workers, store_path)
+    raise ValueError(f"Unknown pose scoring backend {name!r} (expected inline, thread or process)")
@@ -0,0 +1,266 @@
+"""
+Server-side pose extraction for clients that send camera images.
+
+Low-end devices can't run MediaPipe fast enough, so /ws/pose also accepts
+JPEG / WebP frames (see pose_protocol.py). They are decoded with
+cv2.imdecode and run through MediaPipe in a small thread pool; their
+dimensions are read from the JPEG / WebP header first, so a small file that
+would decode to a huge bitmap is rejected before it is allocated. MediaPipe's
+Pose graph isn't thread-safe, so every worker thread owns one pre-warmed
+instance plus a reusable RGB buffer; OpenCV and MediaPipe release the GIL
+while they work. A semaphore caps how many frames are in inference at once
+across all sessions, so a burst of image clients can't starve the loop.
+"""
+import asyncio
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from static_pose_comparision.pose_utils import extract_keypoints_array
+
+STAGES = ("decode", "inference", "score")
+WARM_UP_TIMEOUT = 120  # s for every worker to load its model before start() gives up
+
+
+class ImageFrameError(ValueError):
+    """Raised for an image frame that is too large or can't be decoded."""
+
+
+# JPEG start-of-frame markers (baseline, progressive, ...); C4, C8 and CC are not frames
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def image_dimensions(data):
+    """
+    Reads (width, height) from the header of a JPEG or WebP image without
+    decoding it. Raises ImageFrameError for any other format or a broken header.
+    """
+    try:
+        if data[:2] == b"\xff\xd8":
+            return _jpeg_dimensions(data)
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return _webp_dimensions(data)
+    except (struct.error, IndexError):
+        pass
+    else:
+        raise ImageFrameError("Unsupported image frame format (expected JPEG or WebP).")
+    raise ImageFrameError("Could not read the image frame header.")
+
+
+def _jpeg_dimensions(data):
+    offset = 2
+    while True:
+        # Markers may be preceded by any number of 0xFF fill bytes
+        while data[offset] != 0xFF:
+            offset += 1
+        while data[offset] == 0xFF:
+            offset += 1
+        marker = data[offset]
+        offset += 1
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            continue  # standalone markers carry no length
+        length, = struct.unpack_from(">H", data, offset)
+        if marker == 0xDA or length < 2:
+            raise IndexError  # image data before any frame header
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack_from(">HH", data, offset + 3)
+            return width, height
+        offset += length
+
+
+def _webp_dimensions(data):
+    chunk = data[12:16]
+    if chunk == b"VP8 ":  # lossy: 14-bit sizes after the key frame start code
+        if data[23:26] != b"\x9d\x01\x2a":
+            raise IndexError
+        width, height = struct.unpack_from("<HH", data, 26)
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":  # lossless: 14-bit sizes minus one, packed after the signature byte
+        bits, = struct.unpack_from("<I", data, 21)
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":  # extended: 24-bit canvas sizes minus one
+        if len(data) < 30:
+            raise IndexError
+        return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    raise IndexError
+
+
+class PoseExtractorPool:
+    """
+    Pool of MediaPipe Pose estimators, one per worker thread.
+
+    Instances run in static-image mode: frames from different sessions land on
+    whichever worker is free, so no tracking state may carry over between them.
+    """
+
+    def __init__(self, workers: int, max_concurrent: int, model_complexity: int = 1,
+                 max_image_bytes: int = 1_000_000, max_image_pixels: int = 1920 * 1080,
+                 stats_window: int = 1024):
+        self.workers = workers
+        self.max_concurrent = max_concurrent
+        self.model_complexity = model_complexity
+        self.max_image_bytes = max_image_bytes
+        self.max_image_pixels = max_image_pixels
+
+        self._executor = None
+        self._local = threading.local()
+        self._slots = None
+        self._starting = None
+
+        # --- Stats ---
+        self.frames = 0
+        self.no_person = 0
+        self.rejected = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self._stage_ms = {stage: deque(maxlen=stats_window) for stage in STAGES}
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    async def start(self):
+        """Creates the worker threads and warms up one estimator in each (idempotent)."""
+        if self._starting is None:
+            self._starting = asyncio.get_running_loop().create_task(self._start())
+        await self._starting
+
+    async def _start(self):
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pose-extraction")
+
+        # The barrier keeps each warm-up task on its own thread, so every worker loads its model now
+        barrier = threading.Barrier(self.workers, timeout=WARM_UP_TIMEOUT)
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(
+                loop.run_in_executor(self._executor, self._warm_up, barrier) for _ in range(self.workers)
+            ))
+        except BaseException:
+            # Release the workers still waiting, and let the next start() try again
+            barrier.abort()
+            self.shutdown()
+            raise
+        print(f"Pose extraction ready: {self.workers} MediaPipe workers in {time.perf_counter() - started:.1f}s.")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._starting = None
+
+    # --- Worker threads ---
+    def _estimator(self):
+        pose = getattr(self._local, "pose", None)
+        if pose is None:
+            import mediapipe as mp
+
+            pose = self._local.pose = mp.solutions.pose.Pose(
+                static_image_mode=True,
+                model_complexity=self.model_complexity,
+                min_detection_confidence=0.5,
+            )
+            self._local.rgb = None
+        return pose
+
+    def _warm_up(self, barrier):
+        try:
+            pose = self._estimator()
+        except BaseException:
+            barrier.abort()  # the other workers would wait for this one until the timeout
+            raise
+        barrier.wait()
+        # The first inference initializes the graph; pay for it before real frames arrive
+        extract_keypoints_array(np.zeros((256, 256, 3), dtype=np.uint8), pose)
+
+    def _extract(self, data):
+        """Decodes and runs MediaPipe on one frame. Returns (keypoints or None, decode s, inference s)."""
+        import cv2
+
+        started = time.perf_counter()
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ImageFrameError("Could not decode the image frame (expected JPEG or WebP).")
+        decoded = time.perf_counter()
+
+        pose = self._estimator()
+        rgb = self._local.rgb
+        if rgb is None or rgb.shape != image.shape:
+            rgb = self._local.rgb = np.empty_like(image)
+        keypoints, _ = extract_keypoints_array(image, pose, rgb_buffer=rgb)
+        return keypoints, decoded - started, time.perf_counter() - decoded
+
+    # --- Event loop side ---
+    def check_size(self, data):
+        """Raises ImageFrameError if a frame has too many bytes, or would decode to too many pixels."""
+        if len(data) > self.max_image_bytes:
+            raise ImageFrameError(f"Image frame of {len(data)} bytes exceeds {self.max_image_bytes} bytes.")
+        width, height = image_dimensions(data)
+        if width * height > self.max_image_pixels:
+            raise ImageFrameError(
+                f"Image frame of {width}x{height} pixels exceeds {self.max_image_pixels} pixels."
+            )
+
+    async def extract(self, data: bytes):
+        """
+        Extracts the (33, 2) normalized keypoints of one encoded image, or None
+        if nobody is in it. Returns (keypoints, {"decode": ms, "inference": ms}).
+        Raises ImageFrameError for oversized or undecodable frames.
+        """
+        try:
+            self.check_size(data)
+        except ImageFrameError:
+            self.rejected += 1
+            raise
+        await self.start()
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            keypoints, decode_s, inference_s = await loop.run_in_executor(self._executor, self._extract, data)
+        except ImageFrameError:
+            self.rejected += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+        self.frames += 1
+        if keypoints is None:
+            self.no_person += 1
+        timings = {"decode": decode_s * 1000, "inference": inference_s * 1000}
+        self._stage_ms["decode"].append(timings["decode"])
+        self._stage_ms["inference"].append(timings["inference"])
+        return keypoints, timings
+
+    def record_score(self, seconds):
+        """Records the scoring time of an extracted frame (scored by the session, not here); returns it in ms."""
+        ms = seconds * 1000
+        self._stage_ms["score"].append(ms)
+        return ms
+
+    def stats(self):
+        stats = {
+            "workers": self.workers,
+            "max_concurrent": self.max_concurrent,
+            "frames": self.frames,
+            "no_person": self.no_person,
+            "rejected": self.rejected,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+        }
+        for stage, samples in self._stage_ms.items():
+            values = np.array(samples) if samples else np.zeros(1)
+            stats[f"{stage}_ms_p50"] = round(float(np.percentile(values, 50)), 3)
+            stats[f"{stage}_ms_p99"] = round(float(np.percentile(values, 99)), 3)
+        return stats
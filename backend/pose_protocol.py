@@ -0,0 +1,129 @@
+import json
+import struct
+
+import numpy as np
+
+from static_pose_comparision.pose_utils import NUM_LANDMARKS, ANGLE_NAMES, landmarks_to_array
+
+# =====================================================================
+# /ws/pose wire protocol
+#
+# Authentication: the access token is read once at connect time from the
+# access_token cookie, a ?token= query parameter or a Bearer header. An
+# invalid token (or none, with POSE_WS_REQUIRE_AUTH) closes with 1008.
+# Authenticated choreography sessions record song progress.
+#
+# JSON (default):
+#   client -> {"landmarks": [{"x": .., "y": ..}, ...]}
+#   server -> {"accuracy": .., "feedback": "..", "next_pose": .., "current_pose": ".."}
+#             (+ "hold_remaining": seconds while a matched pose is being held)
+#
+# Binary (negotiated by sending {"mode": "binary"} as a text message; the
+# server answers with the lookup tables below):
+#   client -> little-endian float32 buffer of 33x2 (x, y) or 33x4
+#             (x, y, z, visibility) values; an empty frame means no person
+#   server -> REPLY_STRUCT: accuracy (float32), next_pose (uint8),
+#             feedback code (uint8), joint index (int8, -1 if none),
+#             current pose index (uint16)
+#
+# Choreography mode ({"mode": "choreography", "song_id" | "step_id": ..};
+# {"mode": "static"} switches back) uses the same replies, with next_pose
+# meaning "sequence completed" and the pose index being the matched frame
+# of the reference sequence. JSON replies carry progress/tempo instead.
+#
+# Image frames ({"mode": "image"}, for clients that can't run MediaPipe;
+# the server answers {"mode": "image", "max_image_bytes": n, "max_image_pixels": p}): binary frames
+# are then JPEG or WebP images, and the server extracts the landmarks itself.
+# Their replies are JSON with the extracted "landmarks" ([[x, y], ...] or
+# null) and per-stage "timings_ms" (decode / inference / score).
+# {"mode": "binary"} switches binary frames back to landmarks.
+#
+# Detect mode ({"mode": "detect", "k": 3}) scores each frame against the
+# nearest reference pose; the pose index is that pose and JSON replies list
+# the `k` nearest poses with their distances.
+#
+# Frames the server can't score in time are dropped (only the newest waiting
+# frame is scored). When its capacity changes the server sends a text
+# message {"recommended_fps": n, "frames_dropped": total} so the client can
+# adapt its capture rate.
+#
+# Replies always use the format of the frame that triggered them, so JSON
+# stays available as a fallback on a binary connection.
+# =====================================================================
+
+FRAME_DTYPE = np.dtype("<f4")
+FRAME_STRIDES = (2, 4)  # floats per landmark the server accepts
+
+REPLY_STRUCT = struct.Struct("<fBBbH")
+
+# --- Feedback codes ---
+FEEDBACK_NO_PERSON = 0
+FEEDBACK_GREAT = 1
+FEEDBACK_FOCUS = 2
+FEEDBACK_ALIGN = 3
+FEEDBACK_NEXT_POSE = 4
+FEEDBACK_SEQUENCE_COMPLETE = 5
+
+FEEDBACK_MESSAGES = {
+    FEEDBACK_NO_PERSON: "No person detected.",
+    FEEDBACK_GREAT: "Great job! Hold the pose.",
+    FEEDBACK_FOCUS: "Focus on your {joint}.",
+    FEEDBACK_ALIGN: "Align with the pose.",
+    FEEDBACK_NEXT_POSE: "Excellent! Moving to the next pose.",
+    FEEDBACK_SEQUENCE_COMPLETE: "Well done! You finished the sequence.",
+}
+
+
+class FrameFormatError(ValueError):
+    """Raised when a binary landmark frame has an unexpected size."""
+
+
+def decode_binary_frame(data: bytes):
+    """
+    Reads a packed float32 landmark frame without copying.
+    Returns a (33, 2) view of the x/y columns, or None for an empty frame.
+    """
+    if not data:
+        return None
+    if len(data) % FRAME_DTYPE.itemsize:
+        raise FrameFormatError(f"Frame of {len(data)} bytes is not a whole number of float32 values")
+    values = np.frombuffer(data, dtype=FRAME_DTYPE)
+    stride, remainder = divmod(values.size, NUM_LANDMARKS)
+    if remainder or stride not in FRAME_STRIDES:
+        raise FrameFormatError(
+            f"Expected {NUM_LANDMARKS}x{FRAME_STRIDES} float32 values, got {values.size}"
+        )
+    return values.reshape(NUM_LANDMARKS, stride)[:, :2]
+
+
+def decode_json_frame(data: dict):
+    """Reads a JSON landmark frame. Returns a (33, 2) array, or None if no person."""
+    landmarks = data.get("landmarks")
+    if not landmarks:
+        return None
+    return landmarks_to_array(landmarks)
+
+
+def feedback_text(code: int, joint_index: int = -1) -> str:
+    """Renders a feedback code as the human-readable message used by the JSON protocol."""
+    message = FEEDBACK_MESSAGES[code]
+    if code == FEEDBACK_FOCUS:
+        message = message.format(joint=ANGLE_NAMES[joint_index].replace("_", " "))
+    return message
+
+
+def encode_binary_reply(accuracy: float, next_pose: bool, feedback_code: int, joint_index: int, pose_index: int) -> bytes:
+    return REPLY_STRUCT.pack(accuracy, next_pose, feedback_code, joint_index, pose_index)
+
+
+def binary_handshake(pose_names) -> str:
+    """JSON text sent once when a client switches to binary mode."""
+    return json.dumps({
+        "mode": "binary",
+        "frame_dtype": "float32",
+        "frame_shapes": [[NUM_LANDMARKS, stride] for stride in FRAME_STRIDES],
+        "reply_format": REPLY_STRUCT.format,
+        "joints": list(ANGLE_NAMES),
+        "poses": list(pose_names),
+        "feedback": {str(code): message for code, message in FEEDBACK_MESSAGES.items()},
+    })
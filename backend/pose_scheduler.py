@@ -0,0 +1,273 @@
+import asyncio
+import time
+from collections import deque
+from functools import partial
+
+import numpy as np
+
+from pose_backends import InlineBackend
+
+
+class PoseScoringScheduler:
+    """
+    Micro-batches pose scoring across all open /ws/pose sessions.
+
+    Each session submits its frame with `score()` and awaits the result. Pending
+    frames are collected for up to `window_ms` milliseconds (or until
+    `max_batch_size` frames are waiting) and scored together as one (B, 33, 2)
+    array against each session's own reference pose.
+
+    Batches run on a pluggable backend (see pose_backends.py), with at most
+    `backend.max_in_flight` batches in flight. A session awaits each frame
+    before sending the next, so it never has more than one frame here; frames
+    arriving meanwhile are dropped by its LatestFrameMailbox instead.
+
+    Without `max_angle_difference` only the angles are computed and the
+    accuracy comes back as None.
+    """
+
+    def __init__(self, window_ms: float, max_batch_size: int, max_angle_difference: float = None,
+                 backend=None, stats_window: int = 1024):
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_angle_difference = max_angle_difference
+        self.backend = backend or InlineBackend()
+
+        # queued frames, in arrival order
+        self._pending = deque()
+        self._has_pending = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._slots = None
+        self._in_flight = set()
+        self._task = None
+
+        # --- Stats ---
+        self.frames_scored = 0
+        self.batches_scored = 0
+        self.max_batch_seen = 0
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._latencies_ms = deque(maxlen=stats_window)
+
+    def start(self):
+        """Starts the batching loop on the running event loop (idempotent)."""
+        if self._task is None or self._task.done():
+            # Events must belong to the loop the scheduler runs on
+            self._has_pending = asyncio.Event()
+            self._batch_full = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.backend.max_in_flight)
+            if self._pending:
+                self._has_pending.set()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stops the batching loop and backend, and fails any frames still waiting or being scored."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._in_flight):
+            task.cancel()
+        for item in self._pending:
+            if not item[-2].done():
+                item[-2].cancel()
+        self._pending.clear()
+        self.backend.shutdown()
+
+    async def score(self, user_points, ref_points, ref_angles, ref_row=None):
+        """
+        Queues one frame and waits for its batch to be scored.
+        Returns (user_angles, accuracy) for the frame.
+
+        `ref_row` is an optional (store file_id, row) naming the reference in
+        the shared store, which lets process workers skip receiving the
+        reference arrays.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((user_points, ref_points, ref_angles, ref_row, future, time.perf_counter()))
+        self._has_pending.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            await self._has_pending.wait()
+
+            # Give other sessions a short window to join this batch
+            if len(self._pending) < self.max_batch_size and self.window > 0:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=self.window)
+                except asyncio.TimeoutError:
+                    pass
+
+            # Wait for a free backend slot; frames keep accumulating meanwhile
+            await self._slots.acquire()
+
+            batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.max_batch_size))]
+            if len(self._pending) < self.max_batch_size:
+                self._batch_full.clear()
+            if not self._pending:
+                self._has_pending.clear()
+
+            task = asyncio.get_running_loop().create_task(self._score_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(partial(self._batch_done, batch))
+
+    def _batch_done(self, batch, task):
+        self._in_flight.discard(task)
+        if task.cancelled():
+            # Cancelled by stop(), possibly before it even started: don't leave sessions waiting
+            for item in batch:
+                if not item[-2].done():
+                    item[-2].cancel()
+
+    async def _score_batch(self, batch):
+        try:
+            # Sessions that disconnected while waiting are skipped
+            batch = [item for item in batch if not item[-2].done()]
+            if not batch:
+                return
+
+            try:
+                user_points = np.stack([item[0] for item in batch])
+                ref_points = np.stack([item[1] for item in batch])
+                ref_angles = np.stack([item[2] for item in batch])
+
+                # Only ship store rows if every frame points into the same store
+                ref_rows = None
+                store_ids = {item[3][0] if item[3] is not None else None for item in batch}
+                if len(store_ids) == 1 and None not in store_ids:
+                    ref_rows = (store_ids.pop(), np.array([item[3][1] for item in batch]))
+
+                user_angles, accuracy = await self.backend.score(
+                    user_points, ref_points, ref_angles, ref_rows, self.max_angle_difference
+                )
+            except Exception as e:
+                for item in batch:
+                    if not item[-2].done():
+                        item[-2].set_exception(e)
+                return
+
+            now = time.perf_counter()
+            for i, (*_, future, queued_at) in enumerate(batch):
+                if not future.done():
+                    future.set_result((user_angles[i], None if accuracy is None else float(accuracy[i])))
+                self._latencies_ms.append((now - queued_at) * 1000)
+
+            self.frames_scored += len(batch)
+            self.batches_scored += 1
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self._batch_sizes.append(len(batch))
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        """Batch-size and queue-to-result latency stats over the most recent batches."""
+        latencies = np.array(self._latencies_ms) if self._latencies_ms else np.zeros(1)
+        batch_sizes = np.array(self._batch_sizes) if self._batch_sizes else np.zeros(1)
+        return {
+            "backend": self.backend.name,
+            "backend_restarts": getattr(self.backend, "pool_restarts", 0),
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "frames_scored": self.frames_scored,
+            "batches_scored": self.batches_scored,
+            "batches_in_flight": len(self._in_flight),
+            "pending": len(self._pending),
+            "batch_size_mean": round(float(batch_sizes.mean()), 2),
+            "batch_size_max": self.max_batch_seen,
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+            "latency_ms_p99": round(float(np.percentile(latencies, 99)), 3),
+            "latency_ms_max": round(float(latencies.max()), 3),
+        }
+
+
+class LatestFrameMailbox:
+    """
+    Hands frames from a WebSocket reader task to its scorer task.
+
+    Frames use a single slot: putting a frame while the previous one is still
+    unprocessed replaces (drops) it, so the scorer always works on the newest
+    frame. Control messages are queued in order and never dropped; they also
+    discard a waiting frame, since it was sent under the old mode.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._controls = deque()
+        self._ready = asyncio.Event()
+        self._error = None
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        self.received += 1
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame
+        self._ready.set()
+
+    def put_control(self, message):
+        if self._frame is not None:
+            self._frame = None
+            self.dropped += 1
+        self._controls.append(message)
+        self._ready.set()
+
+    def close(self, error):
+        """Wakes the scorer with `error` (e.g. WebSocketDisconnect) once the mailbox is drained."""
+        self._error = error
+        self._ready.set()
+
+    async def get(self):
+        while True:
+            if self._controls:
+                return self._controls.popleft()
+            if self._frame is not None:
+                frame, self._frame = self._frame, None
+                return frame
+            if self._error is not None:
+                raise self._error
+            self._ready.clear()
+            await self._ready.wait()
+
+
+class SendRateAdvisor:
+    """
+    Recommends a client capture rate from how long this session's frames take
+    to score and answer, so clients stop sending frames that would be dropped.
+    """
+
+    def __init__(self, min_fps: int, max_fps: int, interval: float = 1.0, headroom: float = 0.9):
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.interval = interval
+        self.headroom = headroom
+        self.recommended = max_fps
+        self._service_time = None
+        self._next_advice = time.monotonic() + interval
+
+    def frame_done(self, seconds):
+        """Records the receive-to-reply time of one processed frame."""
+        if self._service_time is None:
+            self._service_time = seconds
+        else:
+            self._service_time = 0.8 * self._service_time + 0.2 * seconds
+
+    def advise(self):
+        """Returns a new recommended fps when it has changed (at most once per interval), else None."""
+        now = time.monotonic()
+        if now < self._next_advice or self._service_time is None:
+            return None
+        self._next_advice = now + self.interval
+
+        capacity = self.headroom / self._service_time if self._service_time > 0 else self.max_fps
+        fps = int(min(self.max_fps, max(self.min_fps, capacity)))
+        if fps == self.recommended:
+            return None
+        self.recommended = fps
+        return fps
@@ -0,0 +1,147 @@
+"""
+Precomputed reference-pose cache.
+
+Running MediaPipe over every reference image is slow, so keypoints and angles
+are extracted once into a versioned, memory-mapped store file (see
+reference_store.py) keyed by each image's content hash. Workers map the cache
+read-only without importing cv2 or mediapipe; only images that are new or
+changed since the last build go through MediaPipe. Rebuilding while the
+server runs swaps the file atomically and workers pick it up on their own.
+
+Build (or refresh) the cache offline with:
+
+    python reference_cache.py [--force]
+"""
+import argparse
+import hashlib
+import os
+
+import numpy as np
+
+from static_pose_comparision.pose_utils import ANGLE_NAMES, NUM_LANDMARKS
+from reference_store import ReferenceStore, ReferenceStoreError, ReferenceStoreWatcher, write_reference_store
+
+# Bump whenever the extraction changes (the file layout is versioned by reference_store)
+CACHE_VERSION = 2
+
+REFERENCE_POSE_FOLDER = "static_pose_comparision/reference_poses"
+REFERENCE_CACHE_PATH = "static_pose_comparision/reference_cache.bin"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def list_reference_images(folder=REFERENCE_POSE_FOLDER):
+    """Sorted reference image file names in `folder`."""
+    return sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def hash_image(path):
+    """SHA-256 of the image file contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_cache(path=REFERENCE_CACHE_PATH):
+    """
+    Maps the cache file. Returns None if it is missing, unreadable, or was
+    written by a different CACHE_VERSION / set of angle definitions.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        store = ReferenceStore(path)
+    except (OSError, ReferenceStoreError) as e:
+        print(f"Warning: Could not read reference cache {path}: {e}")
+        return None
+
+    if store.data_version != CACHE_VERSION or store.angle_names != ANGLE_NAMES:
+        return None
+    return store
+
+
+def build_reference_cache(folder=REFERENCE_POSE_FOLDER, path=REFERENCE_CACHE_PATH, force=False):
+    """
+    Brings the cache up to date with the images in `folder`. Entries whose
+    content hash is unchanged are reused; only new or changed images are run
+    through MediaPipe. Returns the freshly mapped ReferenceStore.
+    """
+    image_names = list_reference_images(folder)
+    hashes = [hash_image(os.path.join(folder, name)) for name in image_names]
+
+    previous = None if force else read_cache(path)
+    reusable = {}
+    if previous is not None:
+        for _, image_hash, entry_keypoints, entry_angles, entry_valid in previous.entries():
+            reusable[image_hash] = (entry_keypoints, entry_angles, entry_valid)
+
+    keypoints = np.full((len(image_names), NUM_LANDMARKS, 2), np.nan)
+    angles = np.full((len(image_names), len(ANGLE_NAMES)), np.nan)
+    valid = np.zeros(len(image_names), dtype=bool)
+
+    pose = None
+    try:
+        for i, (name, image_hash) in enumerate(zip(image_names, hashes)):
+            if image_hash in reusable:
+                keypoints[i], angles[i], valid[i] = reusable[image_hash]
+                continue
+
+            # Only pay for OpenCV / MediaPipe when something actually changed
+            import cv2
+            import mediapipe as mp
+            from static_pose_comparision.pose_utils import extract_keypoints_array
+
+            if pose is None:
+                pose = mp.solutions.pose.Pose(static_image_mode=True, min_detection_confidence=0.5)
+
+            img_path = os.path.join(folder, name)
+            img = cv2.imread(img_path)
+            if img is None:
+                print(f"Warning: Could not read image {img_path}")
+                continue
+
+            # Normalized keypoints (0-1 range) and the angle vector
+            image_keypoints, image_angles = extract_keypoints_array(img, pose)
+            if image_keypoints is not None and not np.all(np.isnan(image_angles)):
+                keypoints[i], angles[i], valid[i] = image_keypoints, image_angles, True
+            else:
+                print(f"Warning: No pose detected in {img_path}")
+    finally:
+        if pose is not None:
+            pose.close()
+
+    write_reference_store(path, image_names, hashes, keypoints, angles, valid, ANGLE_NAMES, data_version=CACHE_VERSION)
+    return ReferenceStore(path)
+
+
+def is_cache_fresh(store, folder=REFERENCE_POSE_FOLDER):
+    """True if the cache covers exactly the current images, byte for byte."""
+    image_names = list_reference_images(folder)
+    cached = {name: image_hash for name, image_hash, *_ in store.entries()}
+    if sorted(cached) != image_names:
+        return False
+    return all(hash_image(os.path.join(folder, name)) == cached[name] for name in image_names)
+
+
+def load_reference_poses(folder=REFERENCE_POSE_FOLDER, path=REFERENCE_CACHE_PATH, check_interval=1.0):
+    """
+    Returns a ReferenceStoreWatcher over the cached reference poses, rebuilding
+    the cache first if it is missing or stale. Call `.get()` for the current
+    ReferenceStore; it re-maps the file whenever the cache is rebuilt.
+    """
+    store = read_cache(path)
+    if store is None or not is_cache_fresh(store, folder):
+        print("Reference cache missing or stale, rebuilding...")
+        store = build_reference_cache(folder, path)
+
+    return ReferenceStoreWatcher(store, check_interval=check_interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the precomputed reference-pose cache.")
+    parser.add_argument("--force", action="store_true", help="re-extract every image, ignoring the existing cache")
+    args = parser.parse_args()
+
+    store = build_reference_cache(force=args.force)
+    print(f"Cached {len(store)}/{store.num_entries} reference poses in {REFERENCE_CACHE_PATH}")
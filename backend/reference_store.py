@@ -0,0 +1,218 @@
+"""
+Memory-mapped reference pose store.
+
+The whole reference library lives in one flat, read-only file that every
+uvicorn worker maps with mmap, so the OS page cache holds a single copy no
+matter how many workers (or poses) there are. Writers build a new file next
+to the old one and os.replace() it into place; readers notice the swap and
+re-map, while sessions still holding the old mapping keep a valid view.
+
+Layout (little-endian, every section 64-byte aligned):
+
+    header        HEADER struct, padded to 64 bytes
+    keypoints     float64 (num_entries, num_landmarks, 2)
+    angles        float64 (num_entries, num_angles)
+    hashes        uint8   (num_entries, 32)     SHA-256 of the source image
+    name_offsets  uint32  (num_entries + 1,)    into the names blob
+    names         utf-8 blob
+    angle_offsets uint32  (num_angles + 1,)     into the angle-names blob
+    angle_names   utf-8 blob
+
+Entries [0, num_poses) are usable poses; the rest record images in which no
+pose was detected, so they are not re-extracted on every build.
+"""
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+STORE_MAGIC = b"NVREFST\0"
+STORE_FORMAT_VERSION = 1
+# magic, format version, data version, num_entries, num_poses, num_landmarks,
+# num_angles, names blob size, angle-names blob size
+HEADER = struct.Struct("<8s8I")
+ALIGNMENT = 64
+HASH_SIZE = 32
+
+
+class ReferenceStoreError(ValueError):
+    """Raised when a store file is missing sections or has the wrong format."""
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _layout(num_entries, num_landmarks, num_angles, names_size, angle_names_size):
+    """Returns {section: (offset, dtype, shape)} and the total file size."""
+    sections = [
+        ("keypoints", np.float64, (num_entries, num_landmarks, 2)),
+        ("angles", np.float64, (num_entries, num_angles)),
+        ("hashes", np.uint8, (num_entries, HASH_SIZE)),
+        ("name_offsets", np.uint32, (num_entries + 1,)),
+        ("names", np.uint8, (names_size,)),
+        ("angle_offsets", np.uint32, (num_angles + 1,)),
+        ("angle_names", np.uint8, (angle_names_size,)),
+    ]
+    layout = {}
+    offset = _align(HEADER.size)
+    for name, dtype, shape in sections:
+        layout[name] = (offset, np.dtype(dtype), shape)
+        offset = _align(offset + np.dtype(dtype).itemsize * int(np.prod(shape)))
+    return layout, offset
+
+
+def _pack_strings(strings):
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(e) for e in encoded]) if encoded else []
+    return offsets, b"".join(encoded)
+
+
+def write_reference_store(path, names, hashes, keypoints, angles, valid, angle_names, data_version=0):
+    """
+    Writes a new store file and atomically swaps it in at `path`.
+    `hashes` are hex SHA-256 digests; rows with `valid` False are kept for
+    bookkeeping but are not exposed as poses.
+    """
+    valid = np.asarray(valid, dtype=bool)
+    # Usable poses first (stable, so they keep their name order)
+    order = np.argsort(~valid, kind="stable")
+    names = [names[i] for i in order]
+    hash_bytes = np.array([np.frombuffer(bytes.fromhex(hashes[i]), dtype=np.uint8) for i in order],
+                          dtype=np.uint8).reshape(len(order), HASH_SIZE)
+    keypoints = np.ascontiguousarray(np.asarray(keypoints, dtype=np.float64)[order])
+    angles = np.ascontiguousarray(np.asarray(angles, dtype=np.float64)[order])
+    num_entries, num_landmarks = keypoints.shape[:2]
+    num_angles = angles.shape[1]
+
+    name_offsets, names_blob = _pack_strings(names)
+    angle_offsets, angle_names_blob = _pack_strings(angle_names)
+
+    layout, total_size = _layout(num_entries, num_landmarks, num_angles, len(names_blob), len(angle_names_blob))
+    buffer = bytearray(total_size)
+    HEADER.pack_into(
+        buffer, 0, STORE_MAGIC, STORE_FORMAT_VERSION, data_version, num_entries, int(valid.sum()),
+        num_landmarks, num_angles, len(names_blob), len(angle_names_blob),
+    )
+    contents = {
+        "keypoints": keypoints,
+        "angles": angles,
+        "hashes": hash_bytes,
+        "name_offsets": name_offsets,
+        "names": np.frombuffer(names_blob, dtype=np.uint8),
+        "angle_offsets": angle_offsets,
+        "angle_names": np.frombuffer(angle_names_blob, dtype=np.uint8),
+    }
+    for section, array in contents.items():
+        offset, dtype, _ = layout[section]
+        data = np.ascontiguousarray(array, dtype=dtype).tobytes()
+        buffer[offset:offset + len(data)] = data
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ReferenceStore:
+    """
+    Read-only view of a store file. `keypoints` (N, 33, 2) and `angles` (N, K)
+    are NumPy arrays backed directly by the shared mapping; nothing is copied.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            # mmap can't map an empty file, so check the size before mapping
+            if stat.st_size < HEADER.size:
+                raise ReferenceStoreError(f"{path} is too small to be a reference store")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        (magic, format_version, self.data_version, num_entries, self.num_poses,
+         num_landmarks, num_angles, names_size, angle_names_size) = HEADER.unpack_from(self._mmap, 0)
+        if magic != STORE_MAGIC or format_version != STORE_FORMAT_VERSION:
+            raise ReferenceStoreError(f"{path} is not a version {STORE_FORMAT_VERSION} reference store")
+
+        layout, total_size = _layout(num_entries, num_landmarks, num_angles, names_size, angle_names_size)
+        if len(self._mmap) < total_size:
+            raise ReferenceStoreError(f"{path} is truncated")
+
+        sections = {
+            name: np.frombuffer(self._mmap, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+            for name, (offset, dtype, shape) in layout.items()
+        }
+        self._hashes = sections["hashes"]
+        self._name_offsets = sections["name_offsets"]
+        self._names = sections["names"]
+        self._all_keypoints = sections["keypoints"]
+        self._all_angles = sections["angles"]
+        self.keypoints = self._all_keypoints[:self.num_poses]
+        self.angles = self._all_angles[:self.num_poses]
+        self.angle_names = tuple(self._decode(sections["angle_names"], sections["angle_offsets"], i)
+                                 for i in range(num_angles))
+        self.num_entries = num_entries
+
+    @staticmethod
+    def _decode(blob, offsets, i):
+        return blob[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __len__(self):
+        return self.num_poses
+
+    def name(self, i):
+        """Name of pose `i`."""
+        return self._decode(self._names, self._name_offsets, i)
+
+    @property
+    def names(self):
+        return [self.name(i) for i in range(self.num_poses)]
+
+    def entries(self):
+        """
+        Yields (name, hex hash, keypoints, angles, valid) for every entry,
+        including images in which no pose was detected.
+        """
+        for i in range(self.num_entries):
+            yield (self._decode(self._names, self._name_offsets, i), self._hashes[i].tobytes().hex(),
+                   self._all_keypoints[i], self._all_angles[i], i < self.num_poses)
+
+    def is_replaced(self):
+        """True if the file at `path` was swapped (or removed) since this store was opened."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size) != self.file_id
+
+
+class ReferenceStoreWatcher:
+    """
+    Hands out the current ReferenceStore for `path`, re-mapping it when the
+    file is atomically replaced. The check is a single os.stat, done at most
+    once every `check_interval` seconds.
+    """
+
+    def __init__(self, store, check_interval=1.0):
+        self._store = store
+        self.check_interval = check_interval
+        self._next_check = time.monotonic() + check_interval
+
+    def get(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            if self._store.is_replaced():
+                try:
+                    self._store = ReferenceStore(self._store.path)
+                    print(f"Reloaded {len(self._store)} reference poses from {self._store.path}")
+                except (OSError, ReferenceStoreError) as e:
+                    # Keep serving the old mapping until a valid file shows up
+                    print(f"Warning: Could not reload reference store: {e}")
+        return self._store
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, HTTPException, status
 from models import User, UserCreate, UserLogin, AuthResponse
-from auth import hash_password, verify_password, create_access_token
+from auth import password_hasher, create_access_token
 from fastapi import Response
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter()
 
+EMAIL_TAKEN = "User with this email already exists"
+
 @router.post("/signup", response_model=AuthResponse, status_code=status.HTTP_201_CREATED)
 async def create_user(user_in: UserCreate):
     """
@@ -19,15 +22,22 @@ async def create_user(user_in: UserCreate):
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
-            detail="User with this email already exists",
+            detail=EMAIL_TAKEN,
         )
     
-    # Hash the password
-    hashed_pass = hash_password(user_in.password)
+    # Hash the password (off the event loop)
+    hashed_pass = await password_hasher.hash(user_in.password)
     
     # Create new user instance
     new_user = User(email=user_in.email, hashed_password=hashed_pass)
-    await new_user.insert()
+    try:
+        await new_user.insert()
+    except DuplicateKeyError:
+        # A concurrent signup with the same email got past the check above first
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=EMAIL_TAKEN,
+        )
     
     # Create JWT token
     access_token = create_access_token(data={"sub": str(new_user.id)})
@@ -48,7 +58,7 @@ async def login_for_access_token(form_data: UserLogin, response: Response):
     - Returns JWT and sets it as an HttpOnly cookie.
     """
     user = await User.find_one(User.email == form_data.email)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await password_hasher.verify(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -72,3 +82,9 @@ async def login_for_access_token(form_data: UserLogin, response: Response):
         email=user.email,
         status="success"
     )
+
+
+@router.get("/hash-stats")
+async def get_password_hash_stats():
+    """Queue wait vs. hash time of the bcrypt pool."""
+    return password_hasher.stats()
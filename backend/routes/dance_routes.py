@@ -1,5 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+import hashlib
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from typing import List, Optional
 from beanie.odm.operators.find.comparison import In
 from bson import ObjectId
 
@@ -13,80 +15,209 @@ from models import (
     TutorialStepResponse,
 )
 from auth import get_current_user_id
+from catalog_cache import CatalogCache
+from status_writer import merge_status, status_writer
+from database import settings
 
 router = APIRouter()
 
+# Catalog rows are cached without the per-user status, which is merged on
+# per request from one small UserSongStatus query.
+catalog_cache = CatalogCache(
+    ttl_seconds=settings.CATALOG_CACHE_TTL_SECONDS,
+    max_entries=settings.CATALOG_CACHE_MAX_ENTRIES,
+    sync=settings.CATALOG_CACHE_SYNC,
+    poll_seconds=settings.CATALOG_CACHE_POLL_SECONDS,
+)
+
+
+# --- Pre-serialized responses ---
+# Catalog rows are validated through the response models once, when loaded,
+# and kept as JSON-ready dicts (or bytes); requests only merge the user's
+# status in and serialize with orjson. Every body carries a strong ETag so
+# polling clients get a bodiless 304 when nothing changed.
+#
+# Per-user ETags are built before any per-user work: the digest of the cached
+# catalog rows plus the user's status version (status_writer.user_version).
+# A matching If-None-Match is then answered without a database query or
+# serialization. The version only sees this process's writes, so with
+# several workers CATALOG_PRIVATE_ETAG_FROM_MEMORY must be off; the ETag is
+# then the hash of the full body again.
+def digest(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class CatalogPayload:
+    __slots__ = ("body", "etag")
+
+    def __init__(self, data, etag=None):
+        self.body = orjson.dumps(data)
+        self.etag = etag or '"' + digest(self.body) + '"'
+
+
+class CatalogRows:
+    """Cached catalog rows of a per-user endpoint, with the digest their ETags start from."""
+
+    __slots__ = ("rows", "digest")
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.digest = digest(orjson.dumps(rows))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def not_modified(request: Request, etag: Optional[str], cache_control: str) -> Optional[Response]:
+    """A bodiless 304 if the client's copy has `etag` (None never matches), else None."""
+    if etag is not None and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    return None
+
+
+def catalog_response(request: Request, payload: CatalogPayload, cache_control: str) -> Response:
+    unchanged = not_modified(request, payload.etag, cache_control)
+    if unchanged is not None:
+        return unchanged
+    headers = {"ETag": payload.etag, "Cache-Control": cache_control}
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
+
+def public_cache_control():
+    return f"public, max-age={settings.CATALOG_MAX_AGE_SECONDS}"
+
+
+# Per-user responses may be revalidated but never reused without asking
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def private_etag(rows: CatalogRows, user_id: ObjectId) -> Optional[str]:
+    """The per-user ETag known before querying the user's status, or None when that is off."""
+    if not settings.CATALOG_PRIVATE_ETAG_FROM_MEMORY:
+        return None
+    return f'"{rows.digest}-{status_writer.user_version(user_id)}"'
+
+
+async def load_dance_styles():
+    styles = await DanceStyle.find_all().to_list()
+
+    # Convert ObjectId → str for each item
+    return CatalogPayload([
+        DanceStyleResponse(id=str(s.id),
+                           dance_name=s.dance_name,
+                           description=s.description,
+                           origin=s.origin,
+                           songs=s.songs,
+                           img=s.img).model_dump(mode="json", by_alias=True)
+        for s in styles
+    ])
+
+
+async def load_song_ids():
+    """Ids of every song, for cheap existence checks on the status write path."""
+    songs = await Song.get_pymongo_collection().find({}, {"_id": 1}).to_list(None)
+    return frozenset(song["_id"] for song in songs)
+
+
+async def load_songs_in_style(dance_id: ObjectId):
+    songs = await Song.find(Song.dance_style.id == dance_id).to_list()
+    return CatalogRows([
+        SongResponse(
+            id=str(song.id),
+            name=song.name,
+            description=song.description,
+            time=song.time,
+            lessons=song.lessons,
+            teacher=song.teacher,
+            status="start",
+        ).model_dump(mode="json", by_alias=True)
+        for song in songs
+    ])
+
+
+async def load_tutorial_steps(song_id: ObjectId):
+    steps = await TutorialStep.find(TutorialStep.song.id == song_id).to_list()
+    return CatalogRows([
+        TutorialStepResponse(
+            id=str(step.id),
+            name=step.name,
+            time=step.time,
+            description=step.description,
+            status="pending",
+        ).model_dump(mode="json", by_alias=True)
+        for step in steps
+    ])
+
 # ---------------------------------------------------------------
 # 1️⃣ Get all dance styles
 # ---------------------------------------------------------------
 @router.get("/styles", response_model=List[DanceStyleResponse])
-async def get_all_dance_styles():
+async def get_all_dance_styles(request: Request):
     """
     Fetches all available dance styles from the database.
     Public endpoint (no authentication required).
+    Served pre-serialized from the catalog cache; honours If-None-Match.
     """
-    styles = await DanceStyle.find_all().to_list()
-
-    # Convert ObjectId → str for each item
-    return [DanceStyleResponse(id=str(s.id),
-                               dance_name=s.dance_name,
-                               description=s.description,
-                               origin=s.origin,
-                               songs=s.songs,
-                               img=s.img)
-            for s in styles]
+    payload = await catalog_cache.get("styles", load_dance_styles)
+    return catalog_response(request, payload, public_cache_control())
 
 
 # ---------------------------------------------------------------
 # 2️⃣ Get all songs under a specific dance style
 # ---------------------------------------------------------------
 @router.get("/{dance_id}", response_model=List[SongResponse])
-async def get_songs_in_style(dance_id: str, current_user_id: str = Depends(get_current_user_id)):
-    print("inside the function")
+async def get_songs_in_style(dance_id: str, request: Request, current_user_id: str = Depends(get_current_user_id)):
     """
     Fetch all songs for a specific dance style and include the user's progress.
     """
     if not ObjectId.is_valid(dance_id):
         raise HTTPException(status_code=400, detail="Invalid dance_id format")
 
-    # Find songs belonging to this dance style
-    songs = await Song.find(Song.dance_style.id == ObjectId(dance_id)).to_list()
+    # Find songs belonging to this dance style (cached catalog rows)
+    dance_object_id = ObjectId(dance_id)
+    cached = await catalog_cache.get(("songs", str(dance_object_id)), lambda: load_songs_in_style(dance_object_id))
+    songs = cached.rows
     if not songs:
-        return []
+        return catalog_response(request, CatalogPayload([]), PRIVATE_CACHE_CONTROL)
+
+    # Unchanged since the client's copy: answer before any per-user work
+    user_id = ObjectId(current_user_id)
+    etag = private_etag(cached, user_id)
+    unchanged = not_modified(request, etag, PRIVATE_CACHE_CONTROL)
+    if unchanged is not None:
+        return unchanged
 
-    song_ids = [song.id for song in songs]
+    song_ids = [ObjectId(song["_id"]) for song in songs]
 
     # Get user's status for these songs
     user_statuses = await UserSongStatus.find(
-        UserSongStatus.user.id == ObjectId(current_user_id),
+        UserSongStatus.user.id == user_id,
         In(UserSongStatus.song.id, song_ids)
     ).to_list()
 
     # Create a quick lookup table for statuses
     status_map = {str(status.song.id): status.status for status in user_statuses}
 
+    # Overlay updates still waiting in the write-behind buffer
+    for song_id in song_ids:
+        pending = status_writer.pending(user_id, song_id)
+        if pending is not None and pending.status is not None:
+            status_map[str(song_id)] = merge_status(status_map.get(str(song_id)), pending.status)
+
     # Build response list
-    response = []
-    for song in songs:
-        response.append(
-            SongResponse(
-                id=str(song.id),
-                name=song.name,
-                description=song.description,
-                time=song.time,
-                lessons=song.lessons,
-                teacher=song.teacher,
-                status=status_map.get(str(song.id), "start"),
-            )
-        )
-    return response
+    payload = CatalogPayload([{**song, "status": status_map.get(song["_id"], "start")} for song in songs], etag)
+    return catalog_response(request, payload, PRIVATE_CACHE_CONTROL)
 
 
 # ---------------------------------------------------------------
 # 3️⃣ Get all tutorial steps for a specific song
 # ---------------------------------------------------------------
 @router.get("/{dance_id}/{song_id}", response_model=List[TutorialStepResponse])
-async def get_tutorial_steps(dance_id: str, song_id: str, current_user_id: str = Depends(get_current_user_id)):
+async def get_tutorial_steps(dance_id: str, song_id: str, request: Request, current_user_id: str = Depends(get_current_user_id)):
     """
     Fetch tutorial steps for a specific song and mark them as
     'completed' or 'pending' based on user's song progress.
@@ -94,31 +225,35 @@ async def get_tutorial_steps(dance_id: str, song_id: str, current_user_id: str =
     if not ObjectId.is_valid(song_id):
         raise HTTPException(status_code=400, detail="Invalid song_id format")
 
-    steps = await TutorialStep.find(TutorialStep.song.id == ObjectId(song_id)).to_list()
+    song_object_id = ObjectId(song_id)
+    cached = await catalog_cache.get(("steps", str(song_object_id)), lambda: load_tutorial_steps(song_object_id))
+    steps = cached.rows
     if not steps:
-        return []
+        return catalog_response(request, CatalogPayload([]), PRIVATE_CACHE_CONTROL)
+
+    # Unchanged since the client's copy: answer before any per-user work
+    user_id = ObjectId(current_user_id)
+    etag = private_etag(cached, user_id)
+    unchanged = not_modified(request, etag, PRIVATE_CACHE_CONTROL)
+    if unchanged is not None:
+        return unchanged
 
     user_status = await UserSongStatus.find_one(
-        UserSongStatus.user.id == ObjectId(current_user_id),
-        UserSongStatus.song.id == ObjectId(song_id)
+        UserSongStatus.user.id == user_id,
+        UserSongStatus.song.id == song_object_id
     )
 
-    # Determine completion percentage
+    # Determine completion percentage (including a not yet written update)
     song_progress = user_status.progress if user_status else 0
+    pending = status_writer.pending(user_id, song_object_id)
+    if pending is not None and pending.progress is not None:
+        song_progress = max(song_progress, pending.progress)
     total_steps = len(steps)
     completed_steps = round((song_progress / 100) * total_steps)
 
     # Build step list
-    response = []
-    for i, step in enumerate(steps):
-        response.append(
-            TutorialStepResponse(
-                id=str(step.id),
-                name=step.name,
-                time=step.time,
-                description=step.description,
-                status="completed" if i < completed_steps else "pending",
-            )
-        )
-
-    return response
+    payload = CatalogPayload([
+        {**step, "status": "completed" if i < completed_steps else "pending"}
+        for i, step in enumerate(steps)
+    ], etag)
+    return catalog_response(request, payload, PRIVATE_CACHE_CONTROL)
@@ -1,106 +1,642 @@
-import os
-import cv2
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-import mediapipe as mp
+import asyncio
+import json
+import orjson
+import time
+import numpy as np
+from datetime import datetime
+from typing import List, Optional
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from jose import JWTError
 from static_pose_comparision.pose_utils import (
-    extract_keypoints_and_angles,
-    get_max_angle_difference,
-    normalize_skeleton,
-    calculate_angles_from_keypoints
+    calculate_weighted_accuracy_array,
+    get_max_angle_difference_array,
+    landmarks_to_array,
+    ANGLE_NAMES,
+)
+from static_pose_comparision.pose_dtw import StreamingDTW
+from static_pose_comparision.pose_index import PoseIndex
+from static_pose_comparision.pose_smoothing import AngleSmoother, HoldTimer, JOINT_WEIGHT_ARRAY
+from database import settings
+from auth import get_current_user_id, websocket_user_id
+from status_writer import status_writer
+from metrics import POSE_SESSIONS, POSE_FRAMES_RECEIVED, POSE_FRAMES_DROPPED, POSE_FRAME_LATENCY, POSE_STAGE_LATENCY
+from models import Song, TutorialStep, NearestPoseQuery, NearestPoseResponse
+from choreography import ChoreographyNotFound, load_sequence
+from pose_scheduler import PoseScoringScheduler, LatestFrameMailbox, SendRateAdvisor
+from pose_backends import create_backend
+from pose_extractor import PoseExtractorPool, ImageFrameError
+from video_analysis import (
+    VideoAnalyzer, VideoAnalysisUnavailable, UploadTooLarge, is_readable_video, spool_upload, remove_upload,
+)
+from session_recording import PoseSessionRecorder
+from reference_cache import load_reference_poses, REFERENCE_CACHE_PATH
+from pose_protocol import (
+    FrameFormatError,
+    decode_binary_frame,
+    decode_json_frame,
+    encode_binary_reply,
+    feedback_text,
+    binary_handshake,
+    FEEDBACK_NO_PERSON,
+    FEEDBACK_GREAT,
+    FEEDBACK_FOCUS,
+    FEEDBACK_ALIGN,
+    FEEDBACK_NEXT_POSE,
+    FEEDBACK_SEQUENCE_COMPLETE,
 )
 
 router = APIRouter()
 
 # --- Constants ---
-REFERENCE_POSE_FOLDER = "static_pose_comparision/reference_poses"
-POSE_IMAGES = sorted([f for f in os.listdir(REFERENCE_POSE_FOLDER) if f.lower().endswith((".png", ".jpg", ".jpeg"))])
 ACCURACY_THRESHOLD_PERCENT = 80 # Threshold to advance to the next pose
 MAX_ANGLE_DIFFERENCE_FOR_ACCURACY = 40 # The max possible angle diff that still gives some accuracy score
 
 # --- Load Reference Poses on Startup ---
-mp_pose = mp.solutions.pose.Pose(static_image_mode=True, min_detection_confidence=0.5)
+# Memory-mapped from the precomputed cache (see reference_cache.py) and shared by
+# all workers; MediaPipe only runs here if the cache is missing or stale.
+# reference_poses.get() returns the current store and follows cache rebuilds.
+reference_poses = load_reference_poses()
+
+print(f"Loaded {len(reference_poses.get())} reference poses.")
 
-REFERENCE_POSES = []
-for img_name in POSE_IMAGES:
-    img_path = os.path.join(REFERENCE_POSE_FOLDER, img_name)
-    img = cv2.imread(img_path)
-    if img is not None:
-        # Extract and store normalized keypoints (0-1 range) and angles
-        _, keypoints, angles = extract_keypoints_and_angles(img, mp_pose, use_pixel_coordinates=False)
-        if keypoints and angles:
-            REFERENCE_POSES.append({"keypoints": keypoints, "angles": angles, "name": img_name})
-    else:
-        print(f"Warning: Could not read image {img_path}")
+# --- Batched Scoring ---
+# Frames from all open sessions are scored together in short micro-batches,
+# on the event loop or in a thread / process pool. Only the angles are batched:
+# sessions smooth them (or align them with DTW) before computing the accuracy.
+pose_scheduler = PoseScoringScheduler(
+    window_ms=settings.POSE_BATCH_WINDOW_MS,
+    max_batch_size=settings.POSE_BATCH_MAX_SIZE,
+    backend=create_backend(settings.POSE_SCORING_BACKEND, settings.POSE_SCORING_WORKERS, REFERENCE_CACHE_PATH),
+)
+
+@router.get("/api/pose/stats")
+async def get_pose_scoring_stats():
+    """Latency and batch-size stats for the pose scoring scheduler."""
+    return pose_scheduler.stats()
 
-mp_pose.close() # No longer needed after initialization
+# --- Server-Side Extraction ---
+# Clients too slow to run MediaPipe send camera images instead of landmarks
+pose_extractor = PoseExtractorPool(
+    workers=settings.POSE_EXTRACTION_WORKERS,
+    max_concurrent=settings.POSE_EXTRACTION_MAX_CONCURRENT,
+    model_complexity=settings.POSE_EXTRACTION_MODEL_COMPLEXITY,
+    max_image_bytes=settings.POSE_EXTRACTION_MAX_IMAGE_BYTES,
+    max_image_pixels=settings.POSE_EXTRACTION_MAX_IMAGE_PIXELS,
+)
 
-print(f"Loaded {len(REFERENCE_POSES)} reference poses.")
+@router.get("/api/pose/extraction/stats")
+async def get_pose_extraction_stats():
+    """Per-stage (decode / inference / score) timings of image frames."""
+    return pose_extractor.stats()
+
+# --- Recorded Video Analysis ---
+video_analyzer = VideoAnalyzer(
+    workers=settings.VIDEO_ANALYSIS_WORKERS,
+    max_in_flight=settings.VIDEO_ANALYSIS_MAX_IN_FLIGHT,
+    model_complexity=settings.POSE_EXTRACTION_MODEL_COMPLEXITY,
+)
+
+@router.get("/api/pose/video/stats")
+async def get_video_analysis_stats():
+    """Throughput of the recorded-video analysis pipeline."""
+    return video_analyzer.stats()
+
+# --- Session Recording ---
+# Optional compact per-session recordings, for replay and threshold tuning
+session_recorder = PoseSessionRecorder(
+    folder=settings.POSE_RECORDING_FOLDER,
+    chunk_frames=settings.POSE_RECORDING_CHUNK_FRAMES,
+    max_pending_chunks=settings.POSE_RECORDING_MAX_PENDING_CHUNKS,
+)
+
+@router.get("/api/pose/recording/stats")
+async def get_session_recording_stats():
+    """Frames, chunks and bytes written by the session recorder."""
+    return session_recorder.stats()
+
+# --- Nearest-Pose Index ---
+# Built from the reference store and rebuilt whenever the store is reloaded
+_pose_index = (None, None)
+
+def get_pose_index(poses):
+    global _pose_index
+    indexed_store, index = _pose_index
+    if indexed_store is not poses:
+        index = PoseIndex(poses.keypoints)
+        _pose_index = (poses, index)
+    return index
+
+def find_nearest_poses(poses, user_keypoints, k):
+    """The `k` reference poses closest to a skeleton, as JSON-ready dicts."""
+    nearest, distances = get_pose_index(poses).query(user_keypoints, k)
+    return [
+        {"index": int(i), "name": poses.name(i), "distance": round(float(d), 4)}
+        for i, d in zip(nearest, distances)
+    ]
+
+@router.post("/api/pose/nearest", response_model=List[NearestPoseResponse])
+async def get_nearest_poses(query: NearestPoseQuery):
+    """
+    Finds the reference poses closest to a skeleton, e.g. to detect which
+    move a student is doing. Public endpoint (no authentication required).
+    """
+    poses = reference_poses.get()
+    if not len(poses):
+        raise HTTPException(status_code=503, detail="No reference poses loaded on the server.")
+    user_keypoints = landmarks_to_array([{"x": lm.x, "y": lm.y} for lm in query.landmarks])
+    return find_nearest_poses(poses, user_keypoints, query.k)
+
+def parse_detect_k(value):
+    """The `k` of a detect-mode message, or None if it is not an integer in 1..50."""
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool):
+        return None
+    return value if 1 <= value <= 50 else None
 
 # --- WebSocket Endpoint ---
+async def receive_frame(ws: WebSocket):
+    """
+    Waits for the next client message. Returns ("json", data) for text frames
+    and ("binary", data) for binary frames.
+    """
+    message = await ws.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return "binary", message["bytes"]
+    return "json", json.loads(message["text"])
+
+
+async def find_choreography(data: dict):
+    """
+    Loads the choreography sequence of the TutorialStep / Song named in a mode
+    message. Returns (sequence, id of the song it belongs to, (start, end) of
+    the song's progress it covers): a step covers its share of the song, in
+    the order the steps are listed, so finishing it doesn't finish the song.
+    """
+    step_id, song_id = data.get("step_id"), data.get("song_id")
+    doc = None
+    if step_id and ObjectId.is_valid(step_id):
+        doc = await TutorialStep.get(step_id)
+    elif song_id and ObjectId.is_valid(song_id):
+        doc = await Song.get(song_id)
+    if doc is None or not doc.choreography:
+        raise ChoreographyNotFound("No choreography for this song or step.")
+    if not isinstance(doc, TutorialStep):
+        return load_sequence(doc.choreography), doc.id, (0, 100)
+
+    owner_song_id = doc.song.ref.id
+    step_ids = [step.id for step in await TutorialStep.find(TutorialStep.song.id == owner_song_id).to_list()]
+    position = step_ids.index(doc.id) if doc.id in step_ids else len(step_ids) - 1
+    share = 100 / max(len(step_ids), 1)
+    return load_sequence(doc.choreography), owner_song_id, (position * share, (position + 1) * share)
+
+
+class PoseSession:
+    """
+    Scoring state of one /ws/pose connection: cycling through the static
+    reference poses, following a choreography sequence with streaming DTW, or
+    detecting which reference pose is closest (`detect_k` > 0).
+
+    Static and detect scores use this session's smoothed angles and joint
+    weights, and a static pose must be held for POSE_HOLD_TIME_SECONDS to advance.
+
+    For an authenticated connection (`user_id`), progress through a song's
+    choreography is recorded as the user's song status. With `recording`
+    (a session_recording.RecordingBuffer), every scored frame is recorded too.
+    """
+
+    def __init__(self, user_id=None, recording=None):
+        self.user_id = user_id
+        self.current_pose_index = 0
+        self.sequence = None
+        self.song_id = None
+        self.progress_range = (0, 100)
+        self.recorded_progress = 0
+        self.tracker = None
+        self.detect_k = 0
+        self.image_frames = False  # binary frames are encoded images, not landmarks
+        self.recording = recording
+        self.angle_errors = None  # per-joint |user - reference| of the last scored frame
+        self.smoother = AngleSmoother(window=settings.POSE_SMOOTHING_WINDOW)
+        self.hold_timer = HoldTimer(settings.POSE_HOLD_TIME_SECONDS)
+
+    @property
+    def mode(self):
+        if self.tracker is not None:
+            return "choreography"
+        return "detect" if self.detect_k else "static"
+
+    def detect(self, k):
+        self.stop_following()
+        self.detect_k = k
+
+    def follow(self, sequence, song_id=None, progress_range=(0, 100)):
+        self.detect_k = 0
+        self.hold_timer.reset()
+        self.sequence = sequence
+        self.song_id = song_id
+        self.progress_range = progress_range
+        self.recorded_progress = 0
+        self.tracker = StreamingDTW(
+            sequence.angles,
+            window=settings.CHOREOGRAPHY_DTW_WINDOW,
+            max_step=settings.CHOREOGRAPHY_DTW_MAX_STEP,
+            decay=settings.CHOREOGRAPHY_DTW_DECAY,
+        )
+
+    def stop_following(self):
+        self.sequence = None
+        self.song_id = None
+        self.tracker = None
+        self.detect_k = 0
+        self.hold_timer.reset()
+
+    def no_person(self, poses):
+        """Reply fields when the frame has no landmarks."""
+        self.angle_errors = None
+        self.smoother.reset()
+        self.hold_timer.reset()
+        if self.tracker is not None:
+            return 0, FEEDBACK_NO_PERSON, -1, False, self.tracker.position, {"progress": self._progress()}
+        return 0, FEEDBACK_NO_PERSON, -1, False, self.current_pose_index, {
+            "current_pose": poses.name(self.current_pose_index)
+        }
+
+    async def score(self, user_keypoints, poses):
+        """
+        Scores one frame. Returns (accuracy, feedback code, joint index, advanced,
+        index, JSON-only fields); `index` is the static pose or the matched
+        reference frame, `advanced` means next pose / sequence completed.
+        """
+        if self.tracker is not None:
+            return await self._score_choreography(user_keypoints)
+
+        nearest = None
+        if self.detect_k:
+            # Score against whichever reference pose the dancer is closest to
+            nearest = find_nearest_poses(poses, user_keypoints, self.detect_k)
+            self.current_pose_index = nearest[0]["index"]
+
+        ref_keypoints = poses.keypoints[self.current_pose_index]
+        ref_angles = poses.angles[self.current_pose_index]
+
+        # --- Angles (batched with other sessions' frames), smoothed over recent frames ---
+        user_angles, _ = await pose_scheduler.score(
+            user_keypoints, ref_keypoints, ref_angles,
+            ref_row=(poses.file_id, self.current_pose_index),
+        )
+        user_angles = self.smoother.update(user_angles)
+        self.angle_errors = np.abs(user_angles - ref_angles)
+        accuracy = float(calculate_weighted_accuracy_array(
+            user_angles, ref_angles, MAX_ANGLE_DIFFERENCE_FOR_ACCURACY, JOINT_WEIGHT_ARRAY
+        ))
+
+        # --- Get max angle difference ---
+        max_diff_name, max_diff = get_max_angle_difference_array(user_angles, ref_angles)
+        joint_index = ANGLE_NAMES.index(max_diff_name) if max_diff_name else -1
+
+        # --- Feedback ---
+        if accuracy > 90:
+            feedback_code = FEEDBACK_GREAT
+        elif max_diff_name:
+            feedback_code = FEEDBACK_FOCUS
+        else:
+            feedback_code = FEEDBACK_ALIGN
+
+        if nearest is not None:
+            return accuracy, feedback_code, joint_index, False, self.current_pose_index, {
+                "current_pose": poses.name(self.current_pose_index),
+                "nearest": nearest,
+            }
+
+        # --- Check if the pose has been held long enough to move on ---
+        next_pose_triggered = False
+        extra = {}
+        matched = accuracy >= ACCURACY_THRESHOLD_PERCENT
+        held = self.hold_timer.update(matched)
+        if matched and held >= self.hold_timer.hold_seconds:
+            self.current_pose_index = (self.current_pose_index + 1) % len(poses)
+            next_pose_triggered = True
+            feedback_code = FEEDBACK_NEXT_POSE
+            self.smoother.reset()
+        elif matched:
+            feedback_code = FEEDBACK_GREAT
+            extra["hold_remaining"] = round(self.hold_timer.remaining(held), 2)
+
+        return accuracy, feedback_code, joint_index, next_pose_triggered, self.current_pose_index, {
+            "current_pose": poses.name(self.current_pose_index),
+            **extra,
+        }
+
+    async def _score_choreography(self, user_keypoints):
+        # Angles don't depend on the reference used for normalization, so the
+        # last matched frame is as good as any for the batched scoring call
+        ref_index = self.tracker.position
+        user_angles, _ = await pose_scheduler.score(
+            user_keypoints, self.sequence.keypoints[ref_index], self.sequence.angles[ref_index]
+        )
+
+        # --- Align with the sequence (tolerates tempo drift) ---
+        ref_index, path_cost = self.tracker.update(user_angles)
+        if path_cost is None:
+            accuracy = 0.0
+        else:
+            accuracy = max(0.0, 100 - (path_cost / MAX_ANGLE_DIFFERENCE_FOR_ACCURACY) * 100)
+
+        self.angle_errors = np.abs(user_angles - self.sequence.angles[ref_index])
+        max_diff_name, _ = get_max_angle_difference_array(user_angles, self.sequence.angles[ref_index])
+        joint_index = ANGLE_NAMES.index(max_diff_name) if max_diff_name else -1
+
+        if self.tracker.completed:
+            feedback_code = FEEDBACK_SEQUENCE_COMPLETE
+        elif accuracy > 90:
+            feedback_code = FEEDBACK_GREAT
+        elif max_diff_name:
+            feedback_code = FEEDBACK_FOCUS
+        else:
+            feedback_code = FEEDBACK_ALIGN
+
+        await self._record_progress()
+
+        return accuracy, feedback_code, joint_index, self.tracker.completed, ref_index, {
+            "progress": self._progress(),
+            "tempo": round(self.tracker.tempo, 2),
+        }
+
+    async def _record_progress(self):
+        """
+        Saves whole-percent gains of song progress through the write-behind
+        status buffer; a step's progress is scaled into its share of the song.
+        """
+        if self.user_id is None or self.song_id is None:
+            return
+        start, end = self.progress_range
+        fraction = 1.0 if self.tracker.completed else self._progress() / 100
+        progress = min(100, int(round(start + (end - start) * fraction, 6)))
+        if progress > self.recorded_progress:
+            self.recorded_progress = progress
+            await status_writer.add(
+                ObjectId(self.user_id), self.song_id,
+                "completed" if progress >= 100 else "resume", progress, datetime.utcnow(),
+            )
+
+    def _progress(self):
+        return round(100 * self.tracker.position / max(self.tracker.length - 1, 1), 1)
+
+
+async def read_frames(ws: WebSocket, mailbox: LatestFrameMailbox):
+    """
+    Reader task: moves client messages into the mailbox as fast as they arrive,
+    so frames the scorer can't keep up with are dropped instead of piling up.
+    """
+    try:
+        while True:
+            frame_format, data = await receive_frame(ws)
+            dropped = mailbox.dropped
+            if frame_format == "json" and "mode" in data:
+                mailbox.put_control((frame_format, data))
+            else:
+                mailbox.put((frame_format, data))
+                POSE_FRAMES_RECEIVED.inc()
+            if mailbox.dropped != dropped:
+                POSE_FRAMES_DROPPED.inc()
+    except Exception as e:
+        mailbox.close(e)
+
+
 @router.websocket("/ws/pose")
 async def websocket_endpoint(ws: WebSocket):
+    # Authenticate once per connection, not per message
+    try:
+        user_id = websocket_user_id(ws)
+    except JWTError:
+        # A bad token is refused even when anonymous sessions are allowed
+        await ws.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if user_id is None and settings.POSE_WS_REQUIRE_AUTH:
+        await ws.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
     await ws.accept()
-    current_pose_index = 0
+    POSE_SESSIONS.inc()
+    session = PoseSession(user_id, session_recorder.open(user_id))
+    mailbox = LatestFrameMailbox()
+    rate_advisor = SendRateAdvisor(settings.POSE_CLIENT_MIN_FPS, settings.POSE_CLIENT_MAX_FPS)
+    reader = asyncio.create_task(read_frames(ws, mailbox))
 
     try:
         while True:
-            if not REFERENCE_POSES:
+            poses = reference_poses.get()
+            if not len(poses):
                 await ws.send_json({"error": "No reference poses loaded on the server."})
                 break
 
-            ref_pose = REFERENCE_POSES[current_pose_index]
-            ref_keypoints = ref_pose["keypoints"]
-            ref_angles = ref_pose["angles"]
+            # The library may have been hot-reloaded with fewer poses
+            session.current_pose_index %= len(poses)
 
-            data = await ws.receive_json()
-            user_landmarks = data.get("landmarks")
-
-            if not user_landmarks:
-                await ws.send_json({
-                    "accuracy": 0,
-                    "feedback": "No person detected.",
-                    "current_pose": ref_pose["name"]
-                })
+            # Always the newest frame; older unprocessed ones were dropped
+            frame_format, data = await mailbox.get()
+            started = time.perf_counter()
+            if frame_format == "binary" and session.image_frames:
+                # Camera image: extract the landmarks here (replies are JSON)
+                frame_format = "image"
+                try:
+                    user_keypoints, timings = await pose_extractor.extract(data)
+                except ImageFrameError as e:
+                    await ws.send_json({"error": str(e)})
+                    continue
+            elif frame_format == "binary":
+                try:
+                    user_keypoints = decode_binary_frame(data)
+                except FrameFormatError as e:
+                    await ws.send_json({"error": str(e)})
+                    continue
+            elif data.get("mode") == "binary":
+                # Protocol negotiation: send the lookup tables for binary replies
+                session.image_frames = False
+                await ws.send_text(binary_handshake(poses.names))
                 continue
+            elif data.get("mode") == "image":
+                # Binary frames carry JPEG / WebP images from now on
+                if not pose_extractor.enabled:
+                    await ws.send_json({"error": "Image frames are disabled on this server."})
+                    continue
+                try:
+                    await pose_extractor.start()
+                except Exception as e:
+                    await ws.send_json({"error": f"Pose extraction unavailable: {e}"})
+                    continue
+                session.image_frames = True
+                await ws.send_json({"mode": "image", "max_image_bytes": pose_extractor.max_image_bytes,
+                                    "max_image_pixels": pose_extractor.max_image_pixels})
+                continue
+            elif data.get("mode") == "choreography":
+                # Follow a song's / step's pose sequence instead of the static poses
+                try:
+                    sequence, song_id, progress_range = await find_choreography(data)
+                except ChoreographyNotFound as e:
+                    await ws.send_json({"error": str(e)})
+                    continue
+                session.follow(sequence, song_id, progress_range)
+                if session.recording is not None:
+                    session.recording.mark({"mode": "choreography", "choreography": sequence.key,
+                                            "song_id": None if song_id is None else str(song_id)})
+                await ws.send_json({"mode": "choreography", "choreography": sequence.key, "frames": len(sequence)})
+                continue
+            elif data.get("mode") == "detect":
+                # Report the closest reference poses instead of following a fixed order
+                k = parse_detect_k(data.get("k", 3))
+                if k is None:
+                    await ws.send_json({"error": "k must be an integer between 1 and 50."})
+                    continue
+                session.detect(k)
+                if session.recording is not None:
+                    session.recording.mark({"mode": "detect", "k": session.detect_k})
+                await ws.send_json({"mode": "detect", "k": session.detect_k})
+                continue
+            elif data.get("mode") == "static":
+                session.stop_following()
+                if session.recording is not None:
+                    session.recording.mark({"mode": "static"})
+                await ws.send_json({"mode": "static", "current_pose": poses.name(session.current_pose_index)})
+                continue
+            else:
+                user_keypoints = decode_json_frame(data)
 
-            user_keypoints = {i: (lm['x'], lm['y']) for i, lm in enumerate(user_landmarks)}
-            normalized_user_keypoints = normalize_skeleton(user_keypoints, ref_keypoints)
-            user_angles = calculate_angles_from_keypoints(normalized_user_keypoints)
-
-            # --- Get max angle difference ---
-            max_diff_name, max_diff = get_max_angle_difference(user_angles, ref_angles)
+            scoring_started = time.perf_counter()
+            if user_keypoints is None:
+                accuracy, feedback_code, joint_index, advanced, index, extra = session.no_person(poses)
+            else:
+                accuracy, feedback_code, joint_index, advanced, index, extra = await session.score(user_keypoints, poses)
 
-            # --- Calculate overall accuracy ---
-            total_diff = sum(abs(user_angles.get(name, 0) - ref_val) for name, ref_val in ref_angles.items())
-            count = len(ref_angles)
-            avg_diff = total_diff / count if count else MAX_ANGLE_DIFFERENCE_FOR_ACCURACY
-            accuracy = max(0, 100 - (avg_diff / MAX_ANGLE_DIFFERENCE_FOR_ACCURACY) * 100)
+            if frame_format == "image":
+                # Send back what was extracted, so the client can draw the skeleton
+                timings["score"] = pose_extractor.record_score(time.perf_counter() - scoring_started)
+                for stage, ms in timings.items():
+                    POSE_STAGE_LATENCY.observe(ms / 1000, stage)
+                extra = {
+                    **extra,
+                    "landmarks": None if user_keypoints is None else [
+                        [round(x, 4), round(y, 4)] for x, y in user_keypoints.tolist()
+                    ],
+                    "timings_ms": {stage: round(ms, 2) for stage, ms in timings.items()},
+                }
 
-            # --- Feedback ---
-            if accuracy > 90:
-                feedback = "Great job! Hold the pose."
-            elif max_diff_name:
-                feedback = f"Focus on your {max_diff_name.replace('_', ' ')}."
+            if frame_format == "binary":
+                await ws.send_bytes(encode_binary_reply(accuracy, advanced, feedback_code, joint_index, index))
+            elif user_keypoints is None:
+                await ws.send_json({"accuracy": 0, "feedback": feedback_text(FEEDBACK_NO_PERSON), **extra})
+            elif session.tracker is not None:
+                await ws.send_json({
+                    "accuracy": round(accuracy, 2),
+                    "feedback": feedback_text(feedback_code, joint_index),
+                    "completed": advanced,
+                    "reference_frame": index,
+                    **extra,
+                })
             else:
-                feedback = "Align with the pose."
-
-            # --- Check if next pose should be triggered ---
-            next_pose_triggered = False
-            if accuracy >= ACCURACY_THRESHOLD_PERCENT:
-                current_pose_index = (current_pose_index + 1) % len(REFERENCE_POSES)
-                next_pose_triggered = True
-                feedback = "Excellent! Moving to the next pose."
-
-            await ws.send_json({
-                "accuracy": round(accuracy, 2),
-                "feedback": feedback,
-                "next_pose": next_pose_triggered,
-                "current_pose": REFERENCE_POSES[current_pose_index]["name"]
-            })
+                await ws.send_json({
+                    "accuracy": round(accuracy, 2),
+                    "feedback": feedback_text(feedback_code, joint_index),
+                    "next_pose": advanced,
+                    **extra,
+                })
+
+            if session.recording is not None:
+                session.recording.add(started, user_keypoints, accuracy, feedback_code, joint_index,
+                                      advanced, index, session.angle_errors, session.mode)
+
+            # --- Backpressure: tell the client how fast to send ---
+            elapsed = time.perf_counter() - started
+            POSE_FRAME_LATENCY.observe(elapsed)
+            rate_advisor.frame_done(elapsed)
+            recommended_fps = rate_advisor.advise()
+            if recommended_fps is not None:
+                await ws.send_json({"recommended_fps": recommended_fps, "frames_dropped": mailbox.dropped})
 
     except WebSocketDisconnect:
         print("Client disconnected")
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
+        POSE_SESSIONS.dec()
+        session_recorder.close(session.recording)
+        reader.cancel()
         await ws.close()
+
+
+@router.post("/api/pose/video/{song_id}")
+async def analyze_recorded_video(
+    song_id: str,
+    request: Request,
+    stride: int = Query(1, ge=1, le=30),
+    max_side: Optional[int] = Query(None, ge=64, le=4096),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    current_user_id: str = Depends(get_current_user_id),
+):
+    """
+    Scores an uploaded practice recording (the raw video file as the request
+    body) against the song's choreography. Results stream back as they are
+    computed: one row per analyzed frame, then a summary row, as NDJSON or as
+    Server-Sent Events (`format=sse`). `stride` analyzes every n-th frame only
+    and `max_side` downscales frames first, trading accuracy for speed.
+    """
+    if not video_analyzer.enabled:
+        raise HTTPException(status_code=503, detail="Video analysis is disabled on this server.")
+    try:
+        sequence, _, _ = await find_choreography({"song_id": song_id})
+    except ChoreographyNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    max_bytes = settings.VIDEO_ANALYSIS_MAX_UPLOAD_BYTES
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Video exceeds {max_bytes} bytes.")
+    try:
+        path = await spool_upload(request.stream(), max_bytes, settings.VIDEO_ANALYSIS_UPLOAD_FOLDER)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not await asyncio.to_thread(is_readable_video, path):
+        remove_upload(path)
+        raise HTTPException(status_code=415, detail="The upload is not a video OpenCV can decode.")
+
+    dtw_options = {
+        "window": settings.CHOREOGRAPHY_DTW_WINDOW,
+        "max_step": settings.CHOREOGRAPHY_DTW_MAX_STEP,
+        "decay": settings.CHOREOGRAPHY_DTW_DECAY,
+    }
+
+    async def stream_rows():
+        try:
+            rows = video_analyzer.analyze(
+                path, sequence, MAX_ANGLE_DIFFERENCE_FOR_ACCURACY, stride, max_side, dtw_options
+            )
+            try:
+                async for row in rows:
+                    yield encode_row("summary" if "summary" in row else "frame", row)
+            except VideoAnalysisUnavailable as e:
+                # The status line is already sent; the client may retry with the same upload
+                yield encode_row("error", {"error": str(e), "status": 503})
+            except Exception as e:
+                # The status line is already sent; report the failure in the stream
+                yield encode_row("error", {"error": str(e)})
+            finally:
+                await rows.aclose()
+        finally:
+            remove_upload(path)
+
+    def encode_row(event, row):
+        if format == "sse":
+            return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(row) + b"\n\n"
+        return orjson.dumps(row) + b"\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_rows(), media_type=media_type, headers={"Cache-Control": "no-store"},
+        background=BackgroundTask(remove_upload, path),
+    )
@@ -1,37 +1,139 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
+import base64
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, status
+from typing import List, Optional
 from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime
 
-from models import User, Song, UserSongStatus, UserStatusUpdate, UserStatusResponse, UpdateSuccessResponse
+from models import User, DanceStyle, Song, UserSongStatus, UserStatusUpdate, UserStatusResponse, UpdateSuccessResponse
 from auth import get_current_user_id
+from routes.dance_routes import catalog_cache, load_song_ids
+from status_writer import status_writer, StatusWriteError
 
 router = APIRouter()
 
+# --- Status pagination ---
+STATUS_PAGE_MAX = 500
+
+
+def encode_status_cursor(last_accessed: datetime, song_id: str) -> str:
+    """Opaque cursor pointing just past a status row in (last_accessed, song) order."""
+    raw = f"{last_accessed.isoformat()}|{song_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_status_cursor(cursor: str):
+    try:
+        last_accessed, song_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(last_accessed), ObjectId(song_id)
+    except (ValueError, UnicodeDecodeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def user_status_pipeline(user_id: ObjectId, direction: int, cursor=None, limit=None):
+    """
+    One aggregation for the user's statuses: sort and page on the status
+    collection, then $lookup each song together with its dance style.
+    A user has one status per song, so (last_accessed, song) is a unique sort key.
+    """
+    match = {"user.$id": user_id}
+    if cursor is not None:
+        last_accessed, song_id = cursor
+        after = "$lt" if direction < 0 else "$gt"
+        match["$or"] = [
+            {"last_accessed": {after: last_accessed}},
+            {"last_accessed": last_accessed, "song.$id": {after: song_id}},
+        ]
+
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"last_accessed": direction, "song.$id": direction}},
+    ]
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    pipeline += [
+        {"$lookup": {
+            "from": Song.Settings.name,
+            "localField": "song.$id",
+            "foreignField": "_id",
+            "pipeline": [
+                {"$lookup": {
+                    "from": DanceStyle.Settings.name,
+                    "localField": "dance_style.$id",
+                    "foreignField": "_id",
+                    "as": "dance_style",
+                }},
+                {"$unwind": "$dance_style"},
+                {"$project": {"_id": 0, "name": 1, "dance_name": "$dance_style.dance_name"}},
+            ],
+            "as": "song_doc",
+        }},
+        # Rows of deleted songs are kept (and skipped later) so paging stays aligned
+        {"$unwind": {"path": "$song_doc", "preserveNullAndEmptyArrays": True}},
+        {"$project": {
+            "_id": 0,
+            "song_id": {"$toString": "$song.$id"},
+            "song_name": "$song_doc.name",
+            "dance_name": "$song_doc.dance_name",
+            "status": 1,
+            "progress": 1,
+            "last_accessed": 1,
+        }},
+    ]
+    return pipeline
+
+
 @router.get("/status", response_model=List[UserStatusResponse])
-async def get_user_song_statuses(current_user_id: str = Depends(get_current_user_id)):
+async def get_user_song_statuses(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=STATUS_PAGE_MAX),
+    cursor: Optional[str] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    current_user_id: str = Depends(get_current_user_id),
+):
     """
-    Fetches all song progress records for the currently logged-in user.
+    Fetches the song progress records of the currently logged-in user, sorted
+    by last access (`order`). With `limit`, one page is returned and the
+    cursor for the next page is sent in the X-Next-Cursor header.
     """
-    statuses = await UserSongStatus.find(
-        UserSongStatus.user.id == ObjectId(current_user_id)
-    ).project(UserStatusResponse).to_list()
-
-    # We need to fetch song and dance style names
-    response = []
-    for status_doc in statuses:
-        # Fetch related song and then its dance style
-        song_with_style = await Song.get(status_doc.song.id, fetch_links=True)
-        if song_with_style:
-            response.append(
-                UserStatusResponse(
-                    song_name=song_with_style.name,
-                    dance_name=song_with_style.dance_style.dance_name,
-                    status=status_doc.status,
-                    progress=status_doc.progress,
-                )
+    direction = -1 if order == "desc" else 1
+    after = decode_status_cursor(cursor) if cursor else None
+    user_id = ObjectId(current_user_id)
+
+    # Read-your-writes: the sorted, paged aggregation can't overlay rows that
+    # don't exist yet, so this user's buffered updates are written first
+    if status_writer.has_pending(user_id):
+        try:
+            await status_writer.flush_user(user_id)
+        except StatusWriteError:
+            # Answering without them would show stale progress; they stay queued for a retry
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Your latest progress is still being saved, please retry shortly.",
             )
-    return response
+
+    # Fetch one extra row to know whether another page follows
+    pipeline = user_status_pipeline(user_id, direction, after, limit + 1 if limit else None)
+    rows = await UserSongStatus.aggregate(pipeline).to_list()
+
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_status_cursor(rows[-1]["last_accessed"], rows[-1]["song_id"])
+
+    return [UserStatusResponse(**row) for row in rows if row.get("song_name") is not None]
+
+@router.get("/status-writer/stats")
+async def get_status_writer_stats():
+    """Queue depth and flush latency of the write-behind progress buffer."""
+    return status_writer.stats()
+
+
+async def song_exists(song_id: ObjectId) -> bool:
+    """Checks the cached catalog id set first; only unknown ids hit the database."""
+    if song_id in await catalog_cache.get("song_ids", load_song_ids):
+        return True
+    return await Song.find_one(Song.id == song_id) is not None
+
 
 @router.patch("/status/{song_id}", response_model=UpdateSuccessResponse)
 async def update_user_song_status(
@@ -41,34 +143,21 @@ async def update_user_song_status(
 ):
     """
     Updates the progress or status for a specific song for the logged-in user.
-    If no status record exists for this user and song, it creates one.
+    If no status record exists for this user and song, it creates one, in the
+    same atomic upsert (the unique (user, song) index prevents duplicates).
+    Writes are buffered briefly and batched with other users' updates.
     """
     if not ObjectId.is_valid(song_id):
         raise HTTPException(status_code=400, detail="Invalid song_id format")
+    song_object_id = ObjectId(song_id)
 
-    # Find the existing status record or create a new one
-    user_status = await UserSongStatus.find_one(
-        UserSongStatus.user.id == ObjectId(current_user_id),
-        UserSongStatus.song.id == ObjectId(song_id)
-    )
+    # The user comes from a verified token; only the song needs checking
+    if not await song_exists(song_object_id):
+        raise HTTPException(status_code=404, detail="User or Song not found")
 
-    if not user_status:
-        # Ensure user and song exist before creating a new status
-        user = await User.get(current_user_id)
-        song = await Song.get(song_id)
-        if not user or not song:
-            raise HTTPException(status_code=404, detail="User or Song not found")
-        
-        user_status = UserSongStatus(user=user, song=song)
-
-    # Update fields if they are provided in the request
-    if update_data.status is not None:
-        user_status.status = update_data.status
-    if update_data.progress is not None:
-        user_status.progress = update_data.progress
-    
-    user_status.last_accessed = datetime.utcnow()
-    
-    await user_status.save()
+    # Coalesced with other updates and written behind (see status_writer.py)
+    await status_writer.add(
+        ObjectId(current_user_id), song_object_id, update_data.status, update_data.progress, datetime.utcnow()
+    )
 
     return UpdateSuccessResponse(message="Progress updated successfully", status="success")
@@ -4,6 +4,7 @@ from beanie import init_beanie
 from models import User, DanceStyle, Song, TutorialStep, UserSongStatus # Import all necessary models
 import os
 from dotenv import load_dotenv
+from catalog_cache import bump_catalog_version
 
 # Load environment variables from .env file
 load_dotenv()
@@ -136,6 +137,9 @@ async def seed_data():
     print(f"  Songs: {await Song.count()}")
     print(f"  TutorialSteps: {await TutorialStep.count()}")
 
+    # Running API workers drop their cached catalog on their next version poll
+    await bump_catalog_version()
+
 
 if __name__ == "__main__":
     print("Starting database seeding...")
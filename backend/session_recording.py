@@ -0,0 +1,411 @@
+"""
+Compact, append-only recording of /ws/pose sessions.
+
+Every scored frame of a session (landmarks, accuracy, feedback, per-joint
+angle errors) is buffered in preallocated column arrays and written out in
+chunks of `chunk_frames` frames by a single writer thread, so the event loop
+never waits on disk and no per-frame JSON or MongoDB write is paid. Files are
+read back with PoseRecording, which memory-maps them; see `python
+session_recording.py FILE` for a summary of one recording.
+
+Layout (little-endian, every section 64-byte aligned):
+
+    header      HEADER struct + JSON metadata (columns, angle names, user, start time)
+    chunk*      CHUNK_HEADER (b"CHNK", frames), then one section per column,
+                each holding that column's values for the chunk's frames
+    event*      CHUNK_HEADER (b"EVNT", size), then a JSON blob (e.g. a mode change)
+
+Chunks and events are only ever appended; a chunk cut short by a crash is
+ignored by the reader.
+"""
+import argparse
+import asyncio
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from static_pose_comparision.pose_utils import ANGLE_NAMES, NUM_LANDMARKS
+
+RECORDING_MAGIC = b"NVPOSREC"
+RECORDING_FORMAT_VERSION = 1
+RECORDING_SUFFIX = ".posrec"
+# magic, format version, metadata size
+HEADER = struct.Struct("<8s2I")
+# tag, frames (CHNK) or blob size (EVNT)
+CHUNK_HEADER = struct.Struct("<4sI")
+CHUNK_TAG = b"CHNK"
+EVENT_TAG = b"EVNT"
+ALIGNMENT = 64
+
+LANDMARK_SCALE = 10000  # landmarks are stored as round(normalized coordinate * scale) in int16
+MISSING_LANDMARK = -32768
+MODES = ("static", "detect", "choreography")
+FLAG_PERSON = 1
+FLAG_ADVANCED = 2
+
+# name, dtype, per-frame shape
+COLUMNS = (
+    ("time_ms", np.uint32, ()),  # since the session started
+    ("landmarks", np.int16, (NUM_LANDMARKS, 2)),  # quantized, see LANDMARK_SCALE
+    ("angle_errors", np.float16, (len(ANGLE_NAMES),)),  # |user - reference| degrees, NaN if unknown
+    ("accuracy", np.uint16, ()),  # hundredths of a percent
+    ("reference_index", np.int32, ()),  # static pose or matched choreography frame
+    ("feedback", np.uint8, ()),  # pose_protocol FEEDBACK_* code
+    ("joint", np.int8, ()),  # index into ANGLE_NAMES, -1 for none
+    ("mode", np.uint8, ()),  # index into MODES
+    ("flags", np.uint8, ()),  # FLAG_PERSON | FLAG_ADVANCED
+)
+
+
+class RecordingFormatError(ValueError):
+    """Raised when a file is not a pose recording or has an unsupported version."""
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _chunk_layout(frames, columns):
+    """Returns [(name, offset from the chunk start, dtype, shape)] and the chunk size."""
+    layout = []
+    offset = _align(CHUNK_HEADER.size)
+    for name, dtype, shape in columns:
+        dtype = np.dtype(dtype)
+        layout.append((name, offset, dtype, (frames,) + tuple(shape)))
+        offset = _align(offset + dtype.itemsize * frames * int(np.prod(shape)))
+    return layout, offset
+
+
+def quantize_landmarks(points):
+    """(33, 2) normalized float landmarks -> int16, NaN as MISSING_LANDMARK."""
+    scaled = np.clip(np.rint(np.asarray(points, dtype=np.float64) * LANDMARK_SCALE), -32767, 32767)
+    scaled[np.isnan(scaled)] = MISSING_LANDMARK
+    return scaled.astype(np.int16)
+
+
+def dequantize_landmarks(quantized):
+    points = quantized.astype(np.float32) / LANDMARK_SCALE
+    points[quantized == MISSING_LANDMARK] = np.nan
+    return points
+
+
+class RecordingBuffer:
+    """
+    Frames of one session not yet handed to the writer thread, as one
+    preallocated array per column. Only touched from the event loop.
+    """
+
+    def __init__(self, recorder, path, chunk_frames):
+        self.recorder = recorder
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.started = time.perf_counter()
+        self.frames = 0
+        self.file = None  # owned by the writer thread
+        self._new_chunk()
+
+    def _new_chunk(self):
+        self.columns = {
+            name: np.empty((self.chunk_frames,) + shape, dtype=dtype) for name, dtype, shape in COLUMNS
+        }
+        self.count = 0
+
+    def add(self, received_at, keypoints, accuracy, feedback_code, joint_index, advanced, index, angle_errors, mode):
+        """Appends one scored frame; `received_at` is its time.perf_counter() arrival time."""
+        i = self.count
+        columns = self.columns
+        columns["time_ms"][i] = max(0.0, (received_at - self.started) * 1000)
+        if keypoints is None:
+            columns["landmarks"][i] = MISSING_LANDMARK
+        else:
+            columns["landmarks"][i] = quantize_landmarks(keypoints)
+        columns["angle_errors"][i] = np.nan if angle_errors is None else angle_errors
+        columns["accuracy"][i] = round(min(max(accuracy, 0.0), 100.0) * 100)
+        columns["reference_index"][i] = index
+        columns["feedback"][i] = feedback_code
+        columns["joint"][i] = joint_index
+        columns["mode"][i] = MODES.index(mode)
+        columns["flags"][i] = (FLAG_PERSON if keypoints is not None else 0) | (FLAG_ADVANCED if advanced else 0)
+        self.count += 1
+        self.frames += 1
+        if self.count == self.chunk_frames:
+            self.flush()
+
+    def mark(self, event: dict):
+        """Records an event (e.g. a mode change) after the frames recorded so far."""
+        self.flush()
+        self.recorder._submit(self.recorder._write_event, self, {"frame": self.frames, **event})
+
+    def flush(self):
+        """Hands the buffered frames to the writer thread; the buffer starts a fresh chunk."""
+        if self.count:
+            columns, count = self.columns, self.count
+            self._new_chunk()
+            self.recorder._submit(self.recorder._write_chunk, self, columns, count)
+
+
+class PoseSessionRecorder:
+    """
+    Opens one recording per /ws/pose session and appends their chunks from a
+    single writer thread. An empty `folder` disables recording. Chunks beyond
+    `max_pending_chunks` waiting for the writer are dropped (the time_ms gap
+    shows where), so a slow disk can't grow memory without bound.
+    """
+
+    def __init__(self, folder: str, chunk_frames: int = 256, max_pending_chunks: int = 64, stats_window: int = 256):
+        self.folder = folder
+        self.chunk_frames = chunk_frames
+        self.max_pending_chunks = max_pending_chunks
+        self._executor = None
+        self._open = set()
+        self._lock = threading.Lock()
+
+        # --- Stats ---
+        self.recordings = 0
+        self.frames = 0
+        self.pending = 0
+        self.chunks_written = 0
+        self.chunks_dropped = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+        self._write_ms = deque(maxlen=stats_window)
+
+    @property
+    def enabled(self):
+        return bool(self.folder)
+
+    def open(self, user_id=None):
+        """Starts recording a session. Returns its RecordingBuffer, or None when recording is off."""
+        if not self.enabled:
+            return None
+        if self._executor is None:
+            os.makedirs(self.folder, exist_ok=True)
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pose-recording")
+
+        started_at = datetime.now(timezone.utc)
+        name = f"{started_at:%Y%m%d-%H%M%S}-{user_id or 'anonymous'}-{uuid.uuid4().hex[:8]}{RECORDING_SUFFIX}"
+        buffer = RecordingBuffer(self, os.path.join(self.folder, name), self.chunk_frames)
+        metadata = {
+            "user_id": user_id,
+            "started_at": started_at.isoformat(),
+            "columns": [[name, np.dtype(dtype).str, list(shape)] for name, dtype, shape in COLUMNS],
+            "angle_names": list(ANGLE_NAMES),
+            "modes": list(MODES),
+            "landmark_scale": LANDMARK_SCALE,
+        }
+        self._open.add(buffer)
+        self.recordings += 1
+        self._submit(self._write_header, buffer, metadata, always=True)
+        return buffer
+
+    def close(self, buffer):
+        """Writes out the session's remaining frames and closes its file."""
+        if buffer is None or buffer not in self._open:
+            return
+        self._open.discard(buffer)
+        buffer.flush()
+        self.frames += buffer.frames
+        self._submit(self._close_file, buffer, always=True)
+
+    async def stop(self):
+        """Closes every open recording and waits for the writer thread to finish."""
+        for buffer in list(self._open):
+            self.close(buffer)
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, wait=True)
+
+    def _submit(self, func, buffer, *args, always=False):
+        # Headers and closes are never dropped: they keep the files well-formed
+        with self._lock:
+            if not always and self.pending >= self.max_pending_chunks:
+                self.chunks_dropped += 1
+                return
+            self.pending += 1
+        self._executor.submit(self._run, func, buffer, *args)
+
+    # --- Writer thread ---
+    def _run(self, func, buffer, *args):
+        started = time.perf_counter()
+        written = 0
+        try:
+            written = func(buffer, *args)
+        except OSError as e:
+            with self._lock:
+                self.write_errors += 1
+            print(f"Warning: Could not write pose recording {buffer.path}: {e}")
+            self._close_file(buffer)
+        finally:
+            # Any other error still frees the slot, or the backlog limit would drop every later chunk
+            with self._lock:
+                self.pending -= 1
+                if written:
+                    self.bytes_written += written
+                    self._write_ms.append((time.perf_counter() - started) * 1000)
+
+    def _append(self, buffer, data):
+        if buffer.file is None:
+            return 0
+        buffer.file.write(data)
+        # Readers only ever see whole chunks once they are flushed
+        buffer.file.flush()
+        return len(data)
+
+    def _write_header(self, buffer, metadata):
+        blob = json.dumps(metadata).encode("utf-8")
+        data = bytearray(_align(HEADER.size + len(blob)))
+        HEADER.pack_into(data, 0, RECORDING_MAGIC, RECORDING_FORMAT_VERSION, len(blob))
+        data[HEADER.size:HEADER.size + len(blob)] = blob
+        buffer.file = open(buffer.path, "wb")
+        return self._append(buffer, data)
+
+    def _write_chunk(self, buffer, columns, count):
+        layout, size = _chunk_layout(count, COLUMNS)
+        data = bytearray(size)
+        CHUNK_HEADER.pack_into(data, 0, CHUNK_TAG, count)
+        for name, offset, dtype, shape in layout:
+            values = columns[name][:count]
+            data[offset:offset + values.nbytes] = values.tobytes()
+        written = self._append(buffer, data)
+        if written:
+            with self._lock:
+                self.chunks_written += 1
+        return written
+
+    def _write_event(self, buffer, event):
+        blob = json.dumps(event).encode("utf-8")
+        data = bytearray(_align(_align(CHUNK_HEADER.size) + len(blob)))
+        CHUNK_HEADER.pack_into(data, 0, EVENT_TAG, len(blob))
+        start = _align(CHUNK_HEADER.size)
+        data[start:start + len(blob)] = blob
+        return self._append(buffer, data)
+
+    def _close_file(self, buffer):
+        if buffer.file is not None:
+            buffer.file.close()
+            buffer.file = None
+        return 0
+
+    def stats(self):
+        write_ms = np.array(self._write_ms) if self._write_ms else np.zeros(1)
+        return {
+            "enabled": self.enabled,
+            "recordings": self.recordings,
+            "active": len(self._open),
+            "frames": self.frames + sum(buffer.frames for buffer in self._open),
+            "pending_chunks": self.pending,
+            "chunks_written": self.chunks_written,
+            "chunks_dropped": self.chunks_dropped,
+            "bytes_written": self.bytes_written,
+            "write_errors": self.write_errors,
+            "write_ms_p50": round(float(np.percentile(write_ms, 50)), 3),
+            "write_ms_p99": round(float(np.percentile(write_ms, 99)), 3),
+        }
+
+
+class PoseRecording:
+    """
+    Read-only view of a recording file. The file is memory-mapped and each
+    chunk's columns are numpy views over the mapping; `column()` joins them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            # mmap can't map an empty file, so check the size before mapping
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise RecordingFormatError(f"{path} is too short to be a pose recording")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = self._mmap
+        magic, version, metadata_size = HEADER.unpack_from(buf, 0)
+        if magic != RECORDING_MAGIC:
+            raise RecordingFormatError(f"{path} is not a pose recording")
+        if version != RECORDING_FORMAT_VERSION:
+            raise RecordingFormatError(f"{path} has unsupported format version {version}")
+        if HEADER.size + metadata_size > len(buf):
+            raise RecordingFormatError(f"{path} is cut short inside its metadata")
+
+        self.metadata = json.loads(bytes(buf[HEADER.size:HEADER.size + metadata_size]))
+        self.columns = [(name, np.dtype(dtype), tuple(shape)) for name, dtype, shape in self.metadata["columns"]]
+        self.chunks = []
+        self.events = []
+
+        offset = _align(HEADER.size + metadata_size)
+        while offset + CHUNK_HEADER.size <= len(buf):
+            tag, count = CHUNK_HEADER.unpack_from(buf, offset)
+            if tag == CHUNK_TAG:
+                layout, size = _chunk_layout(count, self.columns)
+                if offset + size > len(buf):
+                    break  # cut short while being written
+                self.chunks.append({
+                    name: np.frombuffer(buf, dtype=dtype, count=int(np.prod(shape)), offset=offset + column_offset).reshape(shape)
+                    for name, column_offset, dtype, shape in layout
+                })
+            elif tag == EVENT_TAG:
+                start = offset + _align(CHUNK_HEADER.size)
+                size = _align(start + count) - offset
+                if offset + size > len(buf):
+                    break
+                self.events.append(json.loads(bytes(buf[start:start + count])))
+            else:
+                break
+            offset += size
+
+    def __len__(self):
+        return sum(len(chunk["time_ms"]) for chunk in self.chunks)
+
+    def column(self, name):
+        """One column for the whole session (a copy if it spans several chunks)."""
+        if len(self.chunks) == 1:
+            return self.chunks[0][name]
+        if not self.chunks:
+            dtype, shape = next((dtype, shape) for column, dtype, shape in self.columns if column == name)
+            return np.empty((0,) + shape, dtype=dtype)
+        return np.concatenate([chunk[name] for chunk in self.chunks])
+
+    def landmarks(self):
+        """(frames, 33, 2) normalized landmarks, NaN where no person / landmark."""
+        return dequantize_landmarks(self.column("landmarks"))
+
+    def accuracy(self):
+        return self.column("accuracy") / 100
+
+    def summary(self):
+        flags = self.column("flags")
+        person = (flags & FLAG_PERSON).astype(bool)
+        errors = self.column("angle_errors").astype(np.float32)[person]
+        seen = ~np.isnan(errors)
+        error_counts = seen.sum(axis=0)
+        mean_errors = np.where(seen, errors, 0).sum(axis=0) / np.maximum(error_counts, 1)
+        time_ms = self.column("time_ms")
+        return {
+            "user_id": self.metadata["user_id"],
+            "started_at": self.metadata["started_at"],
+            "frames": len(self),
+            "frames_with_person": int(person.sum()),
+            "seconds": round(float(time_ms[-1]) / 1000, 2) if len(time_ms) else 0.0,
+            "mean_accuracy": round(float(self.accuracy()[person].mean()), 2) if person.any() else 0.0,
+            "mean_angle_error": {
+                name: round(float(value), 2) if count else None
+                for name, value, count in zip(self.metadata["angle_names"], mean_errors, error_counts)
+            },
+            "events": self.events,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize recorded pose sessions.")
+    parser.add_argument("paths", nargs="+", help="recording files (*" + RECORDING_SUFFIX + ")")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        print(json.dumps({"path": path, **PoseRecording(path).summary()}, indent=2))
@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class StageStats:
+    """Frame rate and latency of one pipeline stage, over its last `window` frames."""
+
+    def __init__(self, name, window=120):
+        self.name = name
+        self.frames = 0
+        self._stamps = deque(maxlen=window)
+        self._latencies = deque(maxlen=window)
+
+    def tick(self, latency=None):
+        """Marks one frame done; `latency` is seconds since the frame was captured."""
+        self.frames += 1
+        self._stamps.append(time.perf_counter())
+        if latency is not None:
+            self._latencies.append(latency)
+
+    def fps(self):
+        stamps = list(self._stamps)
+        if len(stamps) < 2 or stamps[-1] == stamps[0]:
+            return 0.0
+        return (len(stamps) - 1) / (stamps[-1] - stamps[0])
+
+    def latency_ms(self, percentile=50):
+        latencies = list(self._latencies)
+        return float(np.percentile(latencies, percentile)) * 1000 if latencies else None
+
+    def overlay_text(self):
+        text = f"{self.name}: {self.fps():.1f} fps"
+        latency = self.latency_ms()
+        if latency is not None:
+            text += f", {latency:.0f} ms"
+        return text
+
+    def summary(self):
+        p50, p99 = self.latency_ms(50), self.latency_ms(99)
+        return {
+            "frames": self.frames,
+            "fps": round(self.fps(), 1),
+            "latency_ms_p50": None if p50 is None else round(p50, 1),
+            "latency_ms_p99": None if p99 is None else round(p99, 1),
+        }
+
+
+class Frame:
+    __slots__ = ("seq", "slot", "image", "captured_at")
+
+    def __init__(self, seq, slot, image, captured_at):
+        self.seq = seq
+        self.slot = slot
+        self.image = image
+        self.captured_at = captured_at
+
+
+class FrameRing:
+    """
+    Preallocated frame buffers shared by the capture thread and its consumers.
+
+    The capture thread decodes straight into a free slot and publishes it as
+    the latest frame. Consumers `acquire` the newest frame they haven't seen
+    (older ones are simply skipped) and `release` it when done; a pinned slot
+    is never overwritten, so with `slots` >= consumers + 2 capture never waits.
+    """
+
+    def __init__(self, shape, slots=4):
+        self.buffers = np.empty((slots,) + tuple(shape), dtype=np.uint8)
+        self._pins = [0] * slots
+        self._latest = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def free_slot(self):
+        """A slot the capture thread may fill (not pinned, not the latest frame), or None."""
+        with self._cond:
+            start = self._latest.slot + 1 if self._latest is not None else 0
+            for offset in range(len(self._pins)):
+                slot = (start + offset) % len(self._pins)
+                if not self._pins[slot] and (self._latest is None or slot != self._latest.slot):
+                    return slot
+            return None
+
+    def publish(self, slot, captured_at):
+        with self._cond:
+            self._seq += 1
+            self._latest = Frame(self._seq, slot, self.buffers[slot], captured_at)
+            self._cond.notify_all()
+
+    def acquire(self, after_seq=0, timeout=None):
+        """
+        Pins and returns the newest frame with seq > `after_seq`, waiting for one
+        if needed. Returns None on timeout, or once closed with nothing newer.
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.closed or (self._latest is not None and self._latest.seq > after_seq), timeout
+            )
+            frame = self._latest
+            if frame is None or frame.seq <= after_seq:
+                return None
+            self._pins[frame.slot] += 1
+            return frame
+
+    def release(self, frame):
+        with self._cond:
+            self._pins[frame.slot] -= 1
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class CaptureThread(threading.Thread):
+    """
+    Reads frames from a cv2.VideoCapture into a FrameRing, mirrored for a
+    selfie view. `pace_fps` throttles reading (a video file standing in for a
+    camera); frames arriving while every slot is busy are dropped.
+
+    A video file ends the capture once it is read to the end. A camera may
+    fail the odd read (USB hiccup, driver busy), so capture only gives up after
+    `max_read_failures` failed reads in a row, `retry_delay` seconds apart.
+    """
+
+    def __init__(self, cap, ring, flip=True, pace_fps=None, max_read_failures=50, retry_delay=0.02):
+        super().__init__(name="capture", daemon=True)
+        self.cap = cap
+        self.ring = ring
+        self.flip = flip
+        self.interval = 1.0 / pace_fps if pace_fps else None
+        self.stats = StageStats("capture")
+        self.dropped = 0
+        self.read_failures = 0
+        self.max_read_failures = max_read_failures
+        self.retry_delay = retry_delay
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def at_end_of_file(self):
+        """True once a video file has been read to its last frame (never for a camera)."""
+        frame_count = self.cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return frame_count > 0 and self.cap.get(cv2.CAP_PROP_POS_FRAMES) >= frame_count
+
+    def run(self):
+        scratch = None
+        next_frame = time.perf_counter()
+        failures_in_a_row = 0
+        try:
+            while not self._stop_event.is_set():
+                slot = self.ring.free_slot()
+                target = self.ring.buffers[slot] if slot is not None else scratch
+                ok, image = self.cap.read(target)
+                if not ok:
+                    self.read_failures += 1
+                    failures_in_a_row += 1
+                    if self.at_end_of_file():
+                        break
+                    if failures_in_a_row >= self.max_read_failures:
+                        print(f"Capture stopped: {failures_in_a_row} frame reads failed in a row.")
+                        break
+                    self._stop_event.wait(self.retry_delay)
+                    continue
+                failures_in_a_row = 0
+                captured_at = time.perf_counter()
+                if slot is None:
+                    scratch = image
+                    self.dropped += 1
+                else:
+                    if image is not target:  # frame size changed; copy into the ring's shape
+                        cv2.resize(image, target.shape[1::-1], dst=target)
+                    if self.flip:
+                        cv2.flip(target, 1, dst=target)
+                    self.ring.publish(slot, captured_at)
+                self.stats.tick()
+
+                if self.interval:
+                    next_frame += self.interval
+                    time.sleep(max(0.0, next_frame - time.perf_counter()))
+        finally:
+            self.ring.close()
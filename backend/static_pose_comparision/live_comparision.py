@@ -1,10 +1,15 @@
+import argparse
+import json
+import threading
+import time
 import cv2
 import mediapipe as mp
 import os
-import time
 import numpy as np
-from collections import deque
-from pose_utils import extract_keypoints_and_angles, get_max_angle_difference
+from pose_utils import extract_keypoints_array, get_max_angle_difference_array, calculate_weighted_accuracy_array
+from pose_smoothing import AngleSmoother, HoldTimer, JOINT_WEIGHT_ARRAY
+from frame_pipeline import CaptureThread, FrameRing, StageStats
+from pose_tracking import AdaptivePoseTracker
 
 # ---------------------- Config ----------------------
 REFERENCE_POSE_FOLDER = "reference_poses"
@@ -14,47 +19,16 @@ HOLD_TIME_SECONDS = 1.0
 ACCURACY_MAX_DIFF = 35
 REF_DISPLAY_SIZE = (150, 200)
 SMOOTHING_WINDOW = 5
+RING_SLOTS = 4 # capture buffers: one being written, one pinned by each consumer, one spare
 
-JOINT_WEIGHTS = {
-    "left_elbow": 1.5,
-    "right_elbow": 1.5,
-    "left_knee": 2.0,
-    "right_knee": 2.0,
-    "left_shoulder": 1.0,
-    "right_shoulder": 1.0,
-}
-
-angle_history = {}
 ref_angles_list = []
 ref_images_list = []
 ref_keypoints_list = []
 current_pose_index = 0
-match_start_time = None
+smoother = AngleSmoother(window=SMOOTHING_WINDOW)
+hold_timer = HoldTimer(HOLD_TIME_SECONDS)
 pose = mp.solutions.pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-
-# ---------------------- Smoothing ----------------------
-def smooth_angle(name, new_val):
-    if name not in angle_history:
-        angle_history[name] = deque(maxlen=SMOOTHING_WINDOW)
-    angle_history[name].append(new_val)
-    return np.mean(angle_history[name])
-
-# ---------------------- Accuracy ----------------------
-def calculate_overall_accuracy(live_angles, ref_angles):
-    total_score = 0.0
-    total_weight = 0.0
-
-    for name, ref_val in ref_angles.items():
-        live_val = live_angles.get(name)
-        if live_val is None: continue
-        diff = abs(live_val - ref_val)
-        capped_diff = min(diff, ACCURACY_MAX_DIFF)
-        score = max(0, ACCURACY_MAX_DIFF - capped_diff)
-        weight = JOINT_WEIGHTS.get(name, 1.0)
-        total_score += score * weight
-        total_weight += ACCURACY_MAX_DIFF * weight
-
-    return max(0.0, min(100.0, (total_score / total_weight) * 100)) if total_weight > 0 else 0.0
+tracker = None # AdaptivePoseTracker with --adaptive
 
 # ---------------------- Load references ----------------------
 def setup_reference_poses():
@@ -74,78 +48,174 @@ def setup_reference_poses():
     for filename in image_files:
         img = cv2.imread(os.path.join(REFERENCE_POSE_FOLDER, filename))
         if img is None: continue
+        keypoints, angles = extract_keypoints_array(img, pose, use_pixel_coordinates=True)
+        if keypoints is None: continue
         ref_images_list.append(cv2.resize(img, REF_DISPLAY_SIZE))
-        _, keypoints, angles = extract_keypoints_and_angles(img, pose)
         ref_keypoints_list.append(keypoints)
         ref_angles_list.append(angles)
 
     print(f"Loaded {len(ref_images_list)} reference poses.")
     return True
 
+# ---------------------- Inference stage ----------------------
+# Capture, inference and rendering run concurrently (see frame_pipeline.py):
+# camera I/O and drawing no longer stall MediaPipe, and inference always
+# works on the newest frame instead of a backlog.
+def score_frame(image):
+    """Runs MediaPipe on one frame and advances through the poses. Returns what the render loop draws."""
+    global current_pose_index
+
+    ref_angles = ref_angles_list[current_pose_index]
+    if tracker is not None:
+        keypoints, live_angles_raw, _ = tracker.process(image)
+    else:
+        keypoints, live_angles_raw = extract_keypoints_array(image, pose, use_pixel_coordinates=True)
+    if keypoints is not None:
+        live_angles = smoother.update(live_angles_raw)
+        current_accuracy = float(calculate_weighted_accuracy_array(live_angles, ref_angles, ACCURACY_MAX_DIFF, JOINT_WEIGHT_ARRAY))
+        max_diff_name, max_diff = get_max_angle_difference_array(live_angles, ref_angles)
+    else:
+        smoother.reset()
+        current_accuracy, max_diff_name, max_diff = 0.0, None, 0
+
+    feedback_text = ""
+    matched = current_accuracy >= ACCURACY_THRESHOLD_PERCENT
+    held_time = hold_timer.update(matched)
+    if matched:
+        if held_time >= HOLD_TIME_SECONDS:
+            current_pose_index += 1
+            smoother.reset()
+        else:
+            feedback_text = f"HOLDING: {hold_timer.remaining(held_time):.1f}s remaining"
+    else:
+        if max_diff_name and max_diff > ERROR_THRESHOLD_DEGREES:
+            feedback_text = f"ADJUST {max_diff_name} (Error: {max_diff:.1f}°)"
+        else:
+            feedback_text = "Keep going!"
+
+    return {
+        "pose_index": current_pose_index,
+        "accuracy": current_accuracy,
+        "feedback": feedback_text,
+        "complete": current_pose_index >= len(ref_angles_list),
+    }
+
+def inference_loop(ring, stats, state):
+    """Scores the newest captured frame, over and over, until the capture ends or the workout is done."""
+    last_seq = 0
+    while True:
+        frame = ring.acquire(last_seq, timeout=0.5)
+        if frame is None:
+            if ring.closed: break
+            continue
+        try:
+            result = score_frame(frame.image)
+        finally:
+            ring.release(frame)
+        last_seq = frame.seq
+        state["result"] = result
+        stats.tick(time.perf_counter() - frame.captured_at)
+        if result["complete"]: break
+
+# ---------------------- Render stage ----------------------
+def draw_overlay(image, result, stage_stats):
+    pose_index = result["pose_index"] if result else 0
+    accuracy = result["accuracy"] if result else 0.0
+    feedback_text = result["feedback"] if result else ""
+    ref_image = ref_images_list[min(pose_index, len(ref_images_list) - 1)]
+
+    # Overlay reference image
+    h_ref, w_ref = ref_image.shape[:2]
+    h_live, w_live = image.shape[:2]
+    image[10:10+h_ref, w_live-10-w_ref:w_live-10] = ref_image
+    cv2.putText(image, "Target Pose", (w_live-10-w_ref, 10+h_ref+20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255),1)
+
+    # Feedback
+    cv2.putText(image, f"POSE {pose_index+1}/{len(ref_angles_list)}", (10,30), cv2.FONT_HERSHEY_SIMPLEX,1,(255,255,255),2)
+    cv2.putText(image, f"ACCURACY: {accuracy:.1f}%", (10,70), cv2.FONT_HERSHEY_SIMPLEX,1,(0,255,0) if accuracy>=ACCURACY_THRESHOLD_PERCENT else (0,255,255),2)
+    cv2.putText(image, feedback_text, (10,image.shape[0]-20), cv2.FONT_HERSHEY_SIMPLEX,0.8,(0,0,255) if "ADJUST" in feedback_text else (0,255,0),2)
+
+    # Per-stage fps / capture-to-done latency
+    for i, stats in enumerate(stage_stats):
+        cv2.putText(image, stats.overlay_text(), (10,100+20*i), cv2.FONT_HERSHEY_SIMPLEX,0.5,(255,255,255),1)
+
 # ---------------------- Main ----------------------
 def main():
-    global current_pose_index, match_start_time
+    global tracker
+    parser = argparse.ArgumentParser(description="Live pose comparison against the reference poses.")
+    parser.add_argument("--source", default="0", help="Camera index or video file (default: camera 0)")
+    parser.add_argument("--headless", action="store_true", help="No window; print per-stage stats at the end (benchmark)")
+    parser.add_argument("--adaptive", action="store_true", help="Track a region of interest at reduced resolution and skip inference on stable frames")
+    parser.add_argument("--inference-side", type=int, default=256, help="Longest side of the tracked crop in --adaptive mode")
+    args = parser.parse_args()
 
     if not setup_reference_poses(): return
+    if args.adaptive:
+        tracker = AdaptivePoseTracker(target_side=args.inference_side)
 
-    cap = cv2.VideoCapture(0)
+    source = int(args.source) if args.source.isdigit() else args.source
+    cap = cv2.VideoCapture(source)
     if not cap.isOpened(): return
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret: continue
-        frame = cv2.flip(frame, 1)
-
-        if current_pose_index >= len(ref_angles_list):
-            cv2.putText(frame, "Workout Complete!", (50, frame.shape[0]//2), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,0),2)
-            cv2.imshow("Live Pose Comparison", frame)
-            cv2.waitKey(2000)
-            break
-
-        ref_angles = ref_angles_list[current_pose_index]
-        ref_keypoints = ref_keypoints_list[current_pose_index]
-        ref_image = ref_images_list[current_pose_index]
-
-        image, keypoints, live_angles_raw = extract_keypoints_and_angles(frame, pose, ref_keypoints)
-        live_angles = {name: smooth_angle(name, val) for name, val in live_angles_raw.items() if val is not None}
-
-        current_accuracy = calculate_overall_accuracy(live_angles, ref_angles)
-        max_diff_name, max_diff = get_max_angle_difference(live_angles, ref_angles)
-
-        feedback_text = ""
-        if current_accuracy >= ACCURACY_THRESHOLD_PERCENT:
-            if match_start_time is None: match_start_time = time.time()
-            held_time = time.time() - match_start_time
-            if held_time >= HOLD_TIME_SECONDS:
-                current_pose_index += 1
-                match_start_time = None
+    ret, first_frame = cap.read()
+    if not ret: return
+
+    # A video file stands in for a camera: deliver it at its own frame rate
+    pace_fps = None if isinstance(source, int) else (cap.get(cv2.CAP_PROP_FPS) or 30)
+
+    ring = FrameRing(first_frame.shape, RING_SLOTS)
+    capture = CaptureThread(cap, ring, pace_fps=pace_fps)
+    inference_stats = StageStats("inference")
+    render_stats = StageStats("render")
+    state = {"result": None}
+    inference = threading.Thread(target=inference_loop, args=(ring, inference_stats, state), name="inference", daemon=True)
+    capture.start()
+    inference.start()
+
+    image = np.empty_like(first_frame)
+    last_seq = 0
+    try:
+        while True:
+            frame = ring.acquire(last_seq, timeout=1.0)
+            if frame is None:
+                if ring.closed: break
                 continue
-            else:
-                feedback_text = f"HOLDING: {HOLD_TIME_SECONDS - held_time:.1f}s remaining"
-        else:
-            match_start_time = None
-            if max_diff_name and max_diff > ERROR_THRESHOLD_DEGREES:
-                feedback_text = f"ADJUST {max_diff_name} (Error: {max_diff:.1f}°)"
-            else:
-                feedback_text = "Keep going!"
-
-        # Overlay reference image
-        h_ref, w_ref = ref_image.shape[:2]
-        h_live, w_live = image.shape[:2]
-        image[10:10+h_ref, w_live-10-w_ref:w_live-10] = ref_image
-        cv2.putText(image, "Target Pose", (w_live-10-w_ref, 10+h_ref+20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255),1)
-
-        # Feedback
-        cv2.putText(image, f"POSE {current_pose_index+1}/{len(ref_angles_list)}", (10,30), cv2.FONT_HERSHEY_SIMPLEX,1,(255,255,255),2)
-        cv2.putText(image, f"ACCURACY: {current_accuracy:.1f}%", (10,70), cv2.FONT_HERSHEY_SIMPLEX,1,(0,255,0) if current_accuracy>=ACCURACY_THRESHOLD_PERCENT else (0,255,255),2)
-        cv2.putText(image, feedback_text, (10,image.shape[0]-20), cv2.FONT_HERSHEY_SIMPLEX,0.8,(0,0,255) if "ADJUST" in feedback_text else (0,255,0),2)
-
-        cv2.imshow("Live Pose Comparison", image)
-        if cv2.waitKey(5) & 0xFF == ord("q"): break
-
-    cap.release()
-    cv2.destroyAllWindows()
-    pose.close()
+            # Draw on a copy so the capture buffer goes back to the ring right away
+            np.copyto(image, frame.image)
+            ring.release(frame)
+            last_seq = frame.seq
+
+            result = state["result"]
+            if result is not None and result["complete"]:
+                cv2.putText(image, "Workout Complete!", (50, image.shape[0]//2), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,0),2)
+                if not args.headless:
+                    cv2.imshow("Live Pose Comparison", image)
+                    cv2.waitKey(2000)
+                break
+
+            draw_overlay(image, result, (capture.stats, inference_stats, render_stats))
+            render_stats.tick(time.perf_counter() - frame.captured_at)
+            if not args.headless:
+                cv2.imshow("Live Pose Comparison", image)
+                if cv2.waitKey(1) & 0xFF == ord("q"): break
+    finally:
+        capture.stop()
+        capture.join()
+        inference.join()
+        cap.release()
+        if not args.headless:
+            cv2.destroyAllWindows()
+        pose.close()
+        if tracker is not None:
+            tracker.close()
+
+    if args.headless:
+        print(json.dumps({
+            "capture": {**capture.stats.summary(), "dropped": capture.dropped},
+            "inference": inference_stats.summary(),
+            "render": render_stats.summary(),
+            "tracker": tracker.stats() if tracker is not None else None,
+            "poses_completed": state["result"]["pose_index"] if state["result"] else 0,
+        }, indent=2))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+class StreamingDTW:
+    """
+    Streaming, banded dynamic time warping of live angle vectors against a
+    reference sequence of angle vectors (T, K).
+
+    Each live frame advances the alignment by 0..`max_step` reference frames,
+    so the student may run anywhere from paused to `max_step`x the reference
+    tempo. Every path step consumes exactly one live frame (however many
+    reference frames it advances), so after n live frames all candidate paths
+    have n steps and their costs compare directly. Only a band of `window`
+    reference frames around the current match is kept, so memory and
+    per-frame work are O(window * K). Accumulated costs decay by `decay` per
+    frame so the alignment follows recent movement.
+    """
+
+    def __init__(self, ref_angles, window=64, max_step=2, decay=0.9):
+        if len(ref_angles) == 0:
+            raise ValueError("StreamingDTW needs at least one reference frame")
+        self.ref_angles = ref_angles
+        self.window = max(1, min(window, len(ref_angles)))
+        self.max_step = max_step
+        self.decay = decay
+
+        # Alignment starts at the first reference frame
+        self.band_start = 0
+        self.cost = np.full(self.window, np.inf)
+        self.cost[0] = 0.0
+        self.position = 0
+        self.tempo = 1.0
+        self.frames = 0
+
+    @property
+    def length(self):
+        return len(self.ref_angles)
+
+    @property
+    def completed(self):
+        return self.position >= self.length - 1
+
+    def update(self, live_angles):
+        """
+        Feeds one live (K,) angle vector. Returns the matched reference frame
+        index and the recent mean angle difference (degrees) along the path.
+        """
+        valid = ~np.isnan(live_angles)
+        if not valid.any():
+            # Nothing to align (no usable joints); keep the current match
+            return self.position, None
+
+        # Re-center the band slightly behind the current match
+        new_start = min(max(self.position - self.window // 4, 0), self.length - self.window)
+        j = np.arange(new_start, new_start + self.window)
+
+        best_prev = np.full(self.window, np.inf)
+        for step in range(self.max_step + 1):
+            idx = j - step - self.band_start
+            reachable = (idx >= 0) & (idx < self.window)
+            best_prev[reachable] = np.minimum(best_prev[reachable], self.cost[idx[reachable]])
+
+        band = self.ref_angles[new_start:new_start + self.window]
+        diffs = np.abs(band[:, valid] - live_angles[valid])
+        with np.errstate(invalid="ignore"):
+            frame_cost = np.nan_to_num(np.nanmean(diffs, axis=1), nan=180.0)
+
+        self.cost = frame_cost + self.decay * best_prev
+        self.band_start = new_start
+
+        previous = self.position
+        self.position = new_start + int(np.argmin(self.cost))
+        self.frames += 1
+        # Reference frames advanced per live frame, smoothed
+        self.tempo = 0.8 * self.tempo + 0.2 * (self.position - previous)
+
+        return self.position, float((1 - self.decay) * self.cost[self.position - new_start])
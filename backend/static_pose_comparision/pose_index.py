@@ -0,0 +1,58 @@
+import numpy as np
+
+from static_pose_comparision.pose_utils import PoseLandmark, torso_frame
+
+# Body landmarks used for matching; face and finger points are too noisy
+EMBEDDING_LANDMARKS = np.array([
+    PoseLandmark.LEFT_SHOULDER, PoseLandmark.RIGHT_SHOULDER,
+    PoseLandmark.LEFT_ELBOW, PoseLandmark.RIGHT_ELBOW,
+    PoseLandmark.LEFT_WRIST, PoseLandmark.RIGHT_WRIST,
+    PoseLandmark.LEFT_HIP, PoseLandmark.RIGHT_HIP,
+    PoseLandmark.LEFT_KNEE, PoseLandmark.RIGHT_KNEE,
+    PoseLandmark.LEFT_ANKLE, PoseLandmark.RIGHT_ANKLE,
+], dtype=np.intp)
+
+
+def embed_poses(points):
+    """
+    Maps (..., 33, 2) keypoints to (..., D) float32 embeddings that ignore where
+    the dancer stands and how far they are from the camera: body landmarks
+    relative to the hip center, in units of torso length.
+    """
+    hip_center, torso_length = torso_frame(points)
+    torso_length = np.where(torso_length > 0, torso_length, 1.0)
+    body = (points[..., EMBEDDING_LANDMARKS, :] - hip_center[..., None, :]) / torso_length[..., None, None]
+    # Missing landmarks sit on the hip center rather than poisoning the distance
+    body = np.nan_to_num(body, nan=0.0)
+    return body.reshape(*body.shape[:-2], -1).astype(np.float32)
+
+
+class PoseIndex:
+    """
+    Brute-force nearest-neighbour index over reference pose embeddings.
+    A query is one (N, D) x (D,) product plus a partial sort, which stays well
+    under a millisecond for tens of thousands of poses.
+    """
+
+    def __init__(self, keypoints):
+        self.embeddings = np.ascontiguousarray(embed_poses(keypoints))
+        self.sq_norms = np.einsum("nd,nd->n", self.embeddings, self.embeddings)
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def query(self, points, k=5):
+        """
+        Returns the indices and Euclidean distances of the `k` reference poses
+        closest to (33, 2) `points`, nearest first.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+        q = embed_poses(points)
+        # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2
+        sq_dists = self.sq_norms - 2 * (self.embeddings @ q) + q @ q
+        nearest = np.argpartition(sq_dists, k - 1)[:k] if k < len(self) else np.arange(len(self))
+        nearest = nearest[np.argsort(sq_dists[nearest])]
+        return nearest, np.sqrt(np.maximum(sq_dists[nearest], 0))
@@ -0,0 +1,90 @@
+import time
+
+import numpy as np
+
+try:
+    from static_pose_comparision.pose_utils import ANGLE_NAMES
+except ImportError:  # run as a script from this folder (live_comparision.py)
+    from pose_utils import ANGLE_NAMES
+
+# Joints that matter more for a dance pose count more towards accuracy
+JOINT_WEIGHTS = {
+    "left_elbow": 1.5,
+    "right_elbow": 1.5,
+    "left_knee": 2.0,
+    "right_knee": 2.0,
+    "left_shoulder": 1.0,
+    "right_shoulder": 1.0,
+}
+JOINT_WEIGHT_ARRAY = np.array([JOINT_WEIGHTS.get(name, 1.0) for name in ANGLE_NAMES])  # (K,), ordered like ANGLE_NAMES
+
+
+class AngleSmoother:
+    """
+    Moving average of the last `window` (K,) angle vectors of one dancer.
+
+    Frames live in a ring buffer with running per-joint sums and counts, so
+    each update costs O(K) regardless of the window. Missing (NaN) angles are
+    left out of the average; a joint missing from every buffered frame stays NaN.
+    """
+
+    def __init__(self, num_angles=len(ANGLE_NAMES), window=5):
+        self.window = max(1, window)
+        self.buffer = np.full((self.window, num_angles), np.nan)
+        self.sums = np.zeros(num_angles)
+        self.counts = np.zeros(num_angles, dtype=np.intp)
+        self.next_slot = 0
+
+    def reset(self):
+        self.buffer.fill(np.nan)
+        self.sums.fill(0.0)
+        self.counts.fill(0)
+        self.next_slot = 0
+
+    def update(self, angles):
+        """Adds one (K,) angle vector and returns the smoothed (K,) vector."""
+        old = self.buffer[self.next_slot]
+        old_valid = ~np.isnan(old)
+        self.sums[old_valid] -= old[old_valid]
+        self.counts -= old_valid
+
+        new_valid = ~np.isnan(angles)
+        self.sums[new_valid] += angles[new_valid]
+        self.counts += new_valid
+        self.sums[self.counts == 0] = 0.0  # drop rounding residue once a joint leaves the window
+        self.buffer[self.next_slot] = angles
+        self.next_slot = (self.next_slot + 1) % self.window
+
+        smoothed = np.full(self.sums.shape, np.nan)
+        np.divide(self.sums, self.counts, out=smoothed, where=self.counts > 0)
+        return smoothed
+
+
+class HoldTimer:
+    """Tracks how long a pose has been held continuously; `hold_seconds` of holding completes it."""
+
+    def __init__(self, hold_seconds):
+        self.hold_seconds = hold_seconds
+        self.started_at = None
+
+    def reset(self):
+        self.started_at = None
+
+    def update(self, matched, now=None):
+        """
+        Records whether this frame matches the pose. Returns the seconds held so
+        far (0.0 when not matched); the timer resets itself once the hold completes.
+        """
+        if not matched:
+            self.started_at = None
+            return 0.0
+        now = time.monotonic() if now is None else now
+        if self.started_at is None:
+            self.started_at = now
+        held = now - self.started_at
+        if held >= self.hold_seconds:
+            self.started_at = None
+        return held
+
+    def remaining(self, held):
+        return max(0.0, self.hold_seconds - held)
@@ -0,0 +1,169 @@
+import numpy as np
+
+try:
+    from static_pose_comparision.pose_utils import calculate_angles_array, extract_keypoints_array
+except ImportError:  # run as a script from this folder (live_comparision.py)
+    from pose_utils import calculate_angles_array, extract_keypoints_array
+
+MIN_ROI_SIDE = 64  # px; a smaller crop means the landmarks are off, so detect on the full frame
+
+
+class AdaptivePoseTracker:
+    """
+    Cheaper pose extraction for one dancer on a live feed than running
+    MediaPipe on every full-resolution frame:
+
+    - inference runs on a square crop around the previous landmarks (plus
+      `margin` of its size on each side), downscaled so its side is at most
+      `target_side`. The crop window only moves once the dancer gets close to
+      its edge or much smaller than it;
+    - while the skeleton is stable (no angle moving more than `stable_degrees`
+      per frame), up to `max_skip` frames in a row skip inference and get
+      angles extrapolated from the last two inferences;
+    - when nobody is found in the crop, the same frame is retried on the whole
+      image (downscaled to `full_side`) and tracking restarts from there.
+
+    Keypoints are returned in full-frame pixel coordinates, like
+    extract_keypoints_array(..., use_pixel_coordinates=True).
+
+    The tracker owns its MediaPipe Pose (unless one is passed in). MediaPipe's
+    own landmark tracking assumes every input shares one coordinate frame, so
+    the graph is reset whenever the window changes (a moved crop, or the full
+    frame) and detection starts afresh there.
+    """
+
+    def __init__(self, pose=None, target_side=256, full_side=480, margin=0.15, stable_degrees=2.0, max_skip=1,
+                 model_complexity=1):
+        if pose is None:
+            import mediapipe as mp
+
+            pose = mp.solutions.pose.Pose(
+                model_complexity=model_complexity, min_detection_confidence=0.5, min_tracking_confidence=0.5
+            )
+        self.pose = pose
+        self._window = None  # window of the last input MediaPipe saw (None = full frame)
+        self.target_side = target_side
+        self.full_side = full_side
+        self.margin = margin
+        self.stable_degrees = stable_degrees
+        self.max_skip = max_skip
+        self.counts = {"full": 0, "roi": 0, "skipped": 0, "lost": 0, "window_moves": 0}
+        self.reset()
+
+    def reset(self):
+        self.roi = None  # (x0, y0, x1, y1) of the next crop, or None for a full-frame detection
+        self.keypoints = None
+        self.angles = None
+        self.velocity = None  # (K,) degrees per frame between the last two inferences
+        self.frames_since_inference = 0
+
+    def process(self, image):
+        """
+        Returns ((33, 2) keypoints, (K,) angles, mode) for one BGR frame, where
+        mode is "roi", "full" or "skipped"; keypoints and angles are None if
+        nobody was found.
+        """
+        if self._can_skip():
+            self.frames_since_inference += 1
+            self.counts["skipped"] += 1
+            return self.keypoints, self.angles + self.velocity * self.frames_since_inference, "skipped"
+
+        mode = "full" if self.roi is None else "roi"
+        points = self._infer(image, self.roi, self.target_side if self.roi else self.full_side)
+        if points is None and mode == "roi":
+            self.counts["lost"] += 1
+            mode = "full"
+            points = self._infer(image, None, self.full_side)
+        self.counts[mode] += 1
+        if points is None:
+            self.reset()
+            return None, None, mode
+
+        angles = calculate_angles_array(points)
+        if self.angles is not None:
+            self.velocity = (angles - self.angles) / (self.frames_since_inference + 1)
+        self.keypoints, self.angles = points, angles
+        self.frames_since_inference = 0
+        self.roi = self._next_roi(points, image.shape)
+        return points, angles, mode
+
+    def _can_skip(self):
+        # NaN velocities (a joint not seen in both inferences) compare False, so they never skip
+        return (
+            self.velocity is not None
+            and self.frames_since_inference < self.max_skip
+            and bool(np.all(np.abs(self.velocity) < self.stable_degrees))
+        )
+
+    def _infer(self, image, roi, max_side):
+        import cv2
+
+        if roi != self._window:
+            # MediaPipe's tracked ROI is in the old window's coordinates
+            self.pose.reset()
+            self._window = roi
+            self.counts["window_moves"] += 1
+
+        h, w = image.shape[:2]
+        x0, y0, x1, y1 = roi if roi is not None else (0, 0, w, h)
+        crop = image[y0:y1, x0:x1]
+        scale = max_side / max(crop.shape[:2])
+        if scale < 1:
+            size = (max(1, round(crop.shape[1] * scale)), max(1, round(crop.shape[0] * scale)))
+            crop = cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+        elif roi is not None:
+            crop = np.ascontiguousarray(crop)
+
+        points, _ = extract_keypoints_array(crop, self.pose)
+        if points is None:
+            return None
+        # Normalized crop coordinates -> full-frame pixels (rounded like use_pixel_coordinates)
+        return (points * (x1 - x0, y1 - y0) + (x0, y0)).astype(int).astype(np.float64)
+
+    def _next_roi(self, points, shape):
+        """The crop for the next frame: the current one while the dancer still fits in it well."""
+        h, w = shape[:2]
+        inside = points[(points[:, 0] >= 0) & (points[:, 0] < w) & (points[:, 1] >= 0) & (points[:, 1] < h)]
+        if len(inside) == 0:
+            return None
+        bounds = (*inside.min(axis=0), *inside.max(axis=0))
+        if self.roi is not None and self._fits(bounds, self.roi, shape):
+            return self.roi
+        return self._roi_around(bounds, shape)
+
+    def _fits(self, bounds, roi, shape):
+        left, top, right, bottom = bounds
+        x0, y0, x1, y1 = roi
+        h, w = shape[:2]
+        side = max(x1 - x0, y1 - y0)
+        if max(right - left, bottom - top) * (1 + 2 * self.margin) < 0.7 * side:
+            return False  # dancer moved away from the camera; a tighter crop is sharper
+        # At least half the margin left on every side, except where the window meets the frame edge
+        pad = side * self.margin / (2 * (1 + 2 * self.margin))
+        return (
+            (x0 == 0 or left - x0 >= pad) and (y0 == 0 or top - y0 >= pad)
+            and (x1 == w or x1 - right >= pad) and (y1 == h or y1 - bottom >= pad)
+        )
+
+    def _roi_around(self, bounds, shape):
+        h, w = shape[:2]
+        left, top, right, bottom = bounds
+        side = max(right - left, bottom - top) * (1 + 2 * self.margin)
+        if side < MIN_ROI_SIDE:
+            return None
+        cx, cy = (left + right) / 2, (top + bottom) / 2
+        x0, y0 = max(0, int(cx - side / 2)), max(0, int(cy - side / 2))
+        x1, y1 = min(w, int(cx + side / 2)), min(h, int(cy + side / 2))
+        if (x0, y0, x1, y1) == (0, 0, w, h):
+            return None
+        return x0, y0, x1, y1
+
+    def close(self):
+        self.pose.close()
+
+    def stats(self):
+        frames = sum(self.counts[mode] for mode in ("full", "roi", "skipped"))
+        return {
+            **self.counts,
+            "inference_ratio": round((self.counts["full"] + self.counts["roi"] + self.counts["lost"]) / frames, 3) if frames else 0.0,
+        }
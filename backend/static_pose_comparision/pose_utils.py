@@ -1,20 +1,54 @@
-import cv2
-import mediapipe as mp
+from enum import IntEnum
 import numpy as np
 
-# MediaPipe pose solution
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+# cv2 is only imported by the image-processing helpers below, so the scoring
+# engine can be used without OpenCV or MediaPipe installed/loaded.
+
+class PoseLandmark(IntEnum):
+    """The 33 MediaPipe Pose landmarks (same indices as mp.solutions.pose.PoseLandmark)."""
+    NOSE = 0
+    LEFT_EYE_INNER = 1
+    LEFT_EYE = 2
+    LEFT_EYE_OUTER = 3
+    RIGHT_EYE_INNER = 4
+    RIGHT_EYE = 5
+    RIGHT_EYE_OUTER = 6
+    LEFT_EAR = 7
+    RIGHT_EAR = 8
+    MOUTH_LEFT = 9
+    MOUTH_RIGHT = 10
+    LEFT_SHOULDER = 11
+    RIGHT_SHOULDER = 12
+    LEFT_ELBOW = 13
+    RIGHT_ELBOW = 14
+    LEFT_WRIST = 15
+    RIGHT_WRIST = 16
+    LEFT_PINKY = 17
+    RIGHT_PINKY = 18
+    LEFT_INDEX = 19
+    RIGHT_INDEX = 20
+    LEFT_THUMB = 21
+    RIGHT_THUMB = 22
+    LEFT_HIP = 23
+    RIGHT_HIP = 24
+    LEFT_KNEE = 25
+    RIGHT_KNEE = 26
+    LEFT_ANKLE = 27
+    RIGHT_ANKLE = 28
+    LEFT_HEEL = 29
+    RIGHT_HEEL = 30
+    LEFT_FOOT_INDEX = 31
+    RIGHT_FOOT_INDEX = 32
 
 # Define the angles to be calculated
 # These are tuples of landmarks that form the angle, with the vertex in the middle
 ANGLE_DEFINITIONS = {
-    "left_elbow": (mp_pose.PoseLandmark.LEFT_SHOULDER, mp_pose.PoseLandmark.LEFT_ELBOW, mp_pose.PoseLandmark.LEFT_WRIST),
-    "right_elbow": (mp_pose.PoseLandmark.RIGHT_SHOULDER, mp_pose.PoseLandmark.RIGHT_ELBOW, mp_pose.PoseLandmark.RIGHT_WRIST),
-    "left_shoulder": (mp_pose.PoseLandmark.LEFT_ELBOW, mp_pose.PoseLandmark.LEFT_SHOULDER, mp_pose.PoseLandmark.LEFT_HIP),
-    "right_shoulder": (mp_pose.PoseLandmark.RIGHT_ELBOW, mp_pose.PoseLandmark.RIGHT_SHOULDER, mp_pose.PoseLandmark.RIGHT_HIP),
-    "left_knee": (mp_pose.PoseLandmark.LEFT_HIP, mp_pose.PoseLandmark.LEFT_KNEE, mp_pose.PoseLandmark.LEFT_ANKLE),
-    "right_knee": (mp_pose.PoseLandmark.RIGHT_HIP, mp_pose.PoseLandmark.RIGHT_KNEE, mp_pose.PoseLandmark.RIGHT_ANKLE),
+    "left_elbow": (PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_ELBOW, PoseLandmark.LEFT_WRIST),
+    "right_elbow": (PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_ELBOW, PoseLandmark.RIGHT_WRIST),
+    "left_shoulder": (PoseLandmark.LEFT_ELBOW, PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_HIP),
+    "right_shoulder": (PoseLandmark.RIGHT_ELBOW, PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_HIP),
+    "left_knee": (PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_KNEE, PoseLandmark.LEFT_ANKLE),
+    "right_knee": (PoseLandmark.RIGHT_HIP, PoseLandmark.RIGHT_KNEE, PoseLandmark.RIGHT_ANKLE),
 }
 
 def calculate_angle(a, b, c):
@@ -41,54 +75,161 @@ def calculate_angle(a, b, c):
     angle = np.degrees(np.arccos(cosine_angle))
     return angle
 
-def normalize_skeleton(user_keypoints, ref_keypoints):
+# --- Vectorized engine ---
+# The scoring path works on whole skeletons at once: a pose is a (33, 2) float
+# array indexed by landmark, and every angle in ANGLE_DEFINITIONS is computed
+# with one gather + arccos. Leading batch dimensions, e.g. (B, 33, 2), are
+# supported throughout. Missing landmarks / undefined angles are NaN.
+NUM_LANDMARKS = len(PoseLandmark)
+ANGLE_NAMES = tuple(ANGLE_DEFINITIONS)
+ANGLE_INDICES = np.array(
+    [[landmark.value for landmark in triplet] for triplet in ANGLE_DEFINITIONS.values()],
+    dtype=np.intp,
+)  # (K, 3): first point, vertex, end point
+
+LEFT_HIP = PoseLandmark.LEFT_HIP.value
+RIGHT_HIP = PoseLandmark.RIGHT_HIP.value
+LEFT_SHOULDER = PoseLandmark.LEFT_SHOULDER.value
+RIGHT_SHOULDER = PoseLandmark.RIGHT_SHOULDER.value
+
+
+def keypoints_to_array(keypoints, fill_value=np.nan):
+    """Packs a {landmark_index: (x, y)} dict into a (33, 2) float array."""
+    points = np.full((NUM_LANDMARKS, 2), fill_value, dtype=np.float64)
+    for idx, pt in keypoints.items():
+        points[idx] = pt[:2]
+    return points
+
+
+def landmarks_to_array(landmarks):
+    """Packs a list of {"x": .., "y": ..} landmarks (WebSocket payload) into a (33, 2) float array."""
+    points = np.full((NUM_LANDMARKS, 2), np.nan, dtype=np.float64)
+    count = min(len(landmarks), NUM_LANDMARKS)
+    points[:count] = [(lm["x"], lm["y"]) for lm in landmarks[:count]]
+    return points
+
+
+def array_to_keypoints(points, indices=None):
+    """Unpacks a (33, 2) array back into a {landmark_index: (x, y)} dict."""
+    if indices is None:
+        indices = range(len(points))
+    return {idx: points[idx] for idx in indices}
+
+
+def angles_to_dict(angles):
+    """Maps an angle vector ordered like ANGLE_NAMES to a {name: degrees} dict, dropping NaNs."""
+    return {name: float(value) for name, value in zip(ANGLE_NAMES, angles) if not np.isnan(value)}
+
+
+def torso_frame(points):
+    """Returns the hip center and torso length (shoulder center to hip center) of (..., 33, 2) points."""
+    hip_center = (points[..., LEFT_HIP, :] + points[..., RIGHT_HIP, :]) / 2
+    shoulder_center = (points[..., LEFT_SHOULDER, :] + points[..., RIGHT_SHOULDER, :]) / 2
+    torso_length = np.linalg.norm(shoulder_center - hip_center, axis=-1)
+    return hip_center, torso_length
+
+
+def normalize_skeleton_array(user_points, ref_points):
     """
-    FIX: A more robust normalization using the torso center and size.
-    This is crucial for accurate angle comparison, regardless of user's distance from camera.
+    Translates the user skeleton to the reference hip center and scales it to the
+    reference torso length. Works on (33, 2) or batched (B, 33, 2) arrays.
     """
-    # Helper to get a point or return a default
-    def get_point(keypoints, landmark, default=(0,0)):
-        return keypoints.get(landmark.value, default)
-
-    # Calculate hip and shoulder centers for both skeletons
-    user_left_hip = get_point(user_keypoints, mp_pose.PoseLandmark.LEFT_HIP)
-    user_right_hip = get_point(user_keypoints, mp_pose.PoseLandmark.RIGHT_HIP)
-    user_hip_center = np.array([(user_left_hip[0] + user_right_hip[0]) / 2, (user_left_hip[1] + user_right_hip[1]) / 2])
-    
-    ref_left_hip = get_point(ref_keypoints, mp_pose.PoseLandmark.LEFT_HIP)
-    ref_right_hip = get_point(ref_keypoints, mp_pose.PoseLandmark.RIGHT_HIP)
-    ref_hip_center = np.array([(ref_left_hip[0] + ref_right_hip[0]) / 2, (ref_left_hip[1] + ref_right_hip[1]) / 2])
-    
-    user_left_shoulder = get_point(user_keypoints, mp_pose.PoseLandmark.LEFT_SHOULDER)
-    user_right_shoulder = get_point(user_keypoints, mp_pose.PoseLandmark.RIGHT_SHOULDER)
-    user_shoulder_center = np.array([(user_left_shoulder[0] + user_right_shoulder[0]) / 2, (user_left_shoulder[1] + user_right_shoulder[1]) / 2])
+    user_hip_center, user_torso_length = torso_frame(user_points)
+    ref_hip_center, ref_torso_length = torso_frame(ref_points)
 
-    ref_left_shoulder = get_point(ref_keypoints, mp_pose.PoseLandmark.LEFT_SHOULDER)
-    ref_right_shoulder = get_point(ref_keypoints, mp_pose.PoseLandmark.RIGHT_SHOULDER)
-    ref_shoulder_center = np.array([(ref_left_shoulder[0] + ref_right_shoulder[0]) / 2, (ref_left_shoulder[1] + ref_right_shoulder[1]) / 2])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale_factor = np.where(user_torso_length > 0, ref_torso_length / user_torso_length, 1.0)
 
-    # Translate user skeleton to origin (based on hip center)
-    translated_kps = {idx: np.array(pt) - user_hip_center for idx, pt in user_keypoints.items()}
+    translated = user_points - user_hip_center[..., None, :]
+    return translated * scale_factor[..., None, None] + ref_hip_center[..., None, :]
+
+
+def calculate_angles_array(points):
+    """
+    Calculates every angle in ANGLE_DEFINITIONS from (..., 33, 2) points.
+    Returns a (..., K) array in degrees, ordered like ANGLE_NAMES. Angles with a
+    zero-length limb are NaN.
+    """
+    a = points[..., ANGLE_INDICES[:, 0], :]
+    b = points[..., ANGLE_INDICES[:, 1], :]
+    c = points[..., ANGLE_INDICES[:, 2], :]
+
+    ba = a - b
+    bc = c - b
+    norm_ba = np.linalg.norm(ba, axis=-1)
+    norm_bc = np.linalg.norm(bc, axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cosine_angle = np.einsum("...i,...i->...", ba, bc) / (norm_ba * norm_bc)
+    angles = np.degrees(np.arccos(np.clip(cosine_angle, -1.0, 1.0)))
+    angles[(norm_ba == 0) | (norm_bc == 0)] = np.nan
+    return angles
+
+
+def get_max_angle_difference_array(live_angles, ref_angles):
+    """Array counterpart of get_max_angle_difference: returns (joint name, difference)."""
+    diffs = np.abs(live_angles - ref_angles)
+    if np.all(np.isnan(diffs)):
+        return None, 0
+    idx = int(np.nanargmax(diffs))
+    if not diffs[idx] > 0:
+        return None, 0
+    return ANGLE_NAMES[idx], float(diffs[idx])
 
-    # Calculate scaling factor based on torso length (distance between shoulder and hip centers)
-    ref_torso_length = np.linalg.norm(ref_shoulder_center - ref_hip_center)
-    user_torso_length = np.linalg.norm(user_shoulder_center - user_hip_center)
-    
-    scale_factor = ref_torso_length / user_torso_length if user_torso_length > 0 else 1.0
-    
-    # Scale and translate to reference position
-    normalized_kps = {idx: pt * scale_factor + ref_hip_center for idx, pt in translated_kps.items()}
-    return normalized_kps
+
+def calculate_accuracy_array(live_angles, ref_angles, max_angle_difference):
+    """
+    Accuracy (0-100) from the mean absolute angle difference, where a mean of
+    `max_angle_difference` degrees or more scores 0. Works on (K,) or (B, K) angles.
+    Angles missing on the live side count as 0, angles missing on the reference are skipped.
+    """
+    ref_mask = ~np.isnan(ref_angles)
+    diffs = np.where(ref_mask, np.abs(np.nan_to_num(live_angles) - ref_angles), 0.0)
+    count = ref_mask.sum(axis=-1)
+    avg_diff = np.where(count > 0, diffs.sum(axis=-1) / np.maximum(count, 1), max_angle_difference)
+    return np.maximum(0, 100 - (avg_diff / max_angle_difference) * 100)
+
+
+def calculate_weighted_accuracy_array(live_angles, ref_angles, max_angle_difference, weights):
+    """
+    Accuracy (0-100) of (K,) or (B, K) live angles as the `weights`-weighted
+    mean of per-joint scores (see pose_smoothing.JOINT_WEIGHT_ARRAY). Each
+    joint's difference is capped at `max_angle_difference`, so one badly
+    placed joint costs at most its weight. Joints missing on either side are
+    skipped; with none left it scores 0.
+    """
+    mask = ~np.isnan(ref_angles) & ~np.isnan(live_angles)
+    weights = np.where(mask, weights, 0.0)
+    with np.errstate(invalid="ignore"):
+        capped = np.minimum(np.abs(live_angles - ref_angles), max_angle_difference)
+    scores = np.where(mask, 1 - capped / max_angle_difference, 0.0)
+    total = np.sum(weights, axis=-1)
+    return np.where(total > 0, 100 * (scores * weights).sum(axis=-1) / np.where(total > 0, total, 1), 0.0)
+
+
+# --- Dict-based API (kept for existing callers, backed by the engine above) ---
+def normalize_skeleton(user_keypoints, ref_keypoints):
+    """
+    FIX: A more robust normalization using the torso center and size.
+    This is crucial for accurate angle comparison, regardless of user's distance from camera.
+    """
+    # Missing hip/shoulder landmarks default to (0, 0), as before
+    user_points = keypoints_to_array(user_keypoints, fill_value=0.0)
+    ref_points = keypoints_to_array(ref_keypoints, fill_value=0.0)
+    normalized = normalize_skeleton_array(user_points, ref_points)
+    return array_to_keypoints(normalized, user_keypoints.keys())
 
 def calculate_angles_from_keypoints(keypoints):
     """Calculates all defined angles from a dictionary of keypoints."""
-    angles = {}
-    for name, landmarks in ANGLE_DEFINITIONS.items():
-        p1, p2, p3 = landmarks
-        # Ensure all landmarks for the angle are present
-        if p1.value in keypoints and p2.value in keypoints and p3.value in keypoints:
-            angles[name] = calculate_angle(keypoints[p1.value], keypoints[p2.value], keypoints[p3.value])
-    return angles
+    points = keypoints_to_array(keypoints)
+    angles = calculate_angles_array(points)
+    # Ensure all landmarks for the angle are present
+    present = ~np.isnan(points[ANGLE_INDICES]).any(axis=(1, 2))
+    return {
+        name: (None if np.isnan(value) else float(value))
+        for name, value, is_present in zip(ANGLE_NAMES, angles, present)
+        if is_present
+    }
 
 def get_max_angle_difference(live_angles, ref_angles):
     """Finds the joint with the largest angle difference."""
@@ -108,6 +249,8 @@ def extract_keypoints_and_angles(image, pose, use_pixel_coordinates=True):
     Processes an image to extract pose keypoints and angles.
     Set `use_pixel_coordinates` to False to get normalized (0-1) coordinates.
     """
+    import cv2
+
     # To improve performance, optionally mark the image as not writeable to
     # pass by reference.
     image.flags.writeable = False
@@ -120,15 +263,37 @@ def extract_keypoints_and_angles(image, pose, use_pixel_coordinates=True):
 
     landmarks = results.pose_landmarks.landmark
     h, w, _ = image.shape
-    
-    keypoints = {}
-    for idx, lm in enumerate(landmarks):
-        if use_pixel_coordinates:
-            keypoints[idx] = (int(lm.x * w), int(lm.y * h))
-        else:
-            keypoints[idx] = (lm.x, lm.y)
-
-    angles = calculate_angles_from_keypoints(keypoints)
-    
+
+    points = np.array([(lm.x, lm.y) for lm in landmarks], dtype=np.float64)
+    if use_pixel_coordinates:
+        points = (points * (w, h)).astype(int)
+
+    keypoints = {idx: tuple(pt.tolist()) for idx, pt in enumerate(points)}
+    angles = angles_to_dict(calculate_angles_array(points.astype(np.float64)))
+
     return results.pose_landmarks, keypoints, angles
 
+
+def extract_keypoints_array(image, pose, use_pixel_coordinates=False, rgb_buffer=None):
+    """
+    Array counterpart of extract_keypoints_and_angles: returns the (33, 2) keypoints
+    and the (K,) angle vector, or (None, None) if no person is found.
+    Keypoints are normalized (0-1) unless `use_pixel_coordinates` is set.
+    `rgb_buffer`, an array shaped like `image`, receives the RGB copy so
+    callers processing many frames can reuse one buffer.
+    """
+    import cv2
+
+    image.flags.writeable = False
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=rgb_buffer)
+    results = pose.process(image_rgb)
+    image.flags.writeable = True
+
+    if not results.pose_landmarks:
+        return None, None
+
+    points = np.array([(lm.x, lm.y) for lm in results.pose_landmarks.landmark], dtype=np.float64)
+    if use_pixel_coordinates:
+        h, w, _ = image.shape
+        points = (points * (w, h)).astype(int).astype(np.float64)
+    return points, calculate_angles_array(points)
@@ -0,0 +1,327 @@
+"""
+Write-behind buffer for UserSongStatus updates.
+
+Practice sessions PATCH progress every few seconds per user. Instead of one
+MongoDB write per call, updates are coalesced per (user, song) - last status,
+highest progress, latest access time - and flushed together with one
+bulk_write every `flush_seconds` or once `max_pending` rows are waiting.
+Readers overlay `pending()` (or call `flush_user`) to see their own writes.
+
+Rows that fail to write are retried with the next flush; after
+`max_attempts` failed writes a row is dropped (and logged). While writes
+fail, flushes back off exponentially up to `max_retry_seconds` instead of
+retrying every time the buffer fills up.
+"""
+import asyncio
+import time
+import uuid
+from collections import deque
+from contextlib import suppress
+
+import numpy as np
+from bson import DBRef, ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import settings
+from models import User, Song, UserSongStatus
+
+DUPLICATE_KEY = 11000
+
+
+class StatusWriteError(RuntimeError):
+    """Raised when buffered status rows could not be written (they stay queued for a retry)."""
+
+
+def merge_status(current, new):
+    """The status after applying `new` to `current`: "resume" doesn't undo "completed"."""
+    if new is None or (new == "resume" and current == "completed"):
+        return current
+    return new
+
+
+def status_upsert(user_id: ObjectId, song_id: ObjectId, status, progress, now):
+    """
+    Single-statement upsert of one (user, song) status row. It is an update
+    pipeline so new values can depend on the stored ones: progress only moves
+    forward, and "resume" never overwrites "completed" (see merge_status).
+    Fields not given keep their value, or get the model defaults when the row
+    is created.
+    """
+    defaults = UserSongStatus.model_fields
+    fields = {
+        "user": {"$literal": DBRef(User.Settings.name, user_id)},
+        "song": {"$literal": DBRef(Song.Settings.name, song_id)},
+        "last_accessed": now,
+    }
+    if status is None:
+        fields["status"] = {"$ifNull": ["$status", defaults["status"].default]}
+    elif status == "resume":
+        fields["status"] = {"$cond": [{"$eq": ["$status", "completed"]}, "completed", "resume"]}
+    else:
+        fields["status"] = status
+    if progress is None:
+        fields["progress"] = {"$ifNull": ["$progress", defaults["progress"].default]}
+    else:
+        fields["progress"] = {"$max": ["$progress", progress]}
+
+    return {"user.$id": user_id, "song.$id": song_id}, [{"$set": fields}]
+
+
+class PendingStatus:
+    """Coalesced, not yet written update of one (user, song) row."""
+
+    __slots__ = ("status", "progress", "last_accessed", "failures")
+
+    def __init__(self, status=None, progress=None, last_accessed=None):
+        self.status = status
+        self.progress = progress
+        self.last_accessed = last_accessed
+        self.failures = 0  # failed write attempts
+
+    def merge(self, status, progress, last_accessed):
+        self.status = merge_status(self.status, status)
+        if progress is not None:
+            self.progress = progress if self.progress is None else max(self.progress, progress)
+        if self.last_accessed is None or last_accessed > self.last_accessed:
+            self.last_accessed = last_accessed
+
+
+async def write_status_updates(updates):
+    """
+    Writes {(user_id, song_id): PendingStatus} with one unordered bulk_write.
+    Returns {key: error message} for the rows that failed; raises if the whole
+    write failed (e.g. the database is unreachable).
+    """
+    if not updates:
+        return {}
+    keys = list(updates)
+    upserts = [
+        status_upsert(user_id, song_id, pending.status, pending.progress, pending.last_accessed)
+        for (user_id, song_id), pending in updates.items()
+    ]
+
+    collection = UserSongStatus.get_pymongo_collection()
+    try:
+        await collection.bulk_write([UpdateOne(query, update, upsert=True) for query, update in upserts], ordered=False)
+        return {}
+    except BulkWriteError as e:
+        errors = e.details["writeErrors"]
+
+    failed = {keys[error["index"]]: error["errmsg"] for error in errors if error["code"] != DUPLICATE_KEY}
+    # Rows inserted concurrently by another request: retry those as plain updates
+    retries = [error["index"] for error in errors if error["code"] == DUPLICATE_KEY]
+    if retries:
+        try:
+            await collection.bulk_write([UpdateOne(*upserts[i]) for i in retries], ordered=False)
+        except BulkWriteError as e:
+            failed.update({keys[retries[error["index"]]]: error["errmsg"] for error in e.details["writeErrors"]})
+    return failed
+
+
+class StatusWriteBuffer:
+    """
+    Coalesces status updates in memory and writes them behind with bulk_write.
+    `flush_seconds` <= 0 turns buffering off: `add` then writes straight through.
+    """
+
+    def __init__(self, flush_seconds: float, max_pending: int, max_attempts: int = 5,
+                 max_retry_seconds: float = 60.0, stats_window: int = 256):
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.max_retry_seconds = max_retry_seconds
+
+        # (user_id, song_id) -> PendingStatus, waiting / being written
+        self._pending = {}
+        self._flushing = {}
+        self._full = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._lock = None
+        self._task = None
+        self._retry_delay = 0.0  # > 0 while writes are failing
+        # user_id -> count of this process's changes to what the user's status reads return
+        self._user_versions = {}
+        self._instance = uuid.uuid4().hex[:8]
+
+        # --- Stats ---
+        self.updates_received = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self._flush_ms = deque(maxlen=stats_window)
+
+    @property
+    def enabled(self):
+        return self.flush_seconds > 0
+
+    def start(self):
+        """Starts the periodic flush loop on the running event loop (idempotent)."""
+        if self.enabled and (self._task is None or self._task.done()):
+            self._full = asyncio.Event()
+            self._stop = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._retry_delay = 0.0
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stops the flush loop and writes everything still buffered."""
+        if self._task is not None:
+            # Not cancelled: a flush in progress must finish (or put its batch back) first
+            self._stop.set()
+            self._full.set()
+            try:
+                await self._task
+            finally:
+                self._task = None
+        if self._lock is not None:
+            try:
+                await self.flush()
+            except StatusWriteError as e:
+                print(f"Status updates lost at shutdown: {e}")
+
+    async def add(self, user_id: ObjectId, song_id: ObjectId, status, progress, now):
+        self.updates_received += 1
+        self._bump_user(user_id)
+        if not self.enabled:
+            failed = await write_status_updates({(user_id, song_id): PendingStatus(status, progress, now)})
+            if failed:
+                raise StatusWriteError(next(iter(failed.values())))
+            self.rows_written += 1
+            return
+
+        self.start()
+        pending = self._pending.get((user_id, song_id))
+        if pending is None:
+            pending = self._pending[(user_id, song_id)] = PendingStatus()
+        pending.merge(status, progress, now)
+        if len(self._pending) >= self.max_pending:
+            self._full.set()
+
+    def pending(self, user_id: ObjectId, song_id: ObjectId):
+        """Merged unwritten update of one row (waiting or being written), or None."""
+        flushing = self._flushing.get((user_id, song_id))
+        waiting = self._pending.get((user_id, song_id))
+        if flushing is None or waiting is None:
+            return waiting or flushing
+        merged = PendingStatus(flushing.status, flushing.progress, flushing.last_accessed)
+        merged.merge(waiting.status, waiting.progress, waiting.last_accessed)
+        return merged
+
+    def user_version(self, user_id: ObjectId) -> str:
+        """
+        Token that changes whenever this process accepts (or drops) a status
+        update of the user, for per-user ETags. Other processes' writes are
+        not seen, so it only covers all writes with a single worker.
+        """
+        return f"{self._instance}.{self._user_versions.get(user_id, 0)}"
+
+    def _bump_user(self, user_id):
+        self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+
+    def has_pending(self, user_id: ObjectId):
+        return any(key[0] == user_id for key in self._pending) or any(key[0] == user_id for key in self._flushing)
+
+    async def flush(self):
+        """Writes every buffered update now. Raises StatusWriteError if some rows failed."""
+        async with self._lock:
+            batch, self._pending = self._pending, {}
+            self._full.clear()
+            await self._write(batch)
+
+    async def flush_user(self, user_id: ObjectId):
+        """
+        Writes one user's buffered updates now, e.g. before a read that must
+        include them. Raises StatusWriteError if they could not be written.
+        """
+        if self._lock is None:
+            return
+        async with self._lock:
+            keys = [key for key in self._pending if key[0] == user_id]
+            await self._write({key: self._pending.pop(key) for key in keys})
+
+    async def _write(self, batch):
+        if not batch:
+            return
+        self._flushing = batch
+        started = time.perf_counter()
+        try:
+            failed = await write_status_updates(batch)
+        except asyncio.CancelledError:
+            # e.g. a request awaiting flush_user went away: the next flush writes the batch
+            self._requeue(batch)
+            raise
+        except Exception as e:
+            failed = {key: str(e) for key in batch}
+        finally:
+            self._flushing = {}
+
+        self.rows_written += len(batch) - len(failed)
+        if failed:
+            self.flush_errors += 1
+            self._requeue({key: batch[key] for key in failed}, failed=True)
+            raise StatusWriteError(f"{len(failed)} of {len(batch)} status rows not written: {next(iter(failed.values()))}")
+        self._flush_ms.append((time.perf_counter() - started) * 1000)
+        self.flushes += 1
+
+    def _requeue(self, batch, failed=False):
+        """
+        Puts an unwritten batch back (merged under any newer updates) for the
+        next flush. Rows that have failed `max_attempts` writes are dropped.
+        """
+        for key, pending in batch.items():
+            if failed:
+                pending.failures += 1
+                if pending.failures >= self.max_attempts:
+                    self.rows_dropped += 1
+                    self._bump_user(key[0])
+                    print(f"Dropping status update {key} after {pending.failures} failed writes.")
+                    continue
+            newer = self._pending.get(key)
+            if newer is not None:
+                pending.merge(newer.status, newer.progress, newer.last_accessed)
+            self._pending[key] = pending
+
+    async def _run(self):
+        while not self._stop.is_set():
+            if self._retry_delay:
+                # Writes are failing: retry on a growing delay, not every time the buffer fills
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._stop.wait(), timeout=self._retry_delay)
+            else:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._full.wait(), timeout=self.flush_seconds)
+            if self._stop.is_set():
+                break
+            try:
+                await self.flush()
+                self._retry_delay = 0.0
+            except StatusWriteError as e:
+                self._retry_delay = min(max(2 * self._retry_delay, self.flush_seconds), self.max_retry_seconds)
+                print(f"Status flush failed, retrying in {self._retry_delay:.0f}s: {e}")
+
+    def stats(self):
+        flush_ms = np.array(self._flush_ms) if self._flush_ms else np.zeros(1)
+        return {
+            "enabled": self.enabled,
+            "queue_depth": len(self._pending),
+            "in_flight": len(self._flushing),
+            "updates_received": self.updates_received,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "retry_delay_s": self._retry_delay,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "flush_ms_p50": round(float(np.percentile(flush_ms, 50)), 3),
+            "flush_ms_p99": round(float(np.percentile(flush_ms, 99)), 3),
+            "flush_ms_max": round(float(flush_ms.max()), 3),
+        }
+
+
+status_writer = StatusWriteBuffer(
+    flush_seconds=settings.STATUS_WRITE_BEHIND_SECONDS,
+    max_pending=settings.STATUS_WRITE_BEHIND_MAX_PENDING,
+    max_attempts=settings.STATUS_WRITE_BEHIND_MAX_ATTEMPTS,
+    max_retry_seconds=settings.STATUS_WRITE_BEHIND_MAX_RETRY_SECONDS,
+)
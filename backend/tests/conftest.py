@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Tests import the backend modules the way main.py does (run from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.Settings requires these; nothing in the tests connects to MongoDB
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017/natyavision_test")
+os.environ.setdefault("SECRET_KEY", "test-secret")
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from jose import JWTError, jwt
+
+import auth
+from auth import PasswordHasher, VerifiedTokenCache, create_access_token, verify_token, websocket_user_id
+from database import settings
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(auth.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    cache = VerifiedTokenCache(max_entries=8)
+    monkeypatch.setattr(auth, "verified_tokens", cache)
+    return cache
+
+
+def test_cached_tokens_expire_at_their_own_exp(clock):
+    cache = VerifiedTokenCache(max_entries=8)
+    cache.put("token", "user-1", expires_at=clock[0] + 60)
+
+    assert cache.get("token") == "user-1"
+    clock[0] += 59.9
+    assert cache.get("token") == "user-1"
+    clock[0] += 0.1
+    assert cache.get("token") is None
+    assert cache.stats() == {"entries": 0, "hits": 2, "misses": 1}
+
+
+def test_least_recently_used_tokens_are_evicted(clock):
+    cache = VerifiedTokenCache(max_entries=2)
+    for token in ("a", "b"):
+        cache.put(token, f"user-{token}", expires_at=clock[0] + 60)
+    cache.get("a")
+    cache.put("c", "user-c", expires_at=clock[0] + 60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "user-a" and cache.get("c") == "user-c"
+
+
+def test_verify_token_reuses_the_cached_verification(fresh_cache):
+    token = create_access_token({"sub": "user-1"})
+
+    assert verify_token(token) == "user-1"
+    assert verify_token(token) == "user-1"
+    assert fresh_cache.stats()["hits"] == 1
+
+
+def test_expired_tokens_are_rejected_even_after_being_cached(fresh_cache):
+    expires_at = datetime.utcnow() - timedelta(seconds=1)
+    token = jwt.encode({"sub": "user-1", "exp": expires_at}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    fresh_cache.put(token, "user-1", expires_at=time.time() - 1)
+
+    with pytest.raises(JWTError):
+        verify_token(token)
+    assert fresh_cache.stats()["entries"] == 0
+
+
+def test_invalid_and_subjectless_tokens_are_rejected(fresh_cache):
+    with pytest.raises(JWTError):
+        verify_token(create_access_token({"sub": "user-1"}) + "x")
+    with pytest.raises(JWTError):
+        verify_token(create_access_token({"role": "student"}))
+    assert fresh_cache.stats()["entries"] == 0
+
+
+def test_tokens_without_expiry_are_not_cached(fresh_cache):
+    token = jwt.encode({"sub": "user-1"}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    assert verify_token(token) == "user-1"
+    assert fresh_cache.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize("where", ["cookie", "query", "header"])
+def test_websocket_token_sources(fresh_cache, where):
+    token = create_access_token({"sub": "user-1"})
+    ws = SimpleNamespace(
+        cookies={"access_token": token} if where == "cookie" else {},
+        query_params={"token": token} if where == "query" else {},
+        headers={"authorization": f"Bearer {token}"} if where == "header" else {},
+    )
+    assert websocket_user_id(ws) == "user-1"
+
+
+def test_websocket_without_token_is_anonymous():
+    assert websocket_user_id(SimpleNamespace(cookies={}, query_params={}, headers={})) is None
+
+
+def test_password_hasher_round_trip(monkeypatch):
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 4)
+    hasher = PasswordHasher(workers=1, max_queue=1)
+
+    async def run():
+        hashed = await hasher.hash("s3cret")
+        return await hasher.verify("s3cret", hashed), await hasher.verify("wrong", hashed)
+
+    assert asyncio.run(run()) == (True, False)
+    assert hasher.stats()["completed"] == 3 and hasher.stats()["outstanding"] == 0
+
+
+def test_password_hasher_fails_fast_when_the_queue_is_full():
+    hasher = PasswordHasher(workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def run():
+        busy = [asyncio.ensure_future(hasher._run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as error:
+            await hasher._run(release.wait)
+        release.set()
+        await asyncio.gather(*busy)
+        return error.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 503 and error.headers == {"Retry-After": "1"}
+    assert hasher.stats()["rejected"] == 1 and hasher.stats()["completed"] == 2
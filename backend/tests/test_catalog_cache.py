@@ -0,0 +1,125 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import catalog_cache
+from catalog_cache import CatalogCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(catalog_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def loader(value, calls):
+    async def load():
+        calls.append(value)
+        return value
+
+    return load
+
+
+def get(cache, key, value, calls):
+    return asyncio.run(cache.get(key, loader(value, calls)))
+
+
+def test_hits_until_the_ttl_expires(clock):
+    cache = CatalogCache(ttl_seconds=60, max_entries=8, sync="none")
+    calls = []
+
+    assert get(cache, "styles", "v1", calls) == "v1"
+    clock[0] += 59
+    assert get(cache, "styles", "v2", calls) == "v1"
+    clock[0] += 2
+    assert get(cache, "styles", "v3", calls) == "v3"
+
+    assert calls == ["v1", "v3"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_evicts_the_least_recently_used_entry(clock):
+    cache = CatalogCache(ttl_seconds=60, max_entries=2, sync="none")
+    calls = []
+    get(cache, "a", "a", calls)
+    get(cache, "b", "b", calls)
+    get(cache, "a", "a", calls)  # "b" is now the least recently used
+    get(cache, "c", "c", calls)
+
+    get(cache, "a", "a", calls)
+    get(cache, "b", "b", calls)
+
+    assert calls == ["a", "b", "c", "b"]
+    assert cache.stats()["entries"] == 2
+
+
+def test_invalidate_drops_everything(clock):
+    cache = CatalogCache(ttl_seconds=60, max_entries=8, sync="none")
+    calls = []
+    get(cache, "a", "old", calls)
+    cache.invalidate()
+    assert get(cache, "a", "new", calls) == "new"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_a_result_loaded_across_an_invalidation_is_not_cached(clock):
+    cache = CatalogCache(ttl_seconds=60, max_entries=8, sync="none")
+
+    async def stale_load():
+        cache.invalidate()  # a write lands while the query runs
+        return "stale"
+
+    async def run():
+        assert await cache.get("a", stale_load) == "stale"
+        return await cache.get("a", loader("fresh", []))
+
+    assert asyncio.run(run()) == "fresh"
+
+
+def test_polling_invalidates_when_another_worker_bumps_the_version(clock, monkeypatch):
+    remote = [3]
+
+    async def read_catalog_version():
+        return remote[0]
+
+    monkeypatch.setattr(catalog_cache, "read_catalog_version", read_catalog_version)
+    cache = CatalogCache(ttl_seconds=600, max_entries=8, sync="poll", poll_seconds=5)
+    calls = []
+
+    get(cache, "a", "v1", calls)
+    remote[0] = 4
+    assert get(cache, "a", "v2", calls) == "v1"  # not polled again yet
+    clock[0] += 5
+    assert get(cache, "a", "v2", calls) == "v2"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_failed_polls_keep_serving_the_cache(clock, monkeypatch):
+    async def read_catalog_version():
+        raise ConnectionError("no database")
+
+    monkeypatch.setattr(catalog_cache, "read_catalog_version", read_catalog_version)
+    cache = CatalogCache(ttl_seconds=600, max_entries=8, sync="poll", poll_seconds=0)
+    calls = []
+    get(cache, "a", "v1", calls)
+    assert get(cache, "a", "v2", calls) == "v1"
+
+
+def test_change_stream_falls_back_to_polling(monkeypatch):
+    class StandaloneDatabase:
+        def watch(self, pipeline):
+            raise RuntimeError("change streams need a replica set")
+
+    monkeypatch.setattr(catalog_cache, "catalog_meta_collection",
+                        lambda: SimpleNamespace(database=StandaloneDatabase()))
+    cache = CatalogCache(ttl_seconds=60, max_entries=8, sync="change_stream")
+
+    async def run():
+        cache.start()
+        await asyncio.wait_for(cache._watch_task, 1)
+        await cache.stop()
+
+    asyncio.run(run())
+    assert cache.sync == "poll"
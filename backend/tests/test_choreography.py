@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from choreography import ChoreographyNotFound, ChoreographySequence, load_sequence, save_sequence
+from static_pose_comparision.pose_utils import ANGLE_NAMES, NUM_LANDMARKS
+
+
+def sequence(key, frames):
+    rng = np.random.default_rng(0)
+    return ChoreographySequence(
+        key,
+        np.arange(frames, dtype=np.float64) / 15,
+        rng.random((frames, NUM_LANDMARKS, 2)),
+        rng.uniform(0, 180, (frames, len(ANGLE_NAMES))),
+    )
+
+
+def test_saved_sequence_loads_back(tmp_path):
+    saved = sequence("song-a", 12)
+    save_sequence(saved, folder=str(tmp_path))
+    loaded = load_sequence("song-a", folder=str(tmp_path))
+    assert len(loaded) == 12
+    np.testing.assert_array_equal(loaded.angles, saved.angles)
+    np.testing.assert_array_equal(loaded.keypoints, saved.keypoints)
+
+
+def test_empty_sequence_is_not_found(tmp_path):
+    save_sequence(sequence("empty", 0), folder=str(tmp_path))
+    with pytest.raises(ChoreographyNotFound):
+        load_sequence("empty", folder=str(tmp_path))
+
+
+@pytest.mark.parametrize("key", ["missing", "../etc", ""])
+def test_missing_or_unsafe_keys_are_not_found(tmp_path, key):
+    with pytest.raises(ChoreographyNotFound):
+        load_sequence(key, folder=str(tmp_path))
@@ -0,0 +1,118 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from auth import get_current_user_id
+from routes import dance_routes
+from routes.dance_routes import CatalogRows, etag_matches
+from status_writer import StatusWriteBuffer
+
+USER_ID = ObjectId()
+SONG_ID = ObjectId()
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", "abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+    assert not etag_matches("", '"abc"')
+
+
+class FakeStatuses:
+    """Stands in for the UserSongStatus model: counts queries, returns one stored row."""
+
+    user = song = SimpleNamespace(id=SimpleNamespace())
+
+    def __init__(self):
+        self.queries = 0
+        self.row = None
+
+    def find(self, *conditions):
+        self.queries += 1
+
+        async def to_list():
+            return [self.row] if self.row else []
+
+        return SimpleNamespace(to_list=to_list)
+
+    async def find_one(self, *conditions):
+        self.queries += 1
+        return self.row
+
+
+class FakeCatalog:
+    def __init__(self, entries):
+        self.entries = entries
+
+    async def get(self, key, loader):
+        return self.entries[key]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    songs = CatalogRows([{"_id": str(SONG_ID), "name": "Song", "description": "", "time": 3, "lessons": 2,
+                          "teacher": "T", "status": "start"}])
+    steps = CatalogRows([{"_id": str(ObjectId()), "name": f"Step {i}", "time": 1, "description": "",
+                          "status": "pending"} for i in range(4)])
+    statuses = FakeStatuses()
+    writer = StatusWriteBuffer(flush_seconds=60, max_pending=100)
+    monkeypatch.setattr(dance_routes, "catalog_cache", FakeCatalog({
+        ("songs", "0" * 24): songs, ("steps", str(SONG_ID)): steps,
+    }))
+    monkeypatch.setattr(dance_routes, "UserSongStatus", statuses)
+    monkeypatch.setattr(dance_routes, "status_writer", writer)
+
+    app = FastAPI()
+    app.include_router(dance_routes.router, prefix="/api/dance")
+    app.dependency_overrides[get_current_user_id] = lambda: str(USER_ID)
+    with TestClient(app) as client:
+        yield client, statuses, writer
+
+
+@pytest.mark.parametrize("path", ["/api/dance/" + "0" * 24, f"/api/dance/{'0' * 24}/{SONG_ID}"])
+def test_unchanged_per_user_response_is_304_without_queries(api, path):
+    client, statuses, writer = api
+    first = client.get(path)
+    assert first.status_code == 200 and statuses.queries == 1
+    etag = first.headers["etag"]
+
+    again = client.get(path, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag
+    assert statuses.queries == 1  # answered without touching the database
+
+    # A status update of this user changes the ETag
+    client.portal.call(writer.add, USER_ID, SONG_ID, "completed", 100, datetime.utcnow())
+    changed = client.get(path, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert statuses.queries == 2
+
+
+def test_other_users_updates_keep_the_etag(api):
+    client, statuses, writer = api
+    path = f"/api/dance/{'0' * 24}/{SONG_ID}"
+    etag = client.get(path).headers["etag"]
+    client.portal.call(writer.add, ObjectId(), SONG_ID, "completed", 100, datetime.utcnow())
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_body_hash_etag_when_memory_versions_are_off(api, monkeypatch):
+    client, statuses, writer = api
+    monkeypatch.setattr(dance_routes.settings, "CATALOG_PRIVATE_ETAG_FROM_MEMORY", False)
+    path = f"/api/dance/{'0' * 24}/{SONG_ID}"
+    etag = client.get(path).headers["etag"]
+    again = client.get(path, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert statuses.queries == 2  # revalidated against the database
+
+    statuses.row = SimpleNamespace(progress=50, status="resume", song=SimpleNamespace(id=SONG_ID))
+    changed = client.get(path, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert [step["status"] for step in changed.json()] == ["completed", "completed", "pending", "pending"]
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from db_indexes import merge_duplicate_statuses, plan_stages
+
+
+def test_duplicate_statuses_fold_into_the_latest_row():
+    ids = [ObjectId() for _ in range(3)]
+    rows = [
+        {"_id": ids[0], "status": "completed", "progress": 100, "last_accessed": datetime(2025, 2, 1)},
+        {"_id": ids[1], "status": "resume", "progress": 40, "last_accessed": datetime(2025, 3, 1)},
+        {"_id": ids[2], "status": "start", "progress": 0, "last_accessed": datetime(2025, 1, 1)},
+    ]
+    kept, fields, removed = merge_duplicate_statuses(rows)
+    assert kept == ids[1]
+    # Applied in access order like live updates: a later "resume" doesn't undo "completed"
+    assert fields == {"status": "completed", "progress": 100, "last_accessed": datetime(2025, 3, 1)}
+    assert sorted(removed) == sorted([ids[0], ids[2]])
+
+    rows[2]["last_accessed"] = datetime(2025, 2, 15)
+    # An explicit restart after completing does reset the status (but not the progress)
+    assert merge_duplicate_statuses(rows)[1]["status"] == "resume"
+
+
+def test_duplicate_statuses_without_fields():
+    ids = [ObjectId(), ObjectId()]
+    kept, fields, removed = merge_duplicate_statuses([{"_id": ids[0]}, {"_id": ids[1], "status": "resume"}])
+    assert (kept, fields, removed) == (ids[1], {"status": "resume"}, [ids[0]])
+
+
+def test_plan_stages_walks_nested_plans():
+    plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}, "other": [{"stage": "COLLSCAN"}]}
+    assert plan_stages(plan) == ["FETCH", "IXSCAN", "COLLSCAN"]
@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+
+from static_pose_comparision.frame_pipeline import CaptureThread, FrameRing
+
+SHAPE = (4, 6, 3)
+
+
+class FakeCapture:
+    """A cv2.VideoCapture stand-in replaying `reads` (True = a frame, False = a failed read)."""
+
+    def __init__(self, reads, frame_count=0):
+        self.reads = list(reads)
+        self.frame_count = frame_count
+        self.position = 0
+
+    def read(self, image=None):
+        ok = self.reads.pop(0) if self.reads else False
+        if not ok:
+            return False, None
+        self.position += 1
+        if image is None:
+            image = np.empty(SHAPE, dtype=np.uint8)
+        image[:] = self.position
+        return True, image
+
+    def get(self, prop):
+        return {cv2.CAP_PROP_FRAME_COUNT: self.frame_count, cv2.CAP_PROP_POS_FRAMES: self.position}[prop]
+
+
+def run_capture(cap, **kwargs):
+    ring = FrameRing(SHAPE, slots=4)
+    capture = CaptureThread(cap, ring, flip=False, retry_delay=0, **kwargs)
+    capture.start()
+    capture.join(timeout=5)
+    assert not capture.is_alive()
+    assert ring.closed
+    return capture, ring
+
+
+def test_camera_survives_occasional_failed_reads():
+    capture, ring = run_capture(FakeCapture([True, False, True, False, False, True]), max_read_failures=3)
+
+    assert capture.stats.frames == 3
+    assert capture.read_failures == 6  # 3 in between, then 3 in a row once the fake runs dry
+    assert ring.acquire().image[0, 0, 0] == 3
+
+
+def test_camera_gives_up_after_repeated_failures():
+    capture, _ = run_capture(FakeCapture([True] + [False] * 10 + [True]), max_read_failures=5)
+    assert capture.stats.frames == 1
+    assert capture.read_failures == 5
+
+
+def test_video_file_stops_at_its_last_frame():
+    capture, ring = run_capture(FakeCapture([True, True], frame_count=2), max_read_failures=50)
+    assert capture.stats.frames == 2
+    assert capture.read_failures == 1
+    assert ring.acquire().image[0, 0, 0] == 2
+
+
+def test_video_file_retries_a_failed_read_before_its_end():
+    capture, _ = run_capture(FakeCapture([True, False, True], frame_count=2), max_read_failures=50)
+    assert capture.stats.frames == 2
+    assert capture.read_failures == 2
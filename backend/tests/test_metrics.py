@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import metrics
+from metrics import Counter, Gauge, Histogram, MetricsMiddleware, MongoCommandListener, register_collector, register_stats, render
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """Keeps metrics created by a test out of the process-wide registry."""
+    monkeypatch.setattr(metrics, "_metrics", [])
+    monkeypatch.setattr(metrics, "_collectors", [])
+
+
+def sample_lines(text, name):
+    return [line for line in text.splitlines() if line.startswith(name)]
+
+
+def test_counters_and_gauges_per_label_set():
+    requests = Counter("requests_total", "Requests", ("route",))
+    requests.inc("/a")
+    requests.inc("/a", amount=2)
+    requests.inc('/b"quoted"')
+    sessions = Gauge("sessions", "Open sessions")
+    sessions.inc()
+    sessions.inc()
+    sessions.dec()
+
+    text = render()
+
+    assert "# TYPE requests_total counter" in text
+    assert sample_lines(text, "requests_total") == [
+        'requests_total{route="/a"} 3',
+        'requests_total{route="/b\\"quoted\\""} 1',
+    ]
+    assert sample_lines(text, "sessions ") == ["sessions 1"]
+
+
+def test_histogram_buckets_are_cumulative():
+    latency = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    assert sample_lines(render(), "latency_seconds") == [
+        'latency_seconds_bucket{le="0.1"} 2',  # a value on the bound counts as <= it
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_count 4",
+        "latency_seconds_sum 3.65",
+    ]
+
+
+def test_register_stats_exposes_numeric_values_only():
+    register_stats("cache", lambda: {"hits": 3, "ratio": 0.5, "enabled": True, "sync": "poll"})
+    text = render()
+    assert sample_lines(text, "cache_") == ["cache_hits 3", "cache_ratio 0.5"]
+    assert "# TYPE cache_hits gauge" in text
+
+
+def test_a_failing_collector_does_not_break_the_scrape():
+    def broken():
+        raise RuntimeError("stats unavailable")
+        yield
+
+    register_collector(broken)
+    Counter("still_here_total", "Still rendered").inc()
+
+    text = render()
+
+    assert "# collector failed: stats unavailable" in text
+    assert "still_here_total 1" in text
+
+
+def test_middleware_labels_requests_by_route_template(monkeypatch):
+    requests = Counter("http_test_requests_total", "Requests", ("method", "route", "status"))
+    monkeypatch.setattr(metrics, "HTTP_REQUESTS", requests)
+    monkeypatch.setattr(metrics, "HTTP_LATENCY", Histogram("http_test_seconds", "Latency", ("method", "route")))
+    monkeypatch.setattr(metrics, "HTTP_RESPONSE_SIZE", Histogram("http_test_bytes", "Size", ("method", "route")))
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/api/dance/{dance_id}")
+    async def dance(dance_id: str):
+        return {"id": dance_id}
+
+    client = TestClient(app)
+    client.get("/api/dance/1")
+    client.get("/api/dance/2")
+    client.get("/nowhere")
+
+    assert requests._values == {
+        ("GET", "/api/dance/{dance_id}", 200): 2,
+        ("GET", "unmatched", 404): 1,
+    }
+    assert metrics.HTTP_IN_FLIGHT._values[()] == 0
+
+
+def test_mongo_listener_times_commands_per_collection(monkeypatch):
+    commands = Counter("mongo_test_total", "Commands", ("collection", "command", "outcome"))
+    monkeypatch.setattr(metrics, "MONGO_COMMANDS", commands)
+    monkeypatch.setattr(metrics, "MONGO_LATENCY", Histogram("mongo_test_seconds", "Latency", ("collection", "command")))
+    listener = MongoCommandListener()
+
+    listener.started(SimpleNamespace(request_id=1, command_name="find", command={"find": "songs"}))
+    listener.started(SimpleNamespace(request_id=2, command_name="getMore", command={"getMore": 7, "collection": "songs"}))
+    listener.succeeded(SimpleNamespace(request_id=1, command_name="find", duration_micros=1500))
+    listener.failed(SimpleNamespace(request_id=2, command_name="getMore", duration_micros=800))
+
+    assert commands._values == {("songs", "find", "success"): 1, ("songs", "getMore", "failure"): 1}
+    assert listener._collections == {}
@@ -0,0 +1,53 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from pose_backends import InlineBackend, ProcessPoolBackend, ThreadPoolBackend, create_backend, score_pose_batch
+from static_pose_comparision.pose_utils import NUM_LANDMARKS, calculate_angles_array
+
+
+def batch(size=3, seed=0):
+    rng = np.random.default_rng(seed)
+    user = rng.uniform(0.1, 0.9, (size, NUM_LANDMARKS, 2))
+    ref = rng.uniform(0.1, 0.9, (size, NUM_LANDMARKS, 2))
+    return user, ref, calculate_angles_array(ref)
+
+
+@pytest.mark.parametrize("backend", [InlineBackend, lambda: ThreadPoolBackend(2)])
+def test_backends_match_scoring_on_the_loop(backend):
+    backend = backend()
+    user, ref, ref_angles = batch()
+    try:
+        angles, accuracy = asyncio.run(backend.score(user, ref, ref_angles, None, 90))
+    finally:
+        backend.shutdown()
+    expected_angles, expected_accuracy = score_pose_batch(user, ref, ref_angles, 90)
+    np.testing.assert_allclose(angles, expected_angles)
+    np.testing.assert_allclose(accuracy, expected_accuracy)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_backend("gpu")
+
+
+def test_process_pool_is_replaced_after_a_worker_dies():
+    backend = ProcessPoolBackend(1, None)
+    user, ref, ref_angles = batch()
+    expected = score_pose_batch(user, ref, ref_angles, 90)[1]
+
+    async def run():
+        np.testing.assert_allclose((await backend.score(user, ref, ref_angles, None, 90))[1], expected)
+        broken = backend._executor
+        for process in list(broken._processes.values()):
+            process.kill()
+        # The batch hitting the broken pool is retried on a new one
+        np.testing.assert_allclose((await backend.score(user, ref, ref_angles, None, 90))[1], expected)
+        assert backend._executor is not broken
+        assert backend.pool_restarts == 1
+
+    try:
+        asyncio.run(run())
+    finally:
+        backend.shutdown()
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from static_pose_comparision.pose_dtw import StreamingDTW
+
+
+def reference(length=120, joints=6):
+    """Smooth, non-repeating angle trajectories."""
+    t = np.arange(length)[:, None]
+    return 90 + 60 * np.sin(t / (9 + np.arange(joints)) + np.arange(joints))
+
+
+def test_follows_the_reference_at_its_own_tempo():
+    ref = reference()
+    dtw = StreamingDTW(ref, window=32)
+    for i, frame in enumerate(ref):
+        position, cost = dtw.update(frame)
+        assert position == i
+        assert cost == 0
+    assert dtw.completed
+
+
+def test_follows_a_student_at_double_speed():
+    ref = reference()
+    dtw = StreamingDTW(ref, window=32, max_step=2)
+    for i in range(0, len(ref), 2):
+        position, _ = dtw.update(ref[i])
+        assert abs(position - i) <= 1
+    assert dtw.tempo > 1.5
+
+
+def test_holds_position_while_the_student_pauses():
+    ref = reference()
+    dtw = StreamingDTW(ref, window=32)
+    for frame in ref[:40]:
+        dtw.update(frame)
+    for _ in range(10):
+        position, _ = dtw.update(ref[39])
+    assert abs(position - 39) <= 1
+    assert dtw.tempo < 0.5
+
+
+def test_frames_without_joints_keep_the_match():
+    ref = reference()
+    dtw = StreamingDTW(ref, window=32)
+    for frame in ref[:20]:
+        dtw.update(frame)
+    assert dtw.update(np.full(ref.shape[1], np.nan)) == (19, None)
+    assert dtw.frames == 20
+
+
+def test_missing_joints_are_ignored():
+    ref = reference()
+    dtw = StreamingDTW(ref, window=32)
+    for i, frame in enumerate(ref[:30]):
+        frame = frame.copy()
+        frame[::2] = np.nan
+        position, cost = dtw.update(frame)
+        assert position == i
+        assert cost == 0
+
+
+def test_empty_reference_is_rejected():
+    with pytest.raises(ValueError):
+        StreamingDTW(np.empty((0, 6)))
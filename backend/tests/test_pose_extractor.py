@@ -0,0 +1,63 @@
+import asyncio
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from pose_extractor import ImageFrameError, PoseExtractorPool, image_dimensions
+
+
+def encode(extension, width, height, params=()):
+    ok, data = cv2.imencode(extension, np.full((height, width, 3), 128, dtype=np.uint8), list(params))
+    assert ok
+    return data.tobytes()
+
+
+@pytest.mark.parametrize("extension, params", [
+    (".jpg", ()),
+    (".jpg", (cv2.IMWRITE_JPEG_PROGRESSIVE, 1)),
+    (".webp", (cv2.IMWRITE_WEBP_QUALITY, 80)),   # lossy VP8
+    (".webp", (cv2.IMWRITE_WEBP_QUALITY, 101)),  # lossless VP8L
+])
+def test_image_dimensions_reads_the_header(extension, params):
+    assert image_dimensions(encode(extension, 321, 123, params)) == (321, 123)
+
+
+def test_image_dimensions_reads_extended_webp():
+    header = b"RIFF" + struct.pack("<I", 22) + b"WEBP" + b"VP8X" + struct.pack("<I", 10) + bytes(4)
+    data = header + (4999).to_bytes(3, "little") + (2999).to_bytes(3, "little")
+    assert image_dimensions(data) == (5000, 3000)
+
+
+@pytest.mark.parametrize("data", [
+    b"\xff\xd8",
+    b"\xff\xd8\xff\xe0\x00\x00",    # zero-length segment
+    b"\xff\xd8\xff\xda\x00\x08" + bytes(8),  # scan data before the frame header
+    b"RIFF\x00\x00\x00\x00WEBPVP8 ",
+])
+def test_image_dimensions_rejects_broken_headers(data):
+    with pytest.raises(ImageFrameError, match="header"):
+        image_dimensions(data)
+
+
+@pytest.mark.parametrize("data", [b"", encode(".png", 8, 8)])
+def test_image_dimensions_rejects_other_formats(data):
+    with pytest.raises(ImageFrameError, match="JPEG or WebP"):
+        image_dimensions(data)
+
+
+def test_oversized_images_are_rejected_before_decoding():
+    pool = PoseExtractorPool(workers=1, max_concurrent=1, max_image_pixels=100 * 100)
+    pool.check_size(encode(".jpg", 100, 100))
+
+    with pytest.raises(ImageFrameError, match="200x100 pixels"):
+        asyncio.run(pool.extract(encode(".jpg", 200, 100)))
+    # Rejected on the event loop: no worker was started to decode it
+    assert pool.rejected == 1 and pool._executor is None
+
+
+def test_large_files_are_rejected_by_byte_count():
+    pool = PoseExtractorPool(workers=1, max_concurrent=1, max_image_bytes=10)
+    with pytest.raises(ImageFrameError, match="bytes"):
+        pool.check_size(encode(".jpg", 8, 8))
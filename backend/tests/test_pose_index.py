@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from models import NearestPoseQuery
+from routes.pose_routes import parse_detect_k
+from static_pose_comparision.pose_index import PoseIndex, embed_poses
+from static_pose_comparision.pose_utils import NUM_LANDMARKS
+
+
+def random_poses(count, seed=0):
+    return np.random.default_rng(seed).uniform(0.2, 0.8, size=(count, NUM_LANDMARKS, 2))
+
+
+def test_query_matches_brute_force():
+    poses = random_poses(200)
+    index = PoseIndex(poses)
+    query = random_poses(1, seed=1)[0]
+
+    nearest, distances = index.query(query, k=5)
+
+    expected = np.linalg.norm(embed_poses(poses) - embed_poses(query), axis=1)
+    np.testing.assert_array_equal(nearest, np.argsort(expected)[:5])
+    np.testing.assert_allclose(distances, np.sort(expected)[:5], atol=1e-4)
+
+
+def test_query_ignores_position_and_scale():
+    poses = random_poses(50)
+    index = PoseIndex(poses)
+
+    nearest, distances = index.query(poses[7] * 0.5 + 0.1, k=1)
+
+    assert nearest[0] == 7
+    assert distances[0] == pytest.approx(0, abs=1e-3)
+
+
+def test_query_caps_k_at_index_size():
+    index = PoseIndex(random_poses(3))
+    nearest, distances = index.query(random_poses(1)[0], k=10)
+    assert sorted(nearest) == [0, 1, 2]
+    assert list(distances) == sorted(distances)
+
+
+def test_missing_landmarks_do_not_poison_distances():
+    index = PoseIndex(random_poses(10))
+    query = random_poses(1, seed=2)[0]
+    query[25:] = np.nan
+    _, distances = index.query(query, k=3)
+    assert np.isfinite(distances).all()
+
+
+@pytest.mark.parametrize("value, expected", [
+    (3, 3), ("7", 7), (1, 1), (50, 50),
+    (0, None), (51, None), ("abc", None), (None, None), (2.5, None), (True, None), ([3], None),
+])
+def test_parse_detect_k(value, expected):
+    assert parse_detect_k(value) == expected
+
+
+def test_nearest_query_requires_every_landmark():
+    landmark = {"x": 0.5, "y": 0.5}
+    with pytest.raises(ValidationError):
+        NearestPoseQuery(landmarks=[])
+    with pytest.raises(ValidationError):
+        NearestPoseQuery(landmarks=[landmark] * (NUM_LANDMARKS - 1))
+    assert len(NearestPoseQuery(landmarks=[landmark] * NUM_LANDMARKS).landmarks) == NUM_LANDMARKS
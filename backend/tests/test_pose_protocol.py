@@ -0,0 +1,68 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from pose_protocol import (
+    FEEDBACK_FOCUS,
+    FEEDBACK_MESSAGES,
+    FRAME_DTYPE,
+    REPLY_STRUCT,
+    FrameFormatError,
+    binary_handshake,
+    decode_binary_frame,
+    decode_json_frame,
+    encode_binary_reply,
+    feedback_text,
+)
+from static_pose_comparision.pose_utils import ANGLE_NAMES, NUM_LANDMARKS
+
+
+@pytest.mark.parametrize("stride", [2, 4])
+def test_binary_frame_round_trip(stride):
+    values = np.random.default_rng(stride).random((NUM_LANDMARKS, stride)).astype(FRAME_DTYPE)
+    points = decode_binary_frame(values.tobytes())
+    assert points.shape == (NUM_LANDMARKS, 2)
+    np.testing.assert_array_equal(points, values[:, :2])
+
+
+def test_empty_binary_frame_means_no_person():
+    assert decode_binary_frame(b"") is None
+
+
+@pytest.mark.parametrize("count", [NUM_LANDMARKS, NUM_LANDMARKS * 3, NUM_LANDMARKS * 2 + 1])
+def test_binary_frame_of_wrong_size_is_rejected(count):
+    with pytest.raises(FrameFormatError):
+        decode_binary_frame(np.zeros(count, dtype=FRAME_DTYPE).tobytes())
+
+
+@pytest.mark.parametrize("size", [1, 3, NUM_LANDMARKS * 2 * 4 + 2])
+def test_binary_frame_of_partial_floats_is_rejected(size):
+    with pytest.raises(FrameFormatError):
+        decode_binary_frame(b"\0" * size)
+
+
+def test_json_frame_matches_binary_frame():
+    values = np.random.default_rng(0).random((NUM_LANDMARKS, 2)).astype(FRAME_DTYPE)
+    landmarks = [{"x": float(x), "y": float(y)} for x, y in values]
+    np.testing.assert_array_equal(
+        decode_json_frame({"landmarks": landmarks}), decode_binary_frame(values.tobytes())
+    )
+    assert decode_json_frame({"landmarks": []}) is None
+
+
+def test_reply_round_trip():
+    data = encode_binary_reply(87.5, True, FEEDBACK_FOCUS, 3, 1234)
+    assert len(data) == REPLY_STRUCT.size
+    accuracy, next_pose, feedback, joint, pose_index = REPLY_STRUCT.unpack(data)
+    assert (accuracy, next_pose, feedback, joint, pose_index) == (87.5, 1, FEEDBACK_FOCUS, 3, 1234)
+    assert feedback_text(feedback, joint) == f"Focus on your {ANGLE_NAMES[3].replace('_', ' ')}."
+
+
+def test_handshake_describes_the_wire_format():
+    handshake = json.loads(binary_handshake(["a", "b"]))
+    assert struct.Struct(handshake["reply_format"]).size == REPLY_STRUCT.size
+    assert handshake["joints"] == list(ANGLE_NAMES)
+    assert handshake["poses"] == ["a", "b"]
+    assert handshake["feedback"] == {str(code): message for code, message in FEEDBACK_MESSAGES.items()}
@@ -0,0 +1,260 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from pose_backends import score_pose_batch
+from pose_scheduler import LatestFrameMailbox, PoseScoringScheduler, SendRateAdvisor
+from static_pose_comparision.pose_utils import NUM_LANDMARKS, calculate_angles_array
+
+
+def frame(seed):
+    rng = np.random.default_rng(seed)
+    user = rng.uniform(0.1, 0.9, (NUM_LANDMARKS, 2))
+    ref = rng.uniform(0.1, 0.9, (NUM_LANDMARKS, 2))
+    return user, ref, calculate_angles_array(ref)
+
+
+class RecordingBackend:
+    """Scores on the loop like InlineBackend, remembering each batch's size."""
+
+    name = "recording"
+
+    def __init__(self, max_in_flight=1):
+        self.max_in_flight = max_in_flight
+        self.batch_sizes = []
+        self.error = None
+
+    async def score(self, user_points, ref_points, ref_angles, ref_rows, max_angle_difference):
+        self.batch_sizes.append(len(user_points))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return score_pose_batch(user_points, ref_points, ref_angles, max_angle_difference)
+
+    def shutdown(self):
+        pass
+
+
+def run(scheduler, coroutine):
+    async def main():
+        try:
+            return await coroutine()
+        finally:
+            await scheduler.stop()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_frames_are_scored_as_one_batch():
+    backend = RecordingBackend()
+    scheduler = PoseScoringScheduler(window_ms=50, max_batch_size=8, max_angle_difference=90, backend=backend)
+    frames = [frame(seed) for seed in range(5)]
+
+    results = run(scheduler, lambda: asyncio.gather(*(scheduler.score(*f) for f in frames)))
+
+    assert backend.batch_sizes == [5]
+    for (user, ref, ref_angles), (angles, accuracy) in zip(frames, results):
+        expected_angles, expected_accuracy = score_pose_batch(user[None], ref[None], ref_angles[None], 90)
+        np.testing.assert_allclose(angles, expected_angles[0])
+        assert accuracy == pytest.approx(float(expected_accuracy[0]))
+    stats = scheduler.stats()
+    assert stats["frames_scored"] == 5 and stats["batches_scored"] == 1 and stats["batch_size_max"] == 5
+
+
+def test_full_batches_are_split_and_sent_without_waiting_for_the_window():
+    backend = RecordingBackend()
+    scheduler = PoseScoringScheduler(window_ms=10_000, max_batch_size=3, backend=backend)
+
+    async def score_all():
+        return await asyncio.wait_for(asyncio.gather(*(scheduler.score(*frame(seed)) for seed in range(6))), 5)
+
+    results = run(scheduler, score_all)
+
+    assert backend.batch_sizes == [3, 3]
+    assert all(accuracy is None for _, accuracy in results)  # no max_angle_difference
+
+
+def test_backend_errors_reach_every_frame_of_the_batch():
+    backend = RecordingBackend()
+    backend.error = RuntimeError("scoring failed")
+    scheduler = PoseScoringScheduler(window_ms=10, max_batch_size=4, backend=backend)
+
+    results = run(scheduler, lambda: asyncio.gather(*(scheduler.score(*frame(seed)) for seed in range(3)),
+                                                     return_exceptions=True))
+
+    assert [str(result) for result in results] == ["scoring failed"] * 3
+
+
+def test_frames_of_disconnected_sessions_are_skipped():
+    backend = RecordingBackend()
+    scheduler = PoseScoringScheduler(window_ms=20, max_batch_size=4, backend=backend)
+
+    async def score_with_one_disconnect():
+        gone = asyncio.ensure_future(scheduler.score(*frame(0)))
+        kept = asyncio.ensure_future(scheduler.score(*frame(1)))
+        await asyncio.sleep(0)
+        gone.cancel()
+        return await kept
+
+    run(scheduler, score_with_one_disconnect)
+
+    assert backend.batch_sizes == [1]
+
+
+def test_stop_cancels_frames_still_waiting():
+    scheduler = PoseScoringScheduler(window_ms=10_000, max_batch_size=8, backend=RecordingBackend())
+
+    async def stop_while_waiting():
+        waiting = asyncio.ensure_future(scheduler.score(*frame(0)))
+        await asyncio.sleep(0.01)
+        await scheduler.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert scheduler.stats()["pending"] == 0
+
+    run(scheduler, stop_while_waiting)
+
+
+class BlockingBackend(RecordingBackend):
+    """Holds every batch until `release` is set."""
+
+    def __init__(self, max_in_flight):
+        super().__init__(max_in_flight)
+        self.release = asyncio.Event()
+        self.running = 0
+        self.max_running = 0
+
+    async def score(self, *args):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await self.release.wait()
+            return await super().score(*args)
+        finally:
+            self.running -= 1
+
+
+def test_batches_in_flight_are_capped_by_the_backend():
+    backend = BlockingBackend(max_in_flight=2)
+    scheduler = PoseScoringScheduler(window_ms=0, max_batch_size=1, backend=backend)
+
+    async def score_behind_busy_backend():
+        frames = [asyncio.ensure_future(scheduler.score(*frame(seed))) for seed in range(5)]
+        await asyncio.sleep(0.05)
+        # Two batches are in the backend; the rest wait for a slot
+        assert backend.running == 2 and scheduler.stats()["batches_in_flight"] == 2
+        backend.release.set()
+        await asyncio.gather(*frames)
+
+    run(scheduler, score_behind_busy_backend)
+
+    assert backend.max_running == 2 and len(backend.batch_sizes) == 5
+
+
+def test_frames_wait_in_one_batch_while_every_slot_is_busy():
+    backend = BlockingBackend(max_in_flight=1)
+    scheduler = PoseScoringScheduler(window_ms=0, max_batch_size=8, backend=backend)
+
+    async def score_behind_busy_backend():
+        first = asyncio.ensure_future(scheduler.score(*frame(0)))
+        await asyncio.sleep(0.01)
+        rest = [asyncio.ensure_future(scheduler.score(*frame(seed))) for seed in range(1, 4)]
+        await asyncio.sleep(0.01)
+        backend.release.set()
+        await asyncio.gather(first, *rest)
+
+    run(scheduler, score_behind_busy_backend)
+
+    assert backend.batch_sizes == [1, 3]
+
+
+def test_stop_releases_sessions_whose_batch_is_in_flight():
+    backend = BlockingBackend(max_in_flight=1)
+    scheduler = PoseScoringScheduler(window_ms=0, max_batch_size=4, backend=backend)
+
+    async def stop_while_scoring():
+        scoring = asyncio.ensure_future(scheduler.score(*frame(0)))
+        await asyncio.sleep(0.01)
+        assert backend.running == 1
+        await scheduler.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(scoring, 1)
+
+    run(scheduler, stop_while_scoring)
+
+
+def test_mailbox_keeps_only_the_newest_frame():
+    mailbox = LatestFrameMailbox()
+
+    async def drain():
+        for i in range(3):
+            mailbox.put(f"frame {i}")
+        return await mailbox.get()
+
+    assert asyncio.run(drain()) == "frame 2"
+    assert mailbox.received == 3 and mailbox.dropped == 2
+
+
+def test_mailbox_delivers_controls_in_order_and_drops_the_frame_they_overtake():
+    mailbox = LatestFrameMailbox()
+
+    async def drain():
+        mailbox.put("old frame")
+        mailbox.put_control({"mode": "detect"})
+        mailbox.put_control({"mode": "static"})
+        mailbox.put("new frame")
+        return [await mailbox.get() for _ in range(3)]
+
+    assert asyncio.run(drain()) == [{"mode": "detect"}, {"mode": "static"}, "new frame"]
+    assert mailbox.dropped == 1
+
+
+def test_mailbox_wakes_a_waiting_scorer():
+    mailbox = LatestFrameMailbox()
+
+    async def wait_then_put():
+        getting = asyncio.ensure_future(mailbox.get())
+        await asyncio.sleep(0.01)
+        assert not getting.done()
+        mailbox.put("frame")
+        return await asyncio.wait_for(getting, 1)
+
+    assert asyncio.run(wait_then_put()) == "frame"
+
+
+def test_mailbox_raises_the_close_error_once_drained():
+    mailbox = LatestFrameMailbox()
+
+    async def drain():
+        mailbox.put("last frame")
+        mailbox.close(ConnectionError("gone"))
+        assert await mailbox.get() == "last frame"
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(mailbox.get(), 1)
+
+    asyncio.run(drain())
+
+
+def test_send_rate_advice_follows_service_time(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("pose_scheduler.time.monotonic", lambda: now[0])
+    advisor = SendRateAdvisor(min_fps=5, max_fps=30, interval=1.0, headroom=0.9)
+
+    advisor.frame_done(0.1)
+    assert advisor.advise() is None  # at most once per interval
+
+    now[0] += 1
+    assert advisor.advise() == 9  # 0.9 / 0.1 s
+    now[0] += 1
+    assert advisor.advise() is None  # unchanged
+
+    for _ in range(50):
+        advisor.frame_done(1.0)
+    now[0] += 1
+    assert advisor.advise() == 5  # clamped to min_fps
+
+    for _ in range(50):
+        advisor.frame_done(0.001)
+    now[0] += 1
+    assert advisor.advise() == 30  # clamped to max_fps
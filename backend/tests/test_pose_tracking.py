@@ -0,0 +1,133 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from static_pose_comparision.pose_tracking import AdaptivePoseTracker
+from static_pose_comparision.pose_utils import NUM_LANDMARKS
+
+FRAME_SHAPE = (480, 640, 3)
+MARKER = 8  # px
+
+
+class MarkerPose:
+    """
+    Stands in for MediaPipe: landmark i is the centroid of the pixels painted
+    with marker colour i, in the normalized coordinates of the image it gets.
+    """
+
+    def __init__(self):
+        self.input_shapes = []
+        self.resets = 0
+
+    def process(self, image_rgb):
+        self.input_shapes.append(image_rgb.shape)
+        h, w = image_rgb.shape[:2]
+        landmarks = []
+        for i in range(NUM_LANDMARKS):
+            ys, xs = np.nonzero(np.all(image_rgb == marker_colour(i)[::-1], axis=-1))
+            if len(xs) == 0:
+                return SimpleNamespace(pose_landmarks=None)
+            # Pixel centres, like MediaPipe's normalized coordinates
+            landmarks.append(SimpleNamespace(x=(xs.mean() + 0.5) / w, y=(ys.mean() + 0.5) / h))
+        return SimpleNamespace(pose_landmarks=SimpleNamespace(landmark=landmarks))
+
+    def reset(self):
+        self.resets += 1
+
+    def close(self):
+        pass
+
+
+def marker_colour(i):
+    return (255, 10 + 7 * i, 255)  # BGR; blended edge pixels never match exactly
+
+
+def skeleton(offset=(0, 0)):
+    """33 landmark positions inside a 160x180 box, at least 2 markers apart."""
+    rng = np.random.default_rng(0)
+    points = []
+    while len(points) < NUM_LANDMARKS:
+        candidate = rng.uniform((60, 150), (220, 330))
+        if all(np.abs(candidate - p).max() > 2 * MARKER for p in points):
+            points.append(candidate)
+    return np.round(points) + offset
+
+
+def draw(points):
+    image = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+    for i, (x, y) in enumerate(points.astype(int)):
+        image[y - MARKER // 2:y + MARKER // 2, x - MARKER // 2:x + MARKER // 2] = marker_colour(i)
+    return image
+
+
+def test_crop_landmarks_map_back_to_frame_coordinates():
+    pose = MarkerPose()
+    tracker = AdaptivePoseTracker(pose, target_side=160, full_side=640, max_skip=0)
+    truth = skeleton()
+    image = draw(truth)
+
+    points, _, mode = tracker.process(image)
+    assert mode == "full"
+    np.testing.assert_allclose(points, truth, atol=2)
+
+    x0, y0, x1, y1 = tracker.roi
+    assert x1 - x0 < FRAME_SHAPE[1] and x0 <= truth[:, 0].min() and truth[:, 0].max() <= x1
+    assert y0 <= truth[:, 1].min() and truth[:, 1].max() <= y1
+
+    points, _, mode = tracker.process(image)
+    assert mode == "roi"
+    assert max(pose.input_shapes[-1][:2]) <= 160
+    np.testing.assert_allclose(points, truth, atol=3)
+
+
+def test_window_is_kept_while_the_dancer_stays_inside():
+    pose = MarkerPose()
+    tracker = AdaptivePoseTracker(pose, target_side=160, full_side=640, max_skip=0)
+    truth = skeleton()
+    tracker.process(draw(truth))
+    roi = tracker.roi
+    resets = pose.resets
+
+    for shift in range(1, 4):
+        points, _, mode = tracker.process(draw(truth + (shift, 0)))
+        assert mode == "roi"
+        np.testing.assert_allclose(points, truth + (shift, 0), atol=3)
+    assert tracker.roi == roi
+    # One reset when moving from the full frame into the crop, none while it stays put
+    assert pose.resets == resets + 1
+
+
+def test_lost_in_crop_falls_back_to_full_frame():
+    pose = MarkerPose()
+    tracker = AdaptivePoseTracker(pose, target_side=160, full_side=640, max_skip=0)
+    tracker.process(draw(skeleton()))
+    tracker.process(draw(skeleton()))
+
+    moved = skeleton(offset=(340, 0))
+    points, _, mode = tracker.process(draw(moved))
+    assert mode == "full"
+    assert tracker.counts["lost"] == 1
+    np.testing.assert_allclose(points, moved, atol=2)
+    assert tracker.roi[0] > 300
+
+
+def test_stable_skeleton_skips_inference():
+    pose = MarkerPose()
+    tracker = AdaptivePoseTracker(pose, target_side=160, full_side=640, max_skip=1)
+    image = draw(skeleton())
+    tracker.process(image)
+    last_points, last_angles, _ = tracker.process(image)
+    calls = len(pose.input_shapes)
+
+    points, angles, mode = tracker.process(image)
+    assert mode == "skipped"
+    assert len(pose.input_shapes) == calls
+    np.testing.assert_array_equal(points, last_points)
+    # Extrapolated by less than stable_degrees from the last inference
+    np.testing.assert_allclose(angles, last_angles, atol=2.0)
+
+    _, _, mode = tracker.process(image)
+    assert mode == "roi"
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from static_pose_comparision.pose_utils import (
+    ANGLE_DEFINITIONS,
+    ANGLE_NAMES,
+    NUM_LANDMARKS,
+    PoseLandmark,
+    array_to_keypoints,
+    calculate_accuracy_array,
+    calculate_angle,
+    calculate_angles_array,
+    calculate_angles_from_keypoints,
+    calculate_weighted_accuracy_array,
+    keypoints_to_array,
+    normalize_skeleton,
+    normalize_skeleton_array,
+)
+
+
+def random_points(seed, batch=()):
+    return np.random.default_rng(seed).uniform(0.1, 0.9, batch + (NUM_LANDMARKS, 2))
+
+
+def test_angles_match_the_scalar_formula():
+    points = random_points(0)
+    angles = calculate_angles_array(points)
+    for name, value in zip(ANGLE_NAMES, angles):
+        a, b, c = ANGLE_DEFINITIONS[name]
+        assert value == pytest.approx(calculate_angle(points[a], points[b], points[c]))
+
+
+def test_angles_array_matches_dict_wrapper():
+    points = random_points(1)
+    keypoints = array_to_keypoints(points)
+    assert calculate_angles_from_keypoints(keypoints) == pytest.approx(
+        dict(zip(ANGLE_NAMES, calculate_angles_array(points)))
+    )
+
+
+def test_batched_angles_match_single_frames():
+    points = random_points(2, batch=(5,))
+    batched = calculate_angles_array(points)
+    assert batched.shape == (5, len(ANGLE_NAMES))
+    for frame, angles in zip(points, batched):
+        np.testing.assert_allclose(angles, calculate_angles_array(frame))
+
+
+def test_missing_landmarks_drop_their_angles():
+    keypoints = array_to_keypoints(random_points(3))
+    del keypoints[PoseLandmark.LEFT_WRIST]
+    angles = calculate_angles_from_keypoints(keypoints)
+    assert "left_elbow" not in angles
+    assert set(angles) == set(ANGLE_NAMES) - {"left_elbow"}
+
+    points = keypoints_to_array(keypoints)
+    array_angles = calculate_angles_array(points)
+    assert np.isnan(array_angles[ANGLE_NAMES.index("left_elbow")])
+
+
+def test_zero_length_limb_is_undefined():
+    points = random_points(4)
+    points[PoseLandmark.LEFT_ELBOW] = points[PoseLandmark.LEFT_WRIST]
+    assert np.isnan(calculate_angles_array(points)[ANGLE_NAMES.index("left_elbow")])
+    assert calculate_angles_from_keypoints(array_to_keypoints(points))["left_elbow"] is None
+
+
+def test_normalize_array_matches_dict_wrapper():
+    user, ref = random_points(5), random_points(6)
+    normalized = normalize_skeleton(array_to_keypoints(user), array_to_keypoints(ref))
+    np.testing.assert_allclose(keypoints_to_array(normalized), normalize_skeleton_array(user, ref))
+
+
+def test_normalize_maps_user_torso_onto_reference():
+    ref = random_points(7)
+    # The same skeleton, twice as big and shifted: normalizing must undo both
+    user = ref * 2 + (0.3, -0.1)
+    np.testing.assert_allclose(normalize_skeleton_array(user, ref), ref, atol=1e-12)
+
+
+def test_batched_normalize_matches_single_frames():
+    user, ref = random_points(8, batch=(4,)), random_points(9, batch=(4,))
+    batched = normalize_skeleton_array(user, ref)
+    for i in range(4):
+        np.testing.assert_allclose(batched[i], normalize_skeleton_array(user[i], ref[i]))
+
+
+def test_weighted_accuracy_caps_each_joint():
+    ref = np.full(len(ANGLE_NAMES), 90.0)
+    live = ref.copy()
+    live[0] += 170  # far beyond the cap: costs that joint's weight, nothing more
+    weights = np.ones(len(ANGLE_NAMES))
+    expected = 100 * (len(ANGLE_NAMES) - 1) / len(ANGLE_NAMES)
+    assert calculate_weighted_accuracy_array(live, ref, 90, weights) == pytest.approx(expected)
+
+    live[0] = np.nan  # missing joints are skipped
+    assert calculate_weighted_accuracy_array(live, ref, 90, weights) == pytest.approx(100)
+
+
+def test_weighted_accuracy_follows_the_weights():
+    ref = np.full(len(ANGLE_NAMES), 90.0)
+    live = ref.copy()
+    live[1] += 45  # half the cap: that joint scores 0.5
+    weights = np.ones(len(ANGLE_NAMES))
+    weights[1] = 3
+    expected = 100 * (weights.sum() - 1.5) / weights.sum()
+    assert calculate_weighted_accuracy_array(live, ref, 90, weights) == pytest.approx(expected)
+    assert calculate_weighted_accuracy_array(np.full_like(ref, np.nan), ref, 90, weights) == 0
+
+
+def test_unweighted_accuracy_averages_the_differences():
+    ref = np.full(len(ANGLE_NAMES), 90.0)
+    live = ref + 30
+    assert calculate_accuracy_array(live, ref, 90) == pytest.approx(100 * 2 / 3)
+    live[0] = np.nan  # counts as 0 degrees: a 90 degree difference
+    expected = 100 - 100 * (30 * (len(ANGLE_NAMES) - 1) + 90) / len(ANGLE_NAMES) / 90
+    assert calculate_accuracy_array(live, ref, 90) == pytest.approx(expected)
+    # Batched: one row per frame
+    np.testing.assert_allclose(calculate_accuracy_array(np.stack([ref, ref + 90]), ref, 90), [100, 0])
@@ -0,0 +1,70 @@
+import sys
+
+import numpy as np
+import pytest
+
+import reference_cache
+from reference_cache import CACHE_VERSION, build_reference_cache, hash_image, is_cache_fresh, read_cache
+from reference_store import write_reference_store
+from static_pose_comparision.pose_utils import ANGLE_NAMES, NUM_LANDMARKS
+
+
+@pytest.fixture
+def folder(tmp_path):
+    images = tmp_path / "reference_poses"
+    images.mkdir()
+    for name in ("b.jpg", "a.png", "notes.txt"):
+        (images / name).write_bytes(name.encode())
+    return images
+
+
+def seed_cache(folder, path, data_version=CACHE_VERSION):
+    """A cache already holding every image in `folder`, as a previous build would have left it."""
+    names = reference_cache.list_reference_images(str(folder))
+    keypoints = np.random.default_rng(0).random((len(names), NUM_LANDMARKS, 2))
+    angles = np.full((len(names), len(ANGLE_NAMES)), 90.0)
+    hashes = [hash_image(str(folder / name)) for name in names]
+    write_reference_store(str(path), names, hashes, keypoints, angles, [True] * len(names), ANGLE_NAMES, data_version)
+    return keypoints
+
+
+def test_lists_images_only_in_name_order(folder):
+    assert reference_cache.list_reference_images(str(folder)) == ["a.png", "b.jpg"]
+
+
+def test_read_cache_ignores_missing_and_outdated_files(folder, tmp_path):
+    path = tmp_path / "cache.bin"
+    assert read_cache(str(path)) is None
+
+    seed_cache(folder, path, data_version=CACHE_VERSION - 1)
+    assert read_cache(str(path)) is None
+
+    seed_cache(folder, path)
+    assert read_cache(str(path)).names == ["a.png", "b.jpg"]
+
+
+def test_freshness_follows_image_names_and_contents(folder, tmp_path):
+    path = tmp_path / "cache.bin"
+    seed_cache(folder, path)
+    store = read_cache(str(path))
+    assert is_cache_fresh(store, str(folder))
+
+    (folder / "a.png").write_bytes(b"edited")
+    assert not is_cache_fresh(store, str(folder))
+    (folder / "a.png").write_bytes(b"a.png")
+    (folder / "c.jpeg").write_bytes(b"new")
+    assert not is_cache_fresh(store, str(folder))
+
+
+def test_rebuild_reuses_unchanged_images_without_mediapipe(folder, tmp_path, monkeypatch):
+    path = tmp_path / "cache.bin"
+    keypoints = seed_cache(folder, path)
+    # Renaming an image keeps its hash, so nothing needs extracting
+    (folder / "b.jpg").rename(folder / "renamed.jpg")
+    monkeypatch.setitem(sys.modules, "mediapipe", None)  # importing it would fail
+
+    store = build_reference_cache(str(folder), str(path))
+
+    assert store.names == ["a.png", "renamed.jpg"]
+    np.testing.assert_array_equal(store.keypoints, keypoints)
+    assert is_cache_fresh(store, str(folder))
@@ -0,0 +1,94 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+
+from reference_store import ReferenceStore, ReferenceStoreError, ReferenceStoreWatcher, write_reference_store
+from static_pose_comparision.pose_utils import ANGLE_NAMES, NUM_LANDMARKS
+
+
+def write_store(path, names, valid, seed=0, data_version=1):
+    rng = np.random.default_rng(seed)
+    keypoints = rng.random((len(names), NUM_LANDMARKS, 2))
+    angles = rng.uniform(0, 180, (len(names), len(ANGLE_NAMES)))
+    hashes = [hashlib.sha256(name.encode()).hexdigest() for name in names]
+    write_reference_store(str(path), names, hashes, keypoints, angles, valid, ANGLE_NAMES, data_version)
+    return keypoints, angles, hashes
+
+
+def test_round_trip_puts_usable_poses_first(tmp_path):
+    path = tmp_path / "poses.store"
+    names = ["arms_up.jpg", "blurry.jpg", "plie.jpg", "empty.jpg"]
+    valid = [True, False, True, False]
+    keypoints, angles, hashes = write_store(path, names, valid)
+
+    store = ReferenceStore(str(path))
+
+    assert len(store) == 2 and store.num_entries == 4
+    assert store.names == ["arms_up.jpg", "plie.jpg"]
+    assert store.angle_names == tuple(ANGLE_NAMES)
+    assert store.data_version == 1
+    np.testing.assert_array_equal(store.keypoints, keypoints[[0, 2]])
+    np.testing.assert_array_equal(store.angles, angles[[0, 2]])
+    assert not store.keypoints.flags.writeable  # a view over the shared mapping
+
+    entries = {name: (digest, valid) for name, digest, _, _, valid in store.entries()}
+    assert entries == {name: (digest, ok) for name, digest, ok in zip(names, hashes, valid)}
+
+
+def test_unicode_names_and_an_empty_store(tmp_path):
+    path = tmp_path / "poses.store"
+    write_store(path, ["arabesque-ü.jpg"], [True])
+    assert ReferenceStore(str(path)).name(0) == "arabesque-ü.jpg"
+
+    write_store(path, [], [])
+    store = ReferenceStore(str(path))
+    assert len(store) == 0 and store.keypoints.shape == (0, NUM_LANDMARKS, 2)
+
+
+@pytest.mark.parametrize("contents", [b"", b"\0" * 8, b"\0" * 256])
+def test_rejects_other_files(tmp_path, contents):
+    path = tmp_path / "poses.store"
+    path.write_bytes(contents)
+    with pytest.raises(ReferenceStoreError):
+        ReferenceStore(str(path))
+
+
+def test_rejects_truncated_files(tmp_path):
+    path = tmp_path / "poses.store"
+    write_store(path, ["a.jpg", "b.jpg"], [True, True])
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2])
+    with pytest.raises(ReferenceStoreError, match="truncated"):
+        ReferenceStore(str(path))
+
+
+def test_watcher_remaps_a_replaced_file(tmp_path):
+    path = tmp_path / "poses.store"
+    write_store(path, ["a.jpg"], [True])
+    old = ReferenceStore(str(path))
+    watcher = ReferenceStoreWatcher(old, check_interval=0)
+    assert watcher.get() is old
+
+    write_store(path, ["a.jpg", "b.jpg"], [True, True], seed=1, data_version=2)
+    new = watcher.get()
+
+    assert new is not old and len(new) == 2 and new.data_version == 2
+    # Sessions holding the old mapping keep a valid view
+    assert old.names == ["a.jpg"] and old.keypoints.shape[0] == 1
+
+
+def test_watcher_keeps_the_old_store_until_a_valid_file_appears(tmp_path):
+    path = tmp_path / "poses.store"
+    write_store(path, ["a.jpg"], [True])
+    old = ReferenceStore(str(path))
+    watcher = ReferenceStoreWatcher(old, check_interval=0)
+
+    os.remove(path)
+    assert watcher.get() is old
+    path.write_bytes(b"")
+    assert watcher.get() is old
+
+    write_store(path, ["b.jpg"], [True])
+    assert watcher.get().names == ["b.jpg"]
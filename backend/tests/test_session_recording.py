@@ -0,0 +1,114 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from session_recording import (
+    FLAG_ADVANCED,
+    FLAG_PERSON,
+    MODES,
+    PoseRecording,
+    PoseSessionRecorder,
+    RecordingFormatError,
+)
+from static_pose_comparision.pose_utils import ANGLE_NAMES, NUM_LANDMARKS
+
+
+def record(folder, frames, chunk_frames=4, events=()):
+    """Writes `frames` [(keypoints, accuracy, angle_errors, mode)] as one session; returns its path."""
+
+    async def session():
+        recorder = PoseSessionRecorder(str(folder), chunk_frames=chunk_frames)
+        buffer = recorder.open(user_id="user-1")
+        started = buffer.started  # time_ms counts from here
+        for i, (keypoints, accuracy, angle_errors, mode) in enumerate(frames):
+            if i in events:
+                buffer.mark(events[i])
+            buffer.add(started + i / 30, keypoints, accuracy, 2, 1, i % 3 == 0, i, angle_errors, mode)
+        recorder.close(buffer)
+        await recorder.stop()
+        return buffer.path, recorder.stats()
+
+    return asyncio.run(session())
+
+
+def test_reads_back_what_the_recorder_wrote(tmp_path):
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(10):
+        keypoints = None if i == 4 else rng.random((NUM_LANDMARKS, 2))
+        errors = None if keypoints is None else rng.uniform(0, 90, len(ANGLE_NAMES))
+        frames.append((keypoints, 50 + i, errors, MODES[i % len(MODES)]))
+
+    path, stats = record(tmp_path, frames, events={6: {"mode": "detect"}})
+    assert stats["frames"] == 10 and stats["write_errors"] == 0 and stats["pending_chunks"] == 0
+
+    recording = PoseRecording(path)
+    assert len(recording) == 10
+    assert [len(chunk["time_ms"]) for chunk in recording.chunks] == [4, 2, 4]  # the event flushes early
+    assert recording.metadata["user_id"] == "user-1"
+    assert recording.metadata["angle_names"] == list(ANGLE_NAMES)
+    assert recording.events == [{"frame": 6, "mode": "detect"}]
+
+    landmarks = recording.landmarks()
+    for i, (keypoints, accuracy, errors, mode) in enumerate(frames):
+        if keypoints is None:
+            assert np.isnan(landmarks[i]).all()
+            assert np.isnan(recording.column("angle_errors")[i]).all()
+        else:
+            np.testing.assert_allclose(landmarks[i], keypoints, atol=1e-4)
+            np.testing.assert_allclose(recording.column("angle_errors")[i], errors, rtol=1e-3)
+        assert recording.accuracy()[i] == pytest.approx(accuracy)
+        assert MODES[recording.column("mode")[i]] == mode
+        flags = recording.column("flags")[i]
+        assert bool(flags & FLAG_PERSON) == (keypoints is not None)
+        assert bool(flags & FLAG_ADVANCED) == (i % 3 == 0)
+
+    np.testing.assert_array_equal(recording.column("reference_index"), np.arange(10))
+    np.testing.assert_allclose(recording.column("time_ms"), np.arange(10) * 1000 / 30, atol=1)
+
+    summary = recording.summary()
+    assert summary["frames"] == 10 and summary["frames_with_person"] == 9
+    assert summary["mean_accuracy"] == round(np.mean([f[1] for f in frames if f[0] is not None]), 2)
+
+
+def test_missing_landmarks_round_trip_as_nan(tmp_path):
+    keypoints = np.full((NUM_LANDMARKS, 2), 0.5)
+    keypoints[7] = np.nan
+    path, _ = record(tmp_path, [(keypoints, 100, None, "static")])
+    landmarks = PoseRecording(path).landmarks()[0]
+    assert np.isnan(landmarks[7]).all()
+    np.testing.assert_allclose(np.delete(landmarks, 7, axis=0), 0.5)
+
+
+def test_truncated_file_keeps_whole_chunks(tmp_path):
+    frames = [(np.full((NUM_LANDMARKS, 2), 0.5), 80, None, "static")] * 8
+    path, _ = record(tmp_path, frames)
+    data = open(path, "rb").read()
+    with open(path, "wb") as f:
+        f.write(data[:-10])
+    assert len(PoseRecording(path)) == 4
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not-a-recording.posrec"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(RecordingFormatError):
+        PoseRecording(str(path))
+
+
+@pytest.mark.parametrize("size", [0, 3])
+def test_rejects_empty_files(tmp_path, size):
+    path = tmp_path / "empty.posrec"
+    path.write_bytes(b"\0" * size)
+    with pytest.raises(RecordingFormatError, match="too short"):
+        PoseRecording(str(path))
+
+
+def test_rejects_files_cut_inside_the_metadata(tmp_path):
+    path, _ = record(tmp_path, [])
+    data = open(path, "rb").read()
+    with open(path, "wb") as f:
+        f.write(data[:20])
+    with pytest.raises(RecordingFormatError, match="metadata"):
+        PoseRecording(path)
@@ -0,0 +1,228 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import DBRef, ObjectId
+
+import status_writer
+from status_writer import PendingStatus, StatusWriteBuffer, StatusWriteError, merge_status, status_upsert
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+def test_merge_status():
+    assert merge_status(None, "resume") == "resume"
+    assert merge_status("resume", "completed") == "completed"
+    assert merge_status("completed", "resume") == "completed"
+    assert merge_status("completed", None) == "completed"
+    assert merge_status("completed", "not_started") == "not_started"
+
+
+def test_pending_status_coalesces_updates():
+    pending = PendingStatus()
+    pending.merge("resume", 40, NOW)
+    pending.merge("completed", 100, NOW + timedelta(seconds=5))
+    # A late "resume" with older progress neither undoes completion nor lowers progress
+    pending.merge("resume", 60, NOW + timedelta(seconds=2))
+    assert (pending.status, pending.progress, pending.last_accessed) == (
+        "completed", 100, NOW + timedelta(seconds=5)
+    )
+
+
+def test_pending_status_keeps_unset_fields():
+    pending = PendingStatus()
+    pending.merge(None, None, NOW)
+    assert (pending.status, pending.progress) == (None, None)
+    pending.merge(None, 30, NOW)
+    pending.merge("resume", None, NOW)
+    assert (pending.status, pending.progress) == ("resume", 30)
+
+
+def test_status_upsert_targets_one_row():
+    user_id, song_id = ObjectId(), ObjectId()
+    query, pipeline = status_upsert(user_id, song_id, "resume", 40, NOW)
+    assert query == {"user.$id": user_id, "song.$id": song_id}
+    assert len(pipeline) == 1
+    fields = pipeline[0]["$set"]
+    assert isinstance(fields["user"]["$literal"], DBRef) and fields["user"]["$literal"].id == user_id
+    assert isinstance(fields["song"]["$literal"], DBRef) and fields["song"]["$literal"].id == song_id
+    assert fields["last_accessed"] == NOW
+
+
+def test_status_upsert_never_moves_backwards():
+    _, pipeline = status_upsert(ObjectId(), ObjectId(), "resume", 40, NOW)
+    fields = pipeline[0]["$set"]
+    assert fields["progress"] == {"$max": ["$progress", 40]}
+    assert fields["status"] == {"$cond": [{"$eq": ["$status", "completed"]}, "completed", "resume"]}
+
+    _, pipeline = status_upsert(ObjectId(), ObjectId(), "completed", None, NOW)
+    fields = pipeline[0]["$set"]
+    assert fields["status"] == "completed"
+    assert fields["progress"]["$ifNull"][0] == "$progress"
+
+
+def test_status_upsert_keeps_or_defaults_unset_status():
+    _, pipeline = status_upsert(ObjectId(), ObjectId(), None, 10, NOW)
+    assert pipeline[0]["$set"]["status"]["$ifNull"][0] == "$status"
+
+
+# --- StatusWriteBuffer ---
+class FakeDatabase:
+    """Stands in for write_status_updates: records written rows, fails rows or whole writes on demand."""
+
+    def __init__(self):
+        self.rows = {}
+        self.writes = 0
+        self.bad_keys = set()
+        self.down = False
+        self.delay = 0
+
+    async def write(self, updates):
+        self.writes += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.down:
+            raise ConnectionError("database unreachable")
+        failed = {key: "bad row" for key in updates if key in self.bad_keys}
+        for key, pending in updates.items():
+            if key not in failed:
+                self.rows[key] = (pending.status, pending.progress)
+        return failed
+
+
+@pytest.fixture
+def database(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(status_writer, "write_status_updates", fake.write)
+    return fake
+
+
+def buffer(**options):
+    return StatusWriteBuffer(**{"flush_seconds": 60, "max_pending": 100, **options})
+
+
+def test_flush_writes_coalesced_rows(database):
+    user, song = ObjectId(), ObjectId()
+
+    async def run():
+        writer = buffer()
+        await writer.add(user, song, "resume", 20, NOW)
+        await writer.add(user, song, "resume", 50, NOW)
+        assert writer.pending(user, song).progress == 50
+        await writer.flush()
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(run())
+    assert database.rows == {(user, song): ("resume", 50)}
+    assert writer.rows_written == 1 and writer.updates_received == 2
+
+
+def test_bad_row_is_retried_then_dropped_without_blocking_others(database):
+    bad, good = (ObjectId(), ObjectId()), (ObjectId(), ObjectId())
+    database.bad_keys.add(bad)
+
+    async def run():
+        writer = buffer(max_attempts=3)
+        for attempt in range(3):
+            await writer.add(*bad, "resume", 10, NOW)
+            await writer.add(*good, "resume", 10 + attempt, NOW)
+            with pytest.raises(StatusWriteError):
+                await writer.flush()
+            assert writer.pending(*good) is None
+        # Failed three times: dropped rather than retried forever
+        assert writer.pending(*bad) is None
+        await writer.flush()
+        return writer
+
+    writer = asyncio.run(run())
+    assert database.rows == {good: ("resume", 12)}
+    assert writer.rows_dropped == 1
+
+
+def test_failed_write_requeues_under_newer_updates(database):
+    key = (ObjectId(), ObjectId())
+    database.down = True
+
+    async def run():
+        writer = buffer()
+        await writer.add(*key, "completed", 100, NOW)
+        with pytest.raises(StatusWriteError):
+            await writer.flush()
+        await writer.add(*key, "resume", 30, NOW + timedelta(seconds=1))
+        pending = writer.pending(*key)
+        assert (pending.status, pending.progress) == ("completed", 100)
+        database.down = False
+        await writer.flush()
+
+    asyncio.run(run())
+    assert database.rows == {key: ("completed", 100)}
+
+
+def test_flush_user_reports_failures(database):
+    key = (ObjectId(), ObjectId())
+    database.down = True
+
+    async def run():
+        writer = buffer()
+        await writer.add(*key, "resume", 30, NOW)
+        with pytest.raises(StatusWriteError):
+            await writer.flush_user(key[0])
+        # Still queued for the next flush
+        assert writer.has_pending(key[0])
+
+    asyncio.run(run())
+
+
+def test_cancelled_flush_keeps_its_batch(database):
+    key = (ObjectId(), ObjectId())
+    database.delay = 0.05
+
+    async def run():
+        writer = buffer()
+        await writer.add(*key, "resume", 30, NOW)
+        task = asyncio.create_task(writer.flush_user(key[0]))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert writer.pending(*key).progress == 30
+        database.delay = 0
+        await writer.flush()
+
+    asyncio.run(run())
+    assert database.rows == {key: ("resume", 30)}
+
+
+def test_stop_finishes_the_flush_in_progress(database):
+    key = (ObjectId(), ObjectId())
+    database.delay = 0.05
+
+    async def run():
+        writer = buffer(flush_seconds=0.01)
+        await writer.add(*key, "resume", 30, NOW)
+        await asyncio.sleep(0.03)  # the loop's flush is now writing
+        assert database.writes == 1
+        await writer.stop()
+
+    asyncio.run(run())
+    assert database.rows == {key: ("resume", 30)}
+
+
+def test_failing_flushes_back_off(database):
+    database.down = True
+
+    async def run():
+        writer = buffer(flush_seconds=0.01, max_pending=1, max_retry_seconds=0.04)
+        await writer.add(ObjectId(), ObjectId(), "resume", 30, NOW)
+        for _ in range(20):
+            # A full buffer doesn't trigger immediate retries while writes fail
+            await writer.add(ObjectId(), ObjectId(), "resume", 30, NOW)
+            await asyncio.sleep(0.01)
+        delay = writer._retry_delay
+        await writer.stop()
+        return delay
+
+    delay = asyncio.run(run())
+    assert delay == pytest.approx(0.04)
+    assert database.writes < 10
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from routes.user_routes import decode_status_cursor, encode_status_cursor, user_status_pipeline
+
+USER_ID = ObjectId()
+SONG_ID = ObjectId()
+
+
+def test_status_cursor_round_trip():
+    last_accessed = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    cursor = encode_status_cursor(last_accessed, str(SONG_ID))
+    assert decode_status_cursor(cursor) == (last_accessed, SONG_ID)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", encode_status_cursor(datetime(2024, 1, 1), "not-an-id")])
+def test_invalid_status_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_status_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_first_page_matches_the_user_only():
+    pipeline = user_status_pipeline(USER_ID, direction=-1, limit=20)
+    assert pipeline[0] == {"$match": {"user.$id": USER_ID}}
+    assert pipeline[1] == {"$sort": {"last_accessed": -1, "song.$id": -1}}
+    assert pipeline[2] == {"$limit": 20}
+
+
+@pytest.mark.parametrize("direction, after", [(-1, "$lt"), (1, "$gt")])
+def test_later_pages_start_past_the_cursor_row(direction, after):
+    last_accessed = datetime(2024, 5, 1)
+    match = user_status_pipeline(USER_ID, direction, cursor=(last_accessed, SONG_ID))[0]["$match"]
+    # Rows with the same timestamp are ordered by song, so none is skipped or repeated
+    assert match["$or"] == [
+        {"last_accessed": {after: last_accessed}},
+        {"last_accessed": last_accessed, "song.$id": {after: SONG_ID}},
+    ]
+
+
+def test_unpaged_pipeline_has_no_limit():
+    assert not any("$limit" in stage for stage in user_status_pipeline(USER_ID, direction=1))
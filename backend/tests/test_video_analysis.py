@@ -0,0 +1,110 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from static_pose_comparision.pose_utils import ANGLE_NAMES
+from video_analysis import (
+    UploadTooLarge,
+    VideoAnalysisUnavailable,
+    VideoAnalyzer,
+    VideoDecodeError,
+    is_readable_video,
+    iter_video_frames,
+    spool_upload,
+)
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+@pytest.fixture
+def video(tmp_path):
+    """A 10-frame 160x120 MJPG video whose frame i is filled with the value 20 * i."""
+    path = str(tmp_path / "dance.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (160, 120))
+    for i in range(10):
+        writer.write(np.full((120, 160, 3), 20 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_spool_upload_writes_every_chunk(tmp_path):
+    path = asyncio.run(spool_upload(chunks(b"abc", b"def"), max_bytes=6, folder=str(tmp_path)))
+    with open(path, "rb") as f:
+        assert f.read() == b"abcdef"
+
+
+def test_spool_upload_removes_an_oversized_upload(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool_upload(chunks(b"abc", b"defg"), max_bytes=6, folder=str(tmp_path)))
+    assert os.listdir(tmp_path) == []
+
+
+def test_iter_video_frames_strides_and_downscales(video):
+    frames = list(iter_video_frames(video, stride=3, max_side=80))
+
+    assert [number for number, _, _ in frames] == [0, 3, 6, 9]
+    assert [round(seconds, 1) for _, seconds, _ in frames] == [0.0, 0.3, 0.6, 0.9]
+    assert all(frame.shape == (60, 80, 3) for _, _, frame in frames)
+    # The right frames were decoded, not just counted
+    assert [int(round(frame.mean() / 20)) for _, _, frame in frames] == [0, 3, 6, 9]
+
+
+def test_unreadable_uploads_are_rejected(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"not a video")
+    assert not is_readable_video(str(path))
+    with pytest.raises(VideoDecodeError):
+        next(iter_video_frames(str(path)))
+
+
+def test_analyze_streams_rows_then_a_summary():
+    reference = np.random.default_rng(0).uniform(30, 150, (5, len(ANGLE_NAMES)))
+    analyzer = VideoAnalyzer(workers=1, max_in_flight=2)
+
+    async def extract(path, stride, max_side):
+        for number, angles in enumerate([reference[0], None, reference[1], reference[2]]):
+            yield number, number / 10, None, angles
+
+    analyzer.extract = extract
+
+    async def collect():
+        return [row async for row in analyzer.analyze("video", SimpleNamespace(angles=reference), 90)]
+
+    rows = asyncio.run(collect())
+
+    assert [row.get("person") for row in rows[:-1]] == [True, False, True, True]
+    assert rows[0]["accuracy"] == 100.0 and rows[0]["reference_frame"] == 0
+    assert rows[-1]["summary"]["frames"] == 4 and rows[-1]["summary"]["frames_with_person"] == 3
+    stats = analyzer.stats()
+    assert stats["videos"] == 1 and stats["active"] == 0 and stats["frames_analyzed"] == 4
+
+
+def test_a_broken_pool_is_replaced_for_the_next_upload(video):
+    class BrokenPool:
+        shut_down = False
+
+        def submit(self, *args):
+            raise BrokenProcessPool("worker died")
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shut_down = True
+
+    analyzer = VideoAnalyzer(workers=1, max_in_flight=2)
+    broken = analyzer._executor = BrokenPool()
+
+    async def drain():
+        async for _ in analyzer.extract(video):
+            pass
+
+    with pytest.raises(VideoAnalysisUnavailable):
+        asyncio.run(drain())
+    assert broken.shut_down and analyzer._executor is None
+    assert analyzer.stats()["pool_restarts"] == 1
@@ -0,0 +1,277 @@
+"""
+Scoring of recorded practice videos against a song's choreography.
+
+The upload is spooled to disk chunk by chunk (the body never sits in memory
+as a whole), then flows through a pipeline of generators:
+
+    decode (thread)  ->  MediaPipe (process pool)  ->  DTW scoring  ->  NDJSON / SSE
+
+Frames are decoded one at a time, every `stride`-th frame only and downscaled
+to `max_side`. Up to `max_in_flight` of them are in the process pool at once;
+results are reassembled in frame order before scoring, so each reply line can
+be streamed to the client as soon as its frame is done.
+"""
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import aclosing, suppress
+
+from static_pose_comparision.pose_dtw import StreamingDTW
+from static_pose_comparision.pose_utils import extract_keypoints_array, get_max_angle_difference_array
+
+
+class UploadTooLarge(Exception):
+    """Raised while spooling an upload that exceeds the size limit."""
+
+
+class VideoDecodeError(ValueError):
+    """Raised when the uploaded file can't be opened as a video."""
+
+
+class VideoAnalysisUnavailable(RuntimeError):
+    """Raised when the worker pool broke mid-analysis; the next upload gets a fresh pool."""
+
+
+async def spool_upload(chunks, max_bytes: int, folder=None):
+    """
+    Writes an async iterable of byte chunks (e.g. request.stream()) to a
+    temporary file. Returns its path; the caller deletes it (see remove_upload).
+    """
+    fd, path = tempfile.mkstemp(prefix="recording-", suffix=".video", dir=folder or None)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Video exceeds {max_bytes} bytes.")
+                await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        remove_upload(path)
+        raise
+    return path
+
+
+def remove_upload(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def is_readable_video(path):
+    """Whether OpenCV can open the file and decode its first frame."""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    try:
+        return cap.isOpened() and cap.grab()
+    finally:
+        cap.release()
+
+
+def iter_video_frames(path, stride=1, max_side=None):
+    """
+    Yields (frame number, seconds, BGR frame) for every `stride`-th frame,
+    downscaled so its longer side is at most `max_side`. Skipped frames are
+    only grabbed, not decoded.
+    """
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise VideoDecodeError("Could not open the uploaded video.")
+    try:
+        number = 0
+        while True:
+            if number % stride:
+                if not cap.grab():
+                    break
+                number += 1
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                break
+            seconds = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            longer_side = max(frame.shape[:2])
+            if max_side and longer_side > max_side:
+                scale = max_side / longer_side
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            yield number, seconds, frame
+            number += 1
+    finally:
+        cap.release()
+
+
+# --- Process pool workers ---
+# Each worker keeps one MediaPipe estimator. Consecutive frames of a video go
+# to different workers, so they run in static-image mode (no tracking).
+_worker_pose = None
+
+
+def _init_worker(model_complexity):
+    global _worker_pose
+    import mediapipe as mp
+
+    _worker_pose = mp.solutions.pose.Pose(
+        static_image_mode=True, model_complexity=model_complexity, min_detection_confidence=0.5
+    )
+
+
+def _extract_in_worker(frame):
+    # An unpickled array's buffer doesn't let extraction toggle its writeable flag; own a copy
+    frame = frame.copy()
+    return extract_keypoints_array(frame, _worker_pose)
+
+
+class VideoAnalyzer:
+    """Runs the recorded-video pipeline on a process pool shared by all uploads."""
+
+    def __init__(self, workers: int, max_in_flight: int, model_complexity: int = 1):
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.model_complexity = model_complexity
+        self._executor = None
+
+        # --- Stats ---
+        self.videos = 0
+        self.active = 0
+        self.frames_analyzed = 0
+        self.seconds_analyzing = 0.0
+        self.pool_restarts = 0
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_complexity,),
+            )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _discard_pool(self, pool):
+        """
+        Drops a pool whose worker died (out of memory, MediaPipe crash, failed
+        initializer); it stays unusable, so the next upload starts a new one.
+        """
+        if self._executor is pool:
+            self._executor = None
+            self.pool_restarts += 1
+            print("Video analysis worker pool broke; a new one is started for the next upload.")
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def extract(self, path, stride=1, max_side=None):
+        """
+        Async generator of (frame number, seconds, keypoints, angles) in frame
+        order; keypoints and angles are None for frames without a person.
+        Raises VideoAnalysisUnavailable if the worker pool breaks meanwhile.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+        frames = iter_video_frames(path, stride, max_side)
+        in_flight = deque()
+        exhausted = False
+        try:
+            while True:
+                # Keep the pool busy while results are handed out in order
+                while not exhausted and len(in_flight) < self.max_in_flight:
+                    item = await loop.run_in_executor(None, next, frames, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    number, seconds, frame = item
+                    in_flight.append((number, seconds, loop.run_in_executor(pool, _extract_in_worker, frame)))
+                if not in_flight:
+                    return
+                number, seconds, result = in_flight.popleft()
+                keypoints, angles = await result
+                yield number, seconds, keypoints, angles
+        except BrokenProcessPool as e:
+            self._discard_pool(pool)
+            raise VideoAnalysisUnavailable("Video analysis workers failed; please retry the upload.") from e
+        finally:
+            for *_, result in in_flight:
+                result.cancel()
+            # Still running in the decode thread if we were cancelled mid-frame; it's closed when collected then
+            with suppress(ValueError):
+                frames.close()
+
+    async def analyze(self, path, sequence, max_angle_difference, stride=1, max_side=None, dtw_options=None):
+        """
+        Async generator of JSON-ready rows: one per analyzed frame, then a
+        summary row ({"summary": {...}}). Frames are aligned to the reference
+        sequence with streaming DTW, like live choreography sessions.
+        """
+        tracker = StreamingDTW(sequence.angles, **(dtw_options or {}))
+        started = time.perf_counter()
+        frames = with_person = 0
+        accuracy_sum = 0.0
+
+        self.videos += 1
+        self.active += 1
+        try:
+            async with aclosing(self.extract(path, stride, max_side)) as results:
+                async for number, seconds, keypoints, angles in results:
+                    frames += 1
+                    if angles is None:
+                        yield {"frame": number, "time": round(seconds, 3), "person": False}
+                        continue
+
+                    ref_index, path_cost = tracker.update(angles)
+                    accuracy = 0.0 if path_cost is None else max(0.0, 100 - (path_cost / max_angle_difference) * 100)
+                    focus_joint, _ = get_max_angle_difference_array(angles, sequence.angles[ref_index])
+                    with_person += 1
+                    accuracy_sum += accuracy
+                    yield {
+                        "frame": number,
+                        "time": round(seconds, 3),
+                        "person": True,
+                        "accuracy": round(accuracy, 2),
+                        "reference_frame": ref_index,
+                        "progress": progress(tracker),
+                        "focus_joint": focus_joint,
+                    }
+        finally:
+            elapsed = time.perf_counter() - started
+            self.active -= 1
+            self.frames_analyzed += frames
+            self.seconds_analyzing += elapsed
+
+        yield {"summary": {
+            "frames": frames,
+            "frames_with_person": with_person,
+            "mean_accuracy": round(accuracy_sum / with_person, 2) if with_person else 0.0,
+            "progress": progress(tracker),
+            "completed": tracker.completed,
+            "seconds": round(elapsed, 2),
+            "frames_per_second": round(frames / elapsed, 1) if elapsed > 0 else None,
+        }}
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "videos": self.videos,
+            "active": self.active,
+            "frames_analyzed": self.frames_analyzed,
+            "pool_restarts": self.pool_restarts,
+            "frames_per_second": round(self.frames_analyzed / self.seconds_analyzing, 1) if self.seconds_analyzing else 0.0,
+        }
+
+
+def progress(tracker):
+    return round(100 * tracker.position / max(tracker.length - 1, 1), 1)
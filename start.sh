@@ -5,4 +5,7 @@ cd backend
 
 source venv/bin/activate
 
+# Refresh the reference-pose cache so workers skip MediaPipe at startup
+python reference_cache.py
+
 uvicorn main:app --reload